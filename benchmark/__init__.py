@@ -1,7 +1,28 @@
+import gc
+import os
 import random
+import resource
+import sys
 import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+from benchmark.zipf import ZipfCorpus
+
+
+N_WARMUP = 10
+PERCENTILES = (50, 95, 99)
+# the fixed point each sweep moves one parameter away from
+SWEEP_DEFAULTS = {"vocab_size": 20000, "batch_size": 64, "seq_len": 20, "beam_width": 10}
+SWEEPS = {
+    "vocab_size": (1000, 10000, 100000, 1000000),
+    "batch_size": (1, 8, 64, 512),
+    "seq_len": (5, 20, 80, 320),
+    "beam_width": (1, 4, 10, 32),
+}
+
 
 def fake_data(file="rando.txt"):
     # note: inefficient, but who cares?
@@ -17,212 +38,396 @@ def fake_data(file="rando.txt"):
     return txt
 
 
-def benchmark_numericalizing(voc, num, n_trials=1000):
-    queries = list(range(1000))
+def synthetic_vocab(klass, corpus, unk=False):
+    """A ``klass`` vocab with the expected counts of a :class:`~benchmark.zipf.ZipfCorpus`."""
+    voc = klass(unk=unk)
+    voc.add_counts(corpus.counts())
+    return voc
+
+
+def measure(run, args, n_warmup=N_WARMUP):
+    """Time ``run(arg)`` for every ``arg``, skipping the first ``n_warmup``.
+
+    The first ``n_warmup`` calls run untimed (JIT, caches, allocator), so
+    ``args`` should hold ``n_warmup`` more than the trials wanted. Building
+    an ``arg`` isn't timed either: ``args`` may be a generator of fresh
+    state for destructive benchmarks.
+
+    Returns
+    -------
+    list of float
+        Seconds per measured call, from ``time.perf_counter_ns()``.
+
+    """
     times = []
+    for i, arg in enumerate(args):
+        if i < n_warmup:
+            run(arg)
+            continue
+        start = time.perf_counter_ns()
+        run(arg)
+        times.append(time.perf_counter_ns() - start)
+    return (np.asarray(times, dtype=np.int64) / 1e9).tolist()
+
+
+def summarize(times, n_tokens=None, n_sentences=None):
+    """Mean, percentiles and throughput of ``times`` (seconds per call).
+
+    ``n_tokens`` / ``n_sentences`` are per call; throughputs are totals
+    over total time.
+
+    """
+    times = np.asarray(times)
+    stats = {"n": len(times), "mean": float(times.mean())}
+    stats.update((f"p{q}", float(p)) for q, p in zip(PERCENTILES, np.percentile(times, PERCENTILES)))
+    if n_tokens is not None:
+        stats["tokens_per_s"] = n_tokens * len(times) / float(times.sum())
+    if n_sentences is not None:
+        stats["sentences_per_s"] = n_sentences * len(times) / float(times.sum())
+    return stats
+
+
+def report(name, times, n_tokens=None, n_sentences=None):
+    stats = summarize(times, n_tokens=n_tokens, n_sentences=n_sentences)
+    line = f"{name} ({stats['n']}): " + ", ".join(f"p{q} {stats[f'p{q}']:.3g} s" for q in PERCENTILES)
+    if n_tokens is not None:
+        line += f", {stats['tokens_per_s']:.3g} tokens/s"
+    if n_sentences is not None:
+        line += f", {stats['sentences_per_s']:.3g} sentences/s"
+    print(line)
+    return stats
+
+
+def benchmark_numericalizing(voc, num, n_trials=1000, n_warmup=N_WARMUP):
     # TODO: Numericalization is allowed to be destructive. This isn't necessarily right
-    for _ in queries:
-        start = time.time()
-        _ = num(voc)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_numericalizing.__name__} ({n_trials}): {np.mean(times)} s, avg")
+    times = measure(lambda _: num(voc), range(n_warmup + n_trials), n_warmup)
+    report(benchmark_numericalizing.__name__, times)
     return benchmark_numericalizing.__name__, times
 
 
-def benchmark_single_word_random_access(voc, n_trials=1000):
-    queries = [random.randint(0, len(voc)-1) for _ in range(n_trials)]
-    times = []
-    for query in queries:
-        start = time.time()
-        _ = voc.string[query]
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_single_word_random_access.__name__} ({n_trials}): {np.mean(times)} s, avg")
+def benchmark_single_word_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
+    queries = [random.randint(0, len(voc)-1) for _ in range(n_warmup + n_trials)]
+    times = measure(lambda query: voc.string[query], queries, n_warmup)
+    report(benchmark_single_word_random_access.__name__, times, n_tokens=1)
     return benchmark_single_word_random_access.__name__, times
 
 
-def benchmark_1d_word_array_getitem_random_access(voc, n_trials=1000):
-    lens = [random.randint(3, 12) for _ in range(n_trials)]
+def benchmark_1d_word_array_getitem_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
+    lens = [random.randint(3, 12) for _ in range(n_warmup + n_trials)]
     queries = [[random.randint(0, len(voc)-1) for _ in range(len_)] for len_ in lens]
-    times = []
-    for query in queries:
-        start = time.time()
-        _ = voc.string[query]
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_1d_word_array_getitem_random_access.__name__} ({n_trials}): {np.mean(times)} s, avg")
+    times = measure(lambda query: voc.string[query], queries, n_warmup)
+    report(benchmark_1d_word_array_getitem_random_access.__name__, times,
+           n_tokens=float(np.mean(lens[n_warmup:])))
     return benchmark_1d_word_array_getitem_random_access.__name__, times
 
 
-def benchmark_1d_word_array_sentence_random_access(voc, n_trials=1000):
+def with_stops(query):
+    """Put a special (0) at a random stop in every sequence of ``query`` (sequence axis first)."""
+    stops = np.random.randint(1, query.shape[0], query.shape[1:])
+    np.put_along_axis(query, stops[None], 0, axis=0)
+    return query
+
+
+def sentence_query(n_words, shape):
+    """Uniformly random ids of ``shape``, see :func:`with_stops`."""
+    return with_stops(np.random.randint(0, n_words - 1, shape))
+
+
+def benchmark_1d_word_array_sentence_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
     seq_len = 20
-    queries = [np.random.randint(0, len(voc)-1, (seq_len)) for _ in range(n_trials)]
-    times = []
-    for query in queries:
-        start = time.time()
-        _ = voc.sentence(query, axis=0)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_1d_word_array_sentence_random_access.__name__}"
-          f" ({n_trials}): {np.mean(times)} s, avg")
+    queries = [np.random.randint(0, len(voc)-1, (seq_len)) for _ in range(n_warmup + n_trials)]
+    times = measure(lambda query: voc.sentence(query, axis=0), queries, n_warmup)
+    report(benchmark_1d_word_array_sentence_random_access.__name__, times, n_tokens=seq_len, n_sentences=1)
     return benchmark_1d_word_array_sentence_random_access.__name__, times
 
 
-def benchmark_2d_word_array_getitem_random_access(voc, n_trials=1000):
+def benchmark_2d_word_array_getitem_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
     batch = 64
-    all_lens = [[random.randint(3, 12) for _ in range(batch)] for _ in range(n_trials)]
+    all_lens = [[random.randint(3, 12) for _ in range(batch)] for _ in range(n_warmup + n_trials)]
     queries = [
         [[random.randint(0, len(voc)-1) for _ in range(l)] for l in lens]
         for lens in all_lens]
-    times = []
-    for query in queries:
-        start = time.time()
-        _ = voc.string[query]
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_2d_word_array_getitem_random_access.__name__} ({n_trials}): {np.mean(times)} s, avg")
+    times = measure(lambda query: voc.string[query], queries, n_warmup)
+    report(benchmark_2d_word_array_getitem_random_access.__name__, times,
+           n_tokens=float(np.sum(all_lens[n_warmup:]) / n_trials), n_sentences=batch)
     return benchmark_2d_word_array_getitem_random_access.__name__, times
 
 
-def benchmark_2d_word_array_sentence_random_access(voc, n_trials=1000):
+def benchmark_2d_word_array_sentence_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
     seq_len = 20
     batch = 64
-    queries = [np.random.randint(0, len(voc) - 1, (seq_len, batch)) for _ in range(n_trials)]
-    stops = [np.random.randint(1, seq_len, (batch,)) for _ in range(n_trials)]
-    for i in range(n_trials):
-        queries[i][..., stops[i]] = 0
-    times = []
-    for query in queries:
-        start = time.time()
-        _ = voc.sentence(query, axis=0)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_2d_word_array_sentence_random_access.__name__}"
-          f" ({n_trials}): {np.mean(times)} s, avg")
+    queries = [sentence_query(len(voc), (seq_len, batch)) for _ in range(n_warmup + n_trials)]
+    times = measure(lambda query: voc.sentence(query, axis=0), queries, n_warmup)
+    report(benchmark_2d_word_array_sentence_random_access.__name__, times,
+           n_tokens=seq_len * batch, n_sentences=batch)
     return benchmark_2d_word_array_sentence_random_access.__name__, times
 
 
-def benchmark_3d_word_array_sentence_random_access(voc, n_trials=1000):
+def benchmark_3d_word_array_sentence_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
     seq_len = 20
     batch = 64
     beam_size = 10
-    queries = [np.random.randint(0, len(voc) - 1, (seq_len, beam_size, batch)) for _ in range(n_trials)]
-    stops = [np.random.randint(1, seq_len, (beam_size, batch)) for _ in range(n_trials)]
-    for i in range(n_trials):
-        queries[i][..., stops[i]] = 0
-    times = []
-    for query in queries:
-        start = time.time()
-        _ = voc.sentence(query, axis=0)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_3d_word_array_sentence_random_access.__name__}"
-          f" ({n_trials}): {np.mean(times)} s, avg")
+    queries = [sentence_query(len(voc), (seq_len, beam_size, batch)) for _ in range(n_warmup + n_trials)]
+    times = measure(lambda query: voc.sentence(query, axis=0), queries, n_warmup)
+    report(benchmark_3d_word_array_sentence_random_access.__name__, times,
+           n_tokens=seq_len * beam_size * batch, n_sentences=beam_size * batch)
     return benchmark_3d_word_array_sentence_random_access.__name__, times
 
 
-def benchmark_uncounting_iterable(klass, unk, n_trials=25):
-    times = []
-    for _ in range(n_trials):
+def benchmark_ragged_sentence_random_access(voc, n_trials=1000, n_warmup=N_WARMUP):
+    """Decoding the 3D benchmark's hypotheses as flat ids plus lengths, without the padding."""
+    seq_len = 20
+    batch = 64
+    beam_size = 10
+    all_lens = [np.random.randint(1, seq_len + 1, beam_size * batch) for _ in range(n_warmup + n_trials)]
+    queries = [(np.random.randint(1, len(voc) - 1, lens.sum()), lens) for lens in all_lens]
+    times = measure(lambda query: voc.sentence(query[0], lengths=query[1]), queries, n_warmup)
+    report(benchmark_ragged_sentence_random_access.__name__, times,
+           n_tokens=float(np.sum(all_lens[n_warmup:]) / n_trials), n_sentences=beam_size * batch)
+    return benchmark_ragged_sentence_random_access.__name__, times
+
+
+def benchmark_sentence_sweep(klass, num, sweeps=SWEEPS, n_trials=100, n_warmup=N_WARMUP, exponent=1.0, seed=0):
+    """Decoding time of ``(seq_len, beam_width, batch_size)`` arrays as one parameter moves.
+
+    Every sweep starts from ``SWEEP_DEFAULTS`` and varies one of
+    ``vocab_size``, ``batch_size``, ``seq_len`` or ``beam_width``. Vocabs
+    and ids come from a :class:`~benchmark.zipf.ZipfCorpus` of
+    ``vocab_size`` types.
+
+    Returns
+    -------
+    dict
+        ``{parameter: {value: summarize(...)}}``
+
+    """
+    results = {}
+    for param, values in sweeps.items():
+        results[param] = {}
+        for value in values:
+            point = dict(SWEEP_DEFAULTS, **{param: value})
+            corpus = ZipfCorpus(point["vocab_size"], 10 * point["vocab_size"], exponent=exponent, seed=seed)
+            voc = num(synthetic_vocab(klass, corpus))
+            shape = (point["seq_len"], point["beam_width"], point["batch_size"])
+            queries = (with_stops(ids) for ids in corpus.id_tensors(shape, n_warmup + n_trials))
+            times = measure(lambda query: voc.sentence(query, axis=0), queries, n_warmup)
+            results[param][value] = report(
+                f"{benchmark_sentence_sweep.__name__} {param}={value}", times,
+                n_tokens=int(np.prod(shape)), n_sentences=shape[1] * shape[2])
+    return results
+
+
+def benchmark_thread_scaling(voc, thread_counts=(1, 2, 4, 8), n_batches=256, n_trials=5, n_warmup=1):
+    """Wall time of ``sentence_many`` over the same 3D batches, per thread pool size.
+
+    Returns
+    -------
+    name : str
+    dict
+        ``{n_threads: summarize(...)}`` over ``n_trials`` timed runs each;
+        speedups are of the medians.
+
+    """
+    seq_len = 20
+    batch = 64
+    beam_size = 10
+    queries = [sentence_query(len(voc), (seq_len, beam_size, batch)) for _ in range(n_batches)]
+    n_sentences = n_batches * batch * beam_size
+    results = {}
+    for n_threads in thread_counts:
+        with ThreadPoolExecutor(n_threads) as pool:
+            times = measure(
+                lambda batches: voc.sentence_many(batches, axis=0, executor=pool),
+                [queries] * (n_warmup + n_trials), n_warmup)
+        stats = results[n_threads] = summarize(times, n_sentences=n_sentences)
+        median = stats["p50"]
+        print(f"{benchmark_thread_scaling.__name__} ({n_threads} threads, {n_batches} batches, {n_trials} trials):"
+              f" median {median:.3g} s, {results[thread_counts[0]]['p50'] / median:.2f}x,"
+              f" {n_sentences / median:.3g} sentences/s")
+    return benchmark_thread_scaling.__name__, results
+
+
+def _fresh(klass, unk, n, txt):
+    for _ in range(n):
         voc = klass(unk=unk)
-        txt = fake_data()
         voc.add_iterable(txt)
-        txt_to_rm = fake_data("rando_short.txt")
-        start = time.time()
-        voc.uncount_iterable(txt_to_rm)
-        end = time.time()
-        times.append( end - start)
-    print(f"{benchmark_uncounting_iterable.__name__} ({n_trials}): {np.mean(times)} s, avg")
+        yield voc
+
+
+def benchmark_uncounting_iterable(klass, unk, n_trials=25, n_warmup=2, txt=None):
+    if txt is None:
+        txt, txt_to_rm = fake_data(), fake_data("rando_short.txt")
+    else:
+        txt_to_rm = txt[:len(txt) // 10]
+    times = measure(lambda voc: voc.uncount_iterable(txt_to_rm), _fresh(klass, unk, n_warmup + n_trials, txt), n_warmup)
+    report(benchmark_uncounting_iterable.__name__, times, n_tokens=len(txt_to_rm))
     return benchmark_uncounting_iterable.__name__, times
 
 
-def benchmark_adding_iterable(klass, unk, n_trials=25):
-    times = []
-    for _ in range(n_trials):
-        voc = klass(unk=unk)
-        txt = fake_data()
-        start = time.time()
-        voc.add_iterable(txt)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_adding_iterable.__name__} ({n_trials}): {np.mean(times)} s, avg")
+def benchmark_adding_iterable(klass, unk, n_trials=25, n_warmup=2, txt=None):
+    txt = fake_data() if txt is None else txt
+    times = measure(lambda voc: voc.add_iterable(txt), (klass(unk=unk) for _ in range(n_warmup + n_trials)), n_warmup)
+    report(benchmark_adding_iterable.__name__, times, n_tokens=len(txt))
     return benchmark_adding_iterable.__name__, times
 
 
-def benchmark_strip_n_words(klass, unk, n_trials=25):
-    times = []
-    for _ in range(n_trials):
-        voc = klass(unk=unk)
-        txt = fake_data()
-        voc.add_iterable(txt)
-        n_to_keep = int(len(voc) * 0.20)
-        start = time.time()
-        voc.strip(n_to_keep=n_to_keep)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_strip_n_words.__name__} ({n_trials}): {np.mean(times)} s, avg")
+def benchmark_strip_n_words(klass, unk, n_trials=25, n_warmup=2, txt=None):
+    txt = fake_data() if txt is None else txt
+    times = measure(lambda voc: voc.strip(n_to_keep=int(len(voc) * 0.20)),
+                    _fresh(klass, unk, n_warmup + n_trials, txt), n_warmup)
+    report(benchmark_strip_n_words.__name__, times)
     return benchmark_strip_n_words.__name__, times
 
 
-def benchmark_strip_n_words_numericalized(klass, num, unk, n_trials=25):
-    times = []
-    for _ in range(n_trials):
-        voc = klass(unk=unk)
-        txt = fake_data()
-        voc.add_iterable(txt)
-        voc = num(voc)
-        n_to_keep = int(len(voc) * 0.20)
-        start = time.time()
-        voc.strip(n_to_keep=n_to_keep)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_strip_n_words_numericalized.__name__} ({n_trials}): {np.mean(times)} s, avg")
+def benchmark_strip_n_words_numericalized(klass, num, unk, n_trials=25, n_warmup=2, txt=None):
+    txt = fake_data() if txt is None else txt
+    times = measure(lambda voc: voc.strip(n_to_keep=int(len(voc) * 0.20)),
+                    (num(voc) for voc in _fresh(klass, unk, n_warmup + n_trials, txt)), n_warmup)
+    report(benchmark_strip_n_words_numericalized.__name__, times)
     return benchmark_strip_n_words_numericalized.__name__, times
 
 
-def benchmark_strip_by_freq(klass, unk, n_trials=25):
-    times = []
-    for _ in range(n_trials):
-        voc = klass(unk=unk)
-        txt = fake_data()
-        voc.add_iterable(txt)
-        start = time.time()
-        voc.strip(min_freq=3)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_strip_by_freq.__name__} ({n_trials}): {np.mean(times)} s, avg")
+def benchmark_stripped_n_words_numericalized(klass, num, unk, n_trials=25, n_warmup=2, txt=None):
+    """``stripped()`` views of one numericalization, at cutoffs from 5% to 95%."""
+    voc = klass(unk=unk)
+    voc.add_iterable(fake_data() if txt is None else txt)
+    voc = num(voc)
+    fractions = np.linspace(0.05, 0.95, n_warmup + n_trials)
+    times = measure(lambda frac: voc.stripped(n_to_keep=int(len(voc) * frac)), fractions, n_warmup)
+    report(benchmark_stripped_n_words_numericalized.__name__, times)
+    return benchmark_stripped_n_words_numericalized.__name__, times
+
+
+def benchmark_strip_by_freq(klass, unk, n_trials=25, n_warmup=2, txt=None):
+    txt = fake_data() if txt is None else txt
+    times = measure(lambda voc: voc.strip(min_freq=3), _fresh(klass, unk, n_warmup + n_trials, txt), n_warmup)
+    report(benchmark_strip_by_freq.__name__, times)
     return benchmark_strip_by_freq.__name__, times
 
 
-def benchmark_strip_by_freq_numericalized(klass, num, unk, n_trials=25):
-    times = []
-    for _ in range(n_trials):
+def benchmark_strip_by_freq_numericalized(klass, num, unk, n_trials=25, n_warmup=2, txt=None):
+    txt = fake_data() if txt is None else txt
+    times = measure(lambda voc: voc.strip(min_freq=3),
+                    (num(voc) for voc in _fresh(klass, unk, n_warmup + n_trials, txt)), n_warmup)
+    report(benchmark_strip_by_freq_numericalized.__name__, times)
+    return benchmark_strip_by_freq_numericalized.__name__, times
+
+
+def rss():
+    """Resident set size of this process in bytes, or ``None`` off Linux."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _max_rss():
+    # kilobytes on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def measure_memory(run):
+    """Memory ``run()`` allocates, holding on to its result.
+
+    ``tracemalloc`` sees Python objects and NumPy buffers; RSS also sees
+    what compiled code ``malloc``s, but counts pages (and the allocator's
+    slack), and its peak only moves once it beats the process' previous
+    one.
+
+    Returns
+    -------
+    result
+        What ``run()`` returned.
+    dict
+        ``peak_bytes``/``retained_bytes`` (``tracemalloc``, during and
+        after), ``rss_bytes`` (RSS delta) and ``rss_peak_bytes`` (growth of
+        the peak RSS).
+
+    """
+    gc.collect()
+    rss_before, max_rss_before = rss(), _max_rss()
+    tracemalloc.start()
+    try:
+        result = run()
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss_after = rss()
+    return result, {
+        "peak_bytes": peak,
+        "retained_bytes": retained,
+        "rss_bytes": None if rss_before is None else rss_after - rss_before,
+        "rss_peak_bytes": _max_rss() - max_rss_before,
+    }
+
+
+def _per(stats, n, unit):
+    stats.update({f"{key[:-len('_bytes')]}_per_{unit}": None if value is None else value / max(n, 1)
+                  for key, value in list(stats.items())})
+    return stats
+
+
+def _print_memory(name, stats):
+    print(f"{name}: peak {stats['peak_bytes'] / 2**20:.3g} MiB, retained {stats['retained_bytes'] / 2**20:.3g} MiB, "
+          + ", ".join(f"{key} {value:.3g} B" for key, value in stats.items() if "_per_" in key and key[:4] != "rss_"))
+
+
+def memory_building_vocab(klass, unk, txt=None):
+    txt = fake_data() if txt is None else txt
+
+    def build():
         voc = klass(unk=unk)
-        txt = fake_data()
         voc.add_iterable(txt)
-        voc = num(voc)
-        start = time.time()
-        voc.strip(min_freq=3)
-        end = time.time()
-        times.append(end - start)
-    print(f"{benchmark_strip_by_freq_numericalized.__name__} ({n_trials}): {np.mean(times)} s, avg")
-    return benchmark_strip_by_freq_numericalized.__name__, times
+        return voc
+    voc, stats = measure_memory(build)
+    _print_memory(memory_building_vocab.__name__, _per(stats, len(voc), "entry"))
+    return memory_building_vocab.__name__, stats
+
 
+def memory_numericalizing(voc, num):
+    _, stats = measure_memory(lambda: num(voc))
+    _print_memory(memory_numericalizing.__name__, _per(stats, len(voc), "entry"))
+    return memory_numericalizing.__name__, stats
 
-def benchmarks(klass, num, unk):
+
+def memory_strip_numericalized(voc, num):
+    """Memory of stripping a fresh ``num(voc)`` to 20%; per entry of the unstripped vocab."""
+    nums = num(voc)
+    _, stats = measure_memory(lambda: nums.strip(n_to_keep=int(len(nums) * 0.20)))
+    _print_memory(memory_strip_numericalized.__name__, _per(stats, len(voc), "entry"))
+    return memory_strip_numericalized.__name__, stats
+
+
+def memory_3d_sentence(voc, n_batches=10):
+    """Memory of decoding ``n_batches`` 3D batches, keeping the results; per decoded token."""
+    seq_len = 20
+    batch = 64
+    beam_size = 10
+    queries = [sentence_query(len(voc), (seq_len, beam_size, batch)) for _ in range(n_batches)]
+    voc.sentence(queries[0], axis=0)
+    sentences, stats = measure_memory(lambda: [voc.sentence(query, axis=0) for query in queries])
+    n_tokens = sum(len(sentence.split()) for decoded in sentences for sentence in np.ravel(decoded))
+    _print_memory(memory_3d_sentence.__name__, _per(stats, n_tokens, "token"))
+    return memory_3d_sentence.__name__, stats
+
+
+def benchmarks(klass, num, unk, txt=None):
+    """Run the suite over ``txt`` (a token list, e.g. ``ZipfCorpus.token_list()``), ``rando.txt`` by default."""
     bench = []
-    bench.append(benchmark_adding_iterable(klass, unk))
-    bench.append(benchmark_uncounting_iterable(klass, unk))
-    bench.append(benchmark_strip_n_words(klass, unk))
-    bench.append(benchmark_strip_n_words_numericalized(klass, num, unk))
-    bench.append(benchmark_strip_by_freq(klass, unk))
-    bench.append(benchmark_strip_by_freq_numericalized(klass, num, unk))
+    bench.append(benchmark_adding_iterable(klass, unk, txt=txt))
+    bench.append(benchmark_uncounting_iterable(klass, unk, txt=txt))
+    bench.append(benchmark_strip_n_words(klass, unk, txt=txt))
+    bench.append(benchmark_strip_n_words_numericalized(klass, num, unk, txt=txt))
+    bench.append(benchmark_stripped_n_words_numericalized(klass, num, unk, txt=txt))
+    bench.append(benchmark_strip_by_freq(klass, unk, txt=txt))
+    bench.append(benchmark_strip_by_freq_numericalized(klass, num, unk, txt=txt))
 
     voc = klass(unk=unk)
     # benchmark
-    txt = fake_data()
-    voc.add_iterable(txt)
+    voc.add_iterable(fake_data() if txt is None else txt)
     bench.append(benchmark_numericalizing(voc, num))
     voc = num(voc)
 
@@ -242,4 +447,17 @@ def benchmarks(klass, num, unk):
 
     # 3D word array, sentence random access
     bench.append(benchmark_3d_word_array_sentence_random_access(voc))
-    return dict(bench)
+
+    # the same hypotheses, ragged
+    bench.append(benchmark_ragged_sentence_random_access(voc))
+
+    # memory, kept apart from the timings
+    voc = klass(unk=unk)
+    voc.add_iterable(fake_data() if txt is None else txt)
+    memory = [
+        memory_building_vocab(klass, unk, txt=txt),
+        memory_numericalizing(voc, num),
+        memory_strip_numericalized(voc, num),
+        memory_3d_sentence(num(voc)),
+    ]
+    return dict(bench, memory=dict(memory))
@@ -1,24 +1,53 @@
+import argparse
 import json
 
-from benchmark import benchmarks
-from protovoc.numericalization.numpy import Numericalization as NpNum
-from protovoc.numericalization.numba import Numericalization as NbNum
-from protovoc.numericalization.cython.cython_0 import Numericalization as Cy0Num
-from protovoc.numericalization.cython.cython_1 import Numericalization as Cy1Num
-from protovoc.numericalization.cython.cython_2 import Numericalization as Cy2Num
-from protovoc.numericalization.cython.cython_3 import Numericalization as Cy3Num
+from benchmark import benchmark_sentence_sweep, benchmark_thread_scaling, benchmarks, fake_data
+from benchmark.zipf import ZipfCorpus
+from protovoc.numericalization import available, get_backend
 from protovoc.vocab.basic import Vocab as BasicVoc
 from protovoc.vocab.cython import Vocab as CyVoc
 
 
+# short name in benchmarks.json: (backend, vocab class)
+RUNS = {
+    "np": ("numpy", BasicVoc),
+    "nb": ("numba", BasicVoc),
+    "nbp": ("numba_parallel", BasicVoc),
+    "cy0": ("cython_0", BasicVoc),
+    "cy1": ("cython_1", CyVoc),
+    "cy2": ("cython_2", CyVoc),
+    "cy3": ("cython_3", CyVoc),
+    "cy4": ("cython_4", CyVoc),
+}
+
+
 if __name__ == "__main__":
-    benches = {
-        "np": benchmarks(BasicVoc, NpNum, unk=False),
-        "nb": benchmarks(BasicVoc, NbNum, unk=False),
-        "cy0": benchmarks(BasicVoc, Cy0Num, unk=False),
-        "cy1": benchmarks(CyVoc, Cy1Num, unk=False),
-        "cy2": benchmarks(CyVoc, Cy2Num, unk=False),
-        "cy3": benchmarks(CyVoc, Cy3Num, unk=False),
-    }
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--zipf-types", type=int, help="benchmark a Zipfian corpus of this many types, not rando.txt")
+    parser.add_argument("--zipf-tokens", type=int, default=1000000)
+    parser.add_argument("--zipf-exponent", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    txt = None
+    if args.zipf_types:
+        txt = ZipfCorpus(args.zipf_types, args.zipf_tokens, exponent=args.zipf_exponent, seed=args.seed).token_list()
+
+    found = available()
+    if "numba_parallel" in found:
+        from protovoc.numericalization.numba_parallel import prefer_openmp
+
+        prefer_openmp()
+    runs = {short: (get_backend(name), klass) for short, (name, klass) in RUNS.items() if name in found}
+    benches = {short: benchmarks(klass, num, unk=False, txt=txt) for short, (num, klass) in runs.items()}
+    if "cy4" in benches:
+        voc = CyVoc(unk=False)
+        voc.add_iterable(fake_data() if txt is None else txt)
+        benches["cy4"].update([benchmark_thread_scaling(get_backend("cython_4")(voc))])
     with open("benchmarks.json", "w") as f:
         json.dump(benches, f)
+
+    sweeps = {
+        short: benchmark_sentence_sweep(klass, num, exponent=args.zipf_exponent, seed=args.seed)
+        for short, (num, klass) in runs.items()}
+    with open("sweeps.json", "w") as f:
+        json.dump(sweeps, f)
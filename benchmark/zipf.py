@@ -0,0 +1,130 @@
+"""Seeded synthetic corpora with Zipfian word frequencies.
+
+``rando.txt`` has a few thousand types, which fit in cache and hide how
+backends scale to production vocabs. :class:`ZipfCorpus` draws any
+number of tokens over up to ~10M types, with the frequency of the type
+of rank ``r`` proportional to ``r ** -exponent``:
+
+* Types are bijective base 26 words (``a``, ..., ``z``, ``aa``, ...), so
+  frequent types are short like real ones, and each is at most 5-6 bytes.
+* Tokens are drawn in blocks of ``BLOCK_SIZE``, each from its own
+  stream spawned from ``seed``, and re-cut to the consumer's chunk
+  size: the corpus only depends on the seed, and is never held in
+  memory whole.
+* :meth:`ZipfCorpus.write` streams it to a text file;
+  :meth:`ZipfCorpus.counts` gives expected counts, for building a large
+  vocab without drawing tokens; :meth:`ZipfCorpus.id_tensors` draws id
+  arrays for decoding benchmarks.
+
+"""
+import numpy as np
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+BLOCK_SIZE = 1 << 16
+LETTERS = 26
+
+
+def zipf_probs(n_types, exponent=1.0):
+    """Probability of each rank, ``r ** -exponent`` normalized over ``n_types`` ranks."""
+    weights = np.arange(1, n_types + 1, dtype=np.float64) ** -exponent
+    return weights / weights.sum()
+
+
+def type_strings(n_types):
+    """The first ``n_types`` bijective base 26 words as a ``S`` array: ``a``, ..., ``z``, ``aa``, ..."""
+    rest = np.arange(1, n_types + 1, dtype=np.int64)
+    width = 1
+    while LETTERS ** (width + 1) // (LETTERS - 1) <= n_types:
+        width += 1
+    width += 1
+    digits = np.zeros((n_types, width), dtype=np.uint8)
+    lens = np.zeros(n_types, dtype=np.int64)
+    # least significant letter first
+    for k in range(width):
+        active = rest > 0
+        rest = rest - active
+        digits[:, k] = np.where(active, ord("a") + rest % LETTERS, 0)
+        rest //= LETTERS
+        lens += active
+    cols = lens[:, None] - 1 - np.arange(width)
+    chars = np.where(cols >= 0, np.take_along_axis(digits, np.maximum(cols, 0), axis=1), 0)
+    return np.ascontiguousarray(chars, dtype=np.uint8).view(f"S{width}").ravel()
+
+
+class ZipfCorpus:
+    """``n_tokens`` tokens over ``n_types`` types of Zipfian frequency.
+
+    Parameters
+    ----------
+    n_types : int
+        Vocab size; up to ~10M is practical (an 8 byte CDF entry and a
+        few bytes of word per type).
+    n_tokens : int
+        Corpus length.
+    exponent : float
+        Zipf exponent; ~1 for natural text, higher is more skewed.
+    seed : int
+
+    """
+    def __init__(self, n_types, n_tokens, exponent=1.0, seed=0):
+        self.n_types = n_types
+        self.n_tokens = n_tokens
+        self.exponent = exponent
+        self.seed = seed
+        self.probs = zipf_probs(n_types, exponent)
+        self._cdf = np.cumsum(self.probs)
+        self._cdf[-1] = 1.0
+        self.types = type_strings(n_types)
+
+    def _draw(self, rng, size):
+        return np.searchsorted(self._cdf, rng.random(size), side="right")
+
+    def _blocks(self):
+        for block, start in enumerate(range(0, self.n_tokens, BLOCK_SIZE)):
+            rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(0, block)))
+            yield self._draw(rng, min(BLOCK_SIZE, self.n_tokens - start))
+
+    def ids(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield the corpus as arrays of type ranks, ``chunk_size`` at a time."""
+        buf = np.zeros(0, dtype=np.int64)
+        for block in self._blocks():
+            buf = np.concatenate([buf, block])
+            n_full = len(buf) - len(buf) % chunk_size
+            for start in range(0, n_full, chunk_size):
+                yield buf[start:start + chunk_size]
+            buf = buf[n_full:]
+        if len(buf):
+            yield buf
+
+    def tokens(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield the corpus as lists of ``str`` tokens (e.g. for ``add_iterable``)."""
+        for ids in self.ids(chunk_size):
+            yield self.types[ids].astype(str).tolist()
+
+    def token_list(self):
+        """The whole corpus as one list of ``str``. Only for small corpora."""
+        return [token for chunk in self.tokens() for token in chunk]
+
+    def write(self, path, chunk_size=DEFAULT_CHUNK_SIZE, line_len=20):
+        """Write the corpus as UTF-8 text, ``line_len`` space separated tokens per line."""
+        with open(path, "wb") as f:
+            for ids in self.ids(chunk_size):
+                words = self.types[ids].tolist()
+                f.writelines(b" ".join(words[i:i + line_len]) + b"\n" for i in range(0, len(words), line_len))
+
+    def counts(self):
+        """Expected count of every type (at least 1), as a ``{word: count}`` dict."""
+        expected = np.maximum(np.rint(self.probs * self.n_tokens), 1).astype(np.int64)
+        return dict(zip(self.types.astype(str).tolist(), expected.tolist()))
+
+    def id_tensors(self, shape, n, offset=0):
+        """Yield ``n`` arrays of Zipfian ids of ``shape``, plus ``offset`` (e.g. the number of specials).
+
+        Ranks of a vocab built from :meth:`counts` match type ranks, so these
+        hit frequent words as often as real model output would.
+
+        """
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(1,)))
+        for _ in range(n):
+            yield self._draw(rng, shape) + offset
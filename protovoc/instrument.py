@@ -0,0 +1,233 @@
+"""Opt-in counters and timers for numericalizations and vocabs.
+
+Nothing is instrumented unless wrapped: ``Instrumented(num)`` behaves
+like ``num`` (any backend, or a vocab) and records, per operation:
+
+* calls, tokens processed and cumulative seconds, plus p50/p95/p99 over
+  the last ``window`` calls;
+* unk hits of ``integer[...]`` and ``integer.encode_batch()``, and OOV
+  misses (``KeyError`` without an unk).
+
+Operations are ``integer``, ``integer.encode_batch``, ``string``,
+``sentence``, ``strip`` and, on vocabs, the ``add*``/``uncount*``
+methods. With ``phases=True``, dense ``sentence()`` is also split into
+``sentence.mask`` (the backend's own stop search, through
+``sentence_view()``), then ``sentence.numpy_gather`` (picking the kept
+ids), ``sentence.numpy_join`` (laying out the bytes) and
+``sentence.numpy_format`` (building the output). Those three are the
+NumPy functions of :mod:`protovoc.numericalization.decode` whatever the
+backend, hence the names: the result is the same, but a compiled
+backend's own fused join kernel is not what they time.
+
+``metrics.snapshot()`` gives everything as a dict; ``hook(name, seconds,
+n_tokens)`` is called after every recorded operation, to export to a
+metrics system.
+
+"""
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from protovoc.numericalization.decode import as_rows, format_rows, join_flat
+
+
+DEFAULT_WINDOW = 1024
+PERCENTILES = (50, 95, 99)
+VOCAB_METHODS = ("add", "add_iterable", "add_counts", "uncount", "uncount_iterable", "uncount_counts")
+
+
+class Metrics:
+    """Counters and timers, by operation name.
+
+    Parameters
+    ----------
+    hook : callable, optional
+        ``hook(name, seconds, n_tokens)``, called after every operation.
+    window : int
+        Number of latest timings per operation the percentiles are over.
+
+    """
+    def __init__(self, hook=None, window=DEFAULT_WINDOW):
+        self.hook = hook
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.calls = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.unk_hits = 0
+        self.oov_misses = 0
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, name, seconds, n_tokens=0):
+        self.calls[name] += 1
+        self.tokens[name] += n_tokens
+        self.seconds[name] += seconds
+        self._recent[name].append(seconds)
+        if self.hook is not None:
+            self.hook(name, seconds, n_tokens)
+
+    def snapshot(self):
+        """Everything recorded so far, as plain ``dict``s and numbers."""
+        ops = {}
+        for name, calls in self.calls.items():
+            recent = np.asarray(self._recent[name])
+            ops[name] = {"calls": calls, "tokens": self.tokens[name], "seconds": self.seconds[name]}
+            ops[name].update((f"p{q}", float(p)) for q, p in zip(PERCENTILES, np.percentile(recent, PERCENTILES)))
+        looked_up = self.tokens.get("integer", 0) + self.tokens.get("integer.encode_batch", 0)
+        return {
+            "ops": ops,
+            "unk_hits": self.unk_hits,
+            "oov_misses": self.oov_misses,
+            "unk_rate": self.unk_hits / looked_up if looked_up else 0.0,
+        }
+
+
+def _n_tokens(query):
+    if isinstance(query, (str, bytes, int, np.integer)):
+        return 1
+    try:
+        return int(np.size(query)) if isinstance(query, np.ndarray) else len(query)
+    except TypeError:
+        return 0
+
+
+def _n_counted(words, counts=None):
+    """Tokens a ``*_counts`` call adds or removes: the sum of its counts, not the number of words."""
+    if counts is None:
+        return int(sum(words.values()))
+    return int(np.sum(counts))
+
+
+class _Interface:
+    """``integer``/``string`` of an instrumented numericalization."""
+    def __init__(self, target, name, metrics, unk_id=None):
+        self._target = target
+        self._name = name
+        self._metrics = metrics
+        self._unk_id = unk_id
+
+    def __getitem__(self, query):
+        start = time.perf_counter()
+        try:
+            result = self._target[query]
+        except KeyError:
+            self._metrics.oov_misses += 1
+            raise
+        finally:
+            self._metrics.record(self._name, time.perf_counter() - start, _n_tokens(query))
+        if self._unk_id is not None:
+            self._metrics.unk_hits += int(np.count_nonzero(np.asarray(result) == self._unk_id))
+        return result
+
+    def __contains__(self, item):
+        return item in self._target
+
+    def encode_batch(self, batch, *args, **kwargs):
+        start = time.perf_counter()
+        result = self._target.encode_batch(batch, *args, **kwargs)
+        n_tokens = sum(len(seq) for seq in batch)
+        self._metrics.record(f"{self._name}.encode_batch", time.perf_counter() - start, n_tokens)
+        if self._unk_id is not None:
+            ids = result[0] if isinstance(result, tuple) else result
+            self._metrics.unk_hits += int(np.count_nonzero(ids == self._unk_id))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class Instrumented:
+    """``target`` (a numericalization or vocab), recording into ``metrics``.
+
+    Parameters
+    ----------
+    target
+        Any backend's ``Numericalization``, or a vocab.
+    hook : callable, optional
+        See :class:`Metrics`. Ignored if ``metrics`` is given.
+    phases : bool
+        Time the phases of ``sentence()`` too (see the module docs).
+    metrics : Metrics, optional
+        Share one between several wrapped objects.
+
+    """
+    def __init__(self, target, hook=None, phases=False, metrics=None):
+        object.__setattr__(self, "target", target)
+        object.__setattr__(self, "metrics", Metrics(hook) if metrics is None else metrics)
+        object.__setattr__(self, "phases", phases)
+        object.__setattr__(self, "_interfaces", {})
+
+    def _interface(self, name):
+        current = getattr(self.target, name)
+        cached = self._interfaces.get(name)
+        if cached is None or cached._target is not current:
+            unk = getattr(self.target, "unk", None)
+            unk_id = current[unk] if name == "integer" and unk else None
+            cached = self._interfaces[name] = _Interface(current, name, self.metrics, unk_id)
+        return cached
+
+    @property
+    def integer(self):
+        return self._interface("integer")
+
+    @property
+    def string(self):
+        return self._interface("string")
+
+    def _timed(self, name, fn, n_tokens, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.metrics.record(name, time.perf_counter() - start, n_tokens)
+
+    def sentence(self, integers, axis=0, output=None, offsets=None, lengths=None):
+        if offsets is not None or lengths is not None:
+            return self._timed("sentence", self.target.sentence, int(np.size(integers)), integers,
+                               output=output, offsets=offsets, lengths=lengths)
+        if not self.phases:
+            return self._timed("sentence", self.target.sentence, int(np.size(integers)), integers, axis=axis, output=output)
+        record = self.metrics.record
+        n_tokens = int(np.size(integers))
+        start = time.perf_counter()
+        view = self.target.sentence_view(integers, axis=axis)
+        masked = time.perf_counter()
+        record("sentence.mask", masked - start, n_tokens)
+        # the ids the backend checked, e.g. with a stripped view's cut off ids as unk
+        rows, shape = as_rows(view.ids, -1)
+        stops = view.stops.reshape(-1)
+        tokens = rows[np.arange(rows.shape[1]) < stops[:, None]].astype(np.int64, copy=False)
+        gathered = time.perf_counter()
+        record("sentence.numpy_gather", gathered - masked, n_tokens)
+        buf, starts, ends = join_flat(self.target.i2s, tokens, stops)
+        joined = time.perf_counter()
+        record("sentence.numpy_join", joined - gathered, len(tokens))
+        result = format_rows(buf, starts, ends, shape, output)
+        done = time.perf_counter()
+        record("sentence.numpy_format", done - joined, len(tokens))
+        record("sentence", done - start, n_tokens)
+        return result
+
+    def strip(self, *args, **kwargs):
+        return self._timed("strip", self.target.strip, len(self.target), *args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if name in VOCAB_METHODS and callable(attr):
+            def timed(words, *args, **kwargs):
+                if name.endswith("_counts"):
+                    n_tokens = _n_counted(words, *args, **kwargs)
+                else:
+                    n_tokens = _n_tokens(words)
+                return self._timed(name, attr, n_tokens, words, *args, **kwargs)
+            return timed
+        return attr
+
+    def __setattr__(self, name, value):
+        setattr(self.target, name, value)
+
+    def __len__(self):
+        return len(self.target)
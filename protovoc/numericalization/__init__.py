@@ -0,0 +1 @@
+from protovoc.numericalization.registry import BACKENDS, available, calibrate, get_backend
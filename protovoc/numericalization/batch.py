@@ -0,0 +1,166 @@
+"""Batch encoding shared by the numericalization backends.
+
+:func:`encode_batch()`:
+* One ``dict.get`` pass over the chained tokens (no per-string recursion),
+  or one vectorized ``HashIndex.lookup``.
+* OOVs are found with a single ``< 0`` test and mapped to unk in bulk.
+* Rows are placed with a vectorized scatter into a padded matrix, or into
+  a flat ids array with row offsets (``ragged=True``).
+
+``out=`` only saves allocating the result: the lookup still builds the
+flat ids of the whole batch (and the hash index a copy of its bytes), and
+the NumPy scatter its row and column indices, all ``O(tokens)``.
+
+"""
+from itertools import chain, repeat
+
+import numpy as np
+
+from protovoc.numericalization.index import HashIndex, unwrap
+from protovoc.numericalization.strings import StringStore
+
+
+OOV = -1
+
+
+def as_id(s2i, token):
+    """Resolve a special given either as a string or as an integer id."""
+    if token is None:
+        return None
+    if isinstance(token, str):
+        return s2i[token]
+    return int(token)
+
+
+def lookup_flat(s2i, batch, unk_i=None):
+    """Map every token of a list of token lists to its id in one pass.
+
+    Returns
+    -------
+    flat : np.ndarray[int64]
+        The ids of all tokens, row after row.
+    lengths : np.ndarray[int64]
+        The number of tokens in each row.
+
+    """
+    lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+    tokens = chain.from_iterable(batch)
+    index, n = unwrap(s2i)
+    if isinstance(index, HashIndex):
+        query = StringStore.from_strings(tokens)
+        flat, oov = index.lookup(query.data, query.offsets)
+        oov |= flat >= n
+    else:
+        flat = np.fromiter(map(s2i.get, tokens, repeat(OOV)), dtype=np.int64, count=int(lengths.sum()))
+        oov = flat < 0
+    if oov.any():
+        if unk_i is None:
+            first = int(np.argmax(oov))
+            raise KeyError(f"Couldn't find {list(chain.from_iterable(batch))[first]}")
+        flat[oov] = unk_i
+    return flat, lengths
+
+
+def scatter(flat, lengths, keep_lens, shift, out):
+    """Copy the first ``keep_lens[r]`` ids of every row ``r`` of ``flat``
+    into ``out[r, shift:]``."""
+    row_of = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    col = np.arange(len(flat)) - starts[row_of]
+    keep = col < keep_lens[row_of]
+    out[row_of[keep], col[keep] + shift] = flat[keep]
+
+
+def scatter_ragged(flat, lengths, keep_lens, shift, offsets, out):
+    """Like :func:`scatter()`, but rows start at ``offsets`` in a flat ``out``."""
+    row_of = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    col = np.arange(len(flat)) - starts[row_of]
+    keep = col < keep_lens[row_of]
+    out[offsets[row_of[keep]] + shift + col[keep]] = flat[keep]
+
+
+def encode_batch(s2i, unk_i, batch, pad=None, bos=None, eos=None, max_len=None,
+                 out=None, ragged=False, scatter_fn=scatter, scatter_ragged_fn=scatter_ragged,
+                 lookup_fn=lookup_flat):
+    """Encode a list of token lists.
+
+    Parameters
+    ----------
+    s2i : Mapping[str, int]
+        String to integer lookup. Only ``.get`` and ``[]`` are used.
+    unk_i : int or None
+        Id that OOVs map to. If ``None``, an OOV raises ``KeyError``.
+    batch : list[list[str]]
+        The token lists.
+    pad, bos, eos : str or int, optional
+        Specials as strings or ids. ``pad`` is required for padded output.
+        ``bos``/``eos`` are written around every row if given.
+    max_len : int, optional
+        Cap on the row length, ``bos`` and ``eos`` included. Longer rows are
+        truncated (``eos`` is kept). For padded output it is also the width.
+    out : np.ndarray[int64], optional
+        Preallocated buffer. ``(>= len(batch), >= width)`` for padded output,
+        ``(>= total,)`` for ragged output. A view of it is returned. The
+        temporaries of the lookup and scatter are allocated regardless.
+    ragged : bool
+        Return flat ids and offsets instead of a padded matrix.
+    scatter_fn, scatter_ragged_fn : callable
+        Backend hooks with the signatures of :func:`scatter()` and
+        :func:`scatter_ragged()`.
+    lookup_fn : callable
+        Backend hook with the signature of :func:`lookup_flat()`.
+
+    Returns
+    -------
+    (ids, lengths) : (np.ndarray[int64], np.ndarray[int64])
+        ``ids`` is ``(len(batch), width)``, batch first. Decode it with
+        ``sentence(ids, axis=1)``.
+    (ids, offsets) : (np.ndarray[int64], np.ndarray[int64])
+        If ``ragged``. Row ``r`` is ``ids[offsets[r]:offsets[r + 1]]``.
+
+    """
+    pad, bos, eos = as_id(s2i, pad), as_id(s2i, bos), as_id(s2i, eos)
+    flat, lengths = lookup_fn(s2i, batch, unk_i)
+    shift = int(bos is not None)
+    n_extra = shift + int(eos is not None)
+    if max_len is not None:
+        if max_len < n_extra:
+            raise ValueError(f"max_len={max_len} leaves no room for bos/eos")
+        keep_lens = np.minimum(lengths, max_len - n_extra)
+    else:
+        keep_lens = lengths
+    row_lens = keep_lens + n_extra
+    n_rows = len(batch)
+
+    if ragged:
+        offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(row_lens, out=offsets[1:])
+        total = int(offsets[-1])
+        if out is None:
+            out = np.empty(total, dtype=np.int64)
+        elif out.shape[0] < total:
+            raise ValueError(f"out has room for {out.shape[0]} ids, need {total}")
+        ids = out[:total]
+        scatter_ragged_fn(flat, lengths, keep_lens, shift, offsets, ids)
+        if bos is not None:
+            ids[offsets[:-1]] = bos
+        if eos is not None:
+            ids[offsets[1:] - 1] = eos
+        return ids, offsets
+
+    if pad is None:
+        raise ValueError("pad is required for padded output")
+    width = int(max_len) if max_len is not None else int(row_lens.max(initial=0))
+    if out is None:
+        out = np.empty((n_rows, width), dtype=np.int64)
+    elif out.shape[0] < n_rows or out.shape[1] < width:
+        raise ValueError(f"out is {out.shape}, need at least {(n_rows, width)}")
+    ids = out[:n_rows, :width]
+    ids.fill(pad)
+    scatter_fn(flat, lengths, keep_lens, shift, ids)
+    if bos is not None:
+        ids[:, 0] = bos
+    if eos is not None:
+        ids[np.arange(n_rows), keep_lens + shift] = eos
+    return ids, row_lens
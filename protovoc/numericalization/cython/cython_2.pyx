@@ -9,7 +9,8 @@
 :func:`sentence()`:
 * switch(ndim)
   - 1: See cython_1
-  - else: See cython_0
+  - else: vectorized ``integers < cutoff`` and the first True per row.
+* See cython_1 for the join.
 :func:`strip()`:
 * Uses np.searchsorted (np equiv of bisect)
 * re-caches len(cts) and nummber of specials
@@ -21,13 +22,21 @@ import numpy as np
 cimport numpy as np
 cimport cython
 
+from protovoc.numericalization import incremental, shared, storage
+from protovoc.numericalization.batch import encode_batch
+from protovoc.numericalization.decode import (
+    SentenceView, as_rows, checked_ids, format_rows, join_ragged, ragged_rows, ragged_stops_below, stops_below)
+from protovoc.numericalization.index import PrefixIndex, make_index, rebuild
+from protovoc.numericalization.strings import StringStore
+from protovoc.vocab.strip import prefix_len
+
 ctypedef np.int64_t LONG_t
 ctypedef np.float64_t FLOAT_t
 ctypedef np.uint8_t BOOL_t
 
 
 cdef class _CyStrInterface:
-    cdef readonly np.ndarray i2s
+    cdef readonly object i2s
     def __init__(self, i2s):
         self.i2s = i2s
 
@@ -42,7 +51,7 @@ cdef class _CyStrInterface:
 
 
 cdef class _CyIntInterface:
-    cdef readonly dict s2i
+    cdef readonly object s2i
     cdef readonly int unk_i
     cdef readonly bint has_unk
     def __init__(self, s2i, unk, has_unk):
@@ -69,54 +78,52 @@ cdef class _CyIntInterface:
     def __contains__(self, int_):
         return int_ < len(self.s2i)
 
+    def encode_batch(self, batch, pad=None, bos=None, eos=None, max_len=None, out=None, ragged=False):
+        return encode_batch(
+            self.s2i, self.unk_i if self.has_unk else None, batch, pad=pad, bos=bos, eos=eos,
+            max_len=max_len, out=out, ragged=ragged)
+
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-cdef np.ndarray[BOOL_t, ndim=1, cast=True] _isin_cumsum_ge0(np.ndarray[LONG_t, ndim=1] elements, int cutoff):
-    n_elems = len(elements)
-    cdef int elem_idx
+cdef Py_ssize_t _first_below(np.ndarray[LONG_t, ndim=1] elements, int cutoff) except -1:
+    cdef Py_ssize_t n_elems = len(elements)
+    cdef Py_ssize_t elem_idx
     for elem_idx in range(0, n_elems):
         if elements[elem_idx] < cutoff:
-            return np.concatenate((np.zeros(elem_idx, dtype=bool), np.ones(n_elems - elem_idx, dtype=bool)))
-
-    return np.zeros(n_elems, dtype=bool)
-
-
-@cython.boundscheck(False)  # Deactivate bounds checking
-@cython.wraparound(False)   # Deactivate negative indexing.
-cdef str _sentence_1d(
-        np.ndarray[LONG_t, ndim=1] integers,
-        int cutoff,
-        np.ndarray[object, ndim=1] strings):
-    cdef np.ndarray[object, ndim=1] strs = strings[integers]
-    strs[1:] = " " + strs[1:]
-    strs[_isin_cumsum_ge0(integers, cutoff)] = ""
-    cdef str string = strs.sum()
-    return string
+            return elem_idx
+    return n_elems
 
 
 @cython.boundscheck(False)  # Deactivate bounds checking
 @cython.wraparound(False)   # Deactivate negative indexing.
-cdef np.ndarray _sentence(
-        np.ndarray integers,
-        int axis,
-        int cutoff,
-        np.ndarray[object, ndim=1] strings):
-    cdef np.ndarray strs = strings[integers]
-    cdef list idx_l = []
-    cdef Py_ssize_t shape
-    cdef int i
-    for i in range(0, strs.ndim):
-        shape = strs.shape[i]
-        if i == axis:
-            idx_l.append(slice(1, shape))
-            continue
-        idx_l.append(slice(0, shape))
-    cdef tuple idx_t = tuple(idx_l)
-    strs[idx_t] = " " + strs[idx_t]
-    strs[(integers < cutoff).cumsum(axis=axis) != 0] = ""
-    strs = strs.sum(axis=axis)
-    return strs
+cdef tuple _join_flat(
+        const unsigned char[:] data,
+        const LONG_t[:] offsets,
+        const LONG_t[:, :] rows,
+        const LONG_t[:] stops):
+    cdef Py_ssize_t n_rows = rows.shape[0]
+    cdef Py_ssize_t row, col, pos = 0, total = 0
+    cdef LONG_t tok, byte
+    for row in range(n_rows):
+        for col in range(stops[row]):
+            tok = rows[row, col]
+            total += offsets[tok + 1] - offsets[tok] + 1
+    cdef np.ndarray[np.uint8_t, ndim=1] buf = np.empty(total, dtype=np.uint8)
+    cdef np.ndarray[LONG_t, ndim=1] starts = np.empty(n_rows, dtype=np.int64)
+    cdef np.ndarray[LONG_t, ndim=1] ends = np.empty(n_rows, dtype=np.int64)
+    for row in range(n_rows):
+        starts[row] = pos
+        for col in range(stops[row]):
+            if col:
+                buf[pos] = 32
+                pos += 1
+            tok = rows[row, col]
+            for byte in range(offsets[tok], offsets[tok + 1]):
+                buf[pos] = data[byte]
+                pos += 1
+        ends[row] = pos
+    return buf[:pos], starts, ends
 
 
 cdef class Numericalization:
@@ -127,34 +134,38 @@ cdef class Numericalization:
     cpdef readonly _CyStrInterface string
     cpdef readonly _CyIntInterface integer
     cdef readonly np.ndarray cts
-    cdef readonly np.ndarray i2s
-    cdef readonly dict s2i
+    cdef readonly object i2s
+    cdef readonly object s2i
+    cdef readonly object _vocab
+    cdef object _changes
+    cdef readonly object _segment
     cdef readonly int _len_cts
     cdef readonly int _n_spec
     cdef readonly int _cutoff
 
-    def __init__(self, vocab):
-        self.specials = vocab.specials
-        self.unk = vocab.unk
-        self.has_unk = vocab.has_unk
-        self._specials_maybe_w_unk = vocab._specials_maybe_w_unk
-        self._n_spec = len(self._specials_maybe_w_unk)
+    def __init__(self, vocab, index="dict", track=False):
+        self._vocab = vocab if track else None
+        self._changes = vocab.watch() if track else None
         unordered_cts = np.asarray(list(vocab.s2c.values()), dtype=np.float64)
         idxs_desc = np.argsort(unordered_cts)[::-1]
-        unordered_strs = np.asarray(list(vocab.s2c.keys()), dtype=object)
-        self.cts = unordered_cts[idxs_desc]
-        self.i2s = unordered_strs[idxs_desc]
-        self.s2i = {s: i for i, s in enumerate(self.i2s)}
+        unordered_strs = StringStore.from_strings(vocab.s2c.keys())
+        i2s = unordered_strs.take(idxs_desc)
+        unk = vocab.unk if vocab.has_unk else False
         # move unk to last position so that it gets threshed
+        cts, i2s = storage.canonical(vocab.specials, unk, unordered_cts[idxs_desc], i2s)
+        self._build(vocab.specials, unk, cts, i2s, make_index(index, i2s))
+
+    cdef _build(self, specials, unk, np.ndarray cts, i2s, s2i):
+        self.specials = specials
+        self.has_unk = unk is not False and unk is not None
+        self.unk = unk if self.has_unk else ""
+        self._specials_maybe_w_unk = set(specials)
         if self.has_unk:
-            unk_at = self.s2i[self.unk]
-            if unk_at != self._n_spec - 1:
-                unk_to = self._n_spec - 1
-                self.s2i[self.unk] = unk_to
-                was_at_unk_to = self.i2s[unk_to]
-                self.s2i[was_at_unk_to] = unk_at
-                self.i2s[unk_at], self.i2s[unk_to] = self.i2s[unk_to], self.i2s[unk_at]
-                self.cts[unk_at], self.cts[unk_to] = self.cts[unk_to], self.cts[unk_to]
+            self._specials_maybe_w_unk.add(self.unk)
+        self._n_spec = len(self._specials_maybe_w_unk)
+        self.cts = cts
+        self.i2s = i2s
+        self.s2i = s2i
 
         self.integer = _CyIntInterface(self.s2i, self.unk, self.has_unk)
         self.permit_unk(False)
@@ -167,17 +178,85 @@ cdef class Numericalization:
         else:
             self._cutoff = self._n_spec
 
-    def sentence(self, integers, axis=0):
+    def refresh(self):
+        """Apply the count changes of the tracked vocab (``track=True``).
+
+        Moves only the changed entries. See
+        :mod:`protovoc.numericalization.incremental`.
+
+        """
+        if self._changes is None:
+            raise ValueError("Not tracking a vocab, construct with track=True")
+        permitted = self._cutoff == self._n_spec - 1
+        cts, i2s, s2i = incremental.refresh(
+            self._vocab, self._changes, self._n_spec, self.cts, self.i2s, self.s2i)
+        self._build(self.specials, self.unk if self.has_unk else False, cts, i2s, s2i)
+        self.permit_unk(permitted)
+
+    def save(self, path):
+        storage.save(path, self.specials, self.unk if self.has_unk else False, self.cts, self.i2s)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls._from_parts(storage.canonical_parts(storage.load(path, mmap=mmap)))
+
+    @classmethod
+    def _from_parts(cls, parts, permitted=False, segment=None):
+        cdef Numericalization self = cls.__new__(cls)
+        specials, unk, cts, i2s, s2i = parts
+        self._build(specials, unk, cts, i2s, s2i)
+        self.permit_unk(permitted)
+        self._segment = segment
+        return self
+
+    def share_memory(self):
+        """Move counts, strings and index to shared memory, for data loader workers.
+
+        See :mod:`protovoc.numericalization.shared`.
+
+        """
+        permitted = self._cutoff == self._n_spec - 1
+        self._segment = shared.share(self.specials, self.unk if self.has_unk else False, self.cts, self.i2s)
+        specials, unk, cts, i2s, s2i = self._segment.parts
+        self._build(specials, unk, cts, i2s, s2i)
+        self.permit_unk(permitted)
+        return self
+
+    def __reduce__(self):
+        return shared.reduce(type(self), self._segment, self.specials, self.unk if self.has_unk else False,
+                             self.cts, self.i2s, self.s2i, self._cutoff == self._n_spec - 1)
+
+    def sentence(self, integers, axis=0, output=None, offsets=None, lengths=None):
+        if offsets is not None or lengths is not None:
+            ids, starts, lens = ragged_rows(integers, offsets, lengths)
+            ids = checked_ids(ids, len(self.i2s), self.s2i, self.unk)
+            stops = ragged_stops_below(ids, starts, lens, self._cutoff)
+            return join_ragged(self.i2s, ids, starts, stops, output), stops
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        rows, shape = as_rows(integers, axis)
         if integers.ndim == 1:
-            return _sentence_1d(integers, self._cutoff, self.i2s)
+            stops = np.asarray([_first_below(integers, self._cutoff)], dtype=np.int64)
         else:
-            return _sentence(integers, axis, self._cutoff, self.i2s)
+            stops = stops_below(integers, self._cutoff, axis).reshape(-1)
+        buf, starts, ends = _join_flat(self.i2s.data, self.i2s.offsets, rows, stops)
+        return format_rows(buf, starts, ends, shape, output)
+
+    def sentence_view(self, integers, axis=0):
+        """Like :meth:`sentence`, but rows are joined on first access.
+
+        See :class:`~protovoc.numericalization.decode.SentenceView`.
+
+        """
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        if integers.ndim == 1:
+            return SentenceView(self.i2s, integers, _first_below(integers, self._cutoff), axis)
+        return SentenceView(self.i2s, integers, stops_below(integers, self._cutoff, axis), axis)
 
     def __len__(self):
         return self._len_cts
 
     def strip(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
-        # TODO: This is actually only valid if you haven't been adding...
+        # counts as of construction or the last refresh(), which keeps cts sorted descending
         if min_freq > 0:
             n_freq_enough = self._len_cts - np.searchsorted(self.cts[::-1], min_freq)
         else:
@@ -194,6 +273,21 @@ cdef class Numericalization:
         self.cts = self.cts[:n_to_keep]
         self._len_cts = len(self.cts)
         self.i2s = self.i2s[:n_to_keep]
-        self.s2i = {s: i for i, s in enumerate(self.i2s)}
+        self.s2i = rebuild(self.s2i, self.i2s)
         self.integer = _CyIntInterface(self.s2i, self.unk, self.has_unk)
         self.string = _CyStrInterface(self.i2s)
+
+    def stripped(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
+        """Like :meth:`strip`, but as a new numericalization, leaving this one as is.
+
+        It's a view: ``cts`` and ``i2s`` are prefixes of these and ``s2i``
+        a :class:`~protovoc.numericalization.index.PrefixIndex` of this
+        one, so it takes O(1) to make. Words past the cut are OOV (unk), and
+        their ids decode as unk (or raise ``IndexError`` without one).
+        ``strip()`` on this one leaves it be, but ``refresh()`` may update a
+        ``dict`` or hash index in place.
+
+        """
+        n = min(prefix_len(self.cts, self._n_spec, n_to_keep, min_freq, minimal), len(self.cts))
+        parts = storage.Parts(self.specials, self.unk if self.has_unk else False, self.cts[:n], self.i2s[:n], PrefixIndex(self.s2i, n))
+        return type(self)._from_parts(parts, self._cutoff == self._n_spec - 1)
@@ -0,0 +1,513 @@
+"""GIL-free Cython implementation.
+
+Like cython_1 (unk last among the specials, cutoff stops), but every
+loop over ids or bytes runs under ``nogil`` on typed memoryviews, so
+threads calling into one numericalization run in parallel. Only
+allocating outputs and building the final ``str`` objects take the GIL.
+
+``.string``:
+* See cython_1.
+``.index``:
+* ``s2i`` defaults to a :class:`~protovoc.numericalization.index.HashIndex`;
+  ``encode_batch`` probes it with a ``nogil`` kernel over the tokens'
+  UTF-8 bytes, then scatters ids into the output ``nogil``.
+* With a ``dict`` index, falls back to the ``dict.get`` pass.
+:func:`sentence()`:
+* Stops (first id below the cutoff) and the two pass byte join
+  (size, then fill) are ``nogil`` over the row view of the ids, or over
+  the flat ids and row starts of ragged input.
+:func:`sentence_many()`, :func:`encode_many()`:
+* Map ``sentence`` / ``encode_batch`` over a list of batches with a
+  ``concurrent.futures`` executor (a thread pool by default).
+
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+
+import numpy as np
+cimport numpy as np
+cimport cython
+
+from protovoc.numericalization import incremental, shared, storage
+from protovoc.numericalization.batch import encode_batch, lookup_flat
+from protovoc.numericalization.decode import SentenceView, as_rows, checked_ids, format_rows, ragged_rows
+from protovoc.numericalization.index import HashIndex, PrefixIndex, make_index, rebuild, unwrap
+from protovoc.numericalization.strings import StringStore
+from protovoc.vocab.strip import prefix_len
+
+ctypedef np.int64_t LONG_t
+ctypedef np.uint64_t HASH_t
+
+cdef HASH_t FNV_OFFSET = 0xcbf29ce484222325ULL
+cdef HASH_t FNV_PRIME = 0x100000001b3ULL
+
+
+def _map(fn, batches, executor):
+    if executor is not None:
+        return list(executor.map(fn, batches))
+    with ThreadPoolExecutor(max_workers=min(len(batches), os.cpu_count() or 1) or 1) as pool:
+        return list(pool.map(fn, batches))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _stops(const LONG_t[:, :] rows, LONG_t cutoff, LONG_t[:] stops) nogil:
+    cdef Py_ssize_t row, col, n_cols = rows.shape[1]
+    for row in range(rows.shape[0]):
+        stops[row] = n_cols
+        for col in range(n_cols):
+            if rows[row, col] < cutoff:
+                stops[row] = col
+                break
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _joined_size(const LONG_t[:] offsets, const LONG_t[:, :] rows, const LONG_t[:] stops) nogil:
+    cdef Py_ssize_t row, col, total = 0
+    cdef LONG_t tok
+    for row in range(rows.shape[0]):
+        for col in range(stops[row]):
+            tok = rows[row, col]
+            total += offsets[tok + 1] - offsets[tok] + 1
+    return total
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _join_into(const unsigned char[:] data, const LONG_t[:] offsets, const LONG_t[:, :] rows,
+                           const LONG_t[:] stops, unsigned char[:] buf, LONG_t[:] starts, LONG_t[:] ends) nogil:
+    cdef Py_ssize_t row, col, pos = 0
+    cdef LONG_t tok, byte
+    for row in range(rows.shape[0]):
+        starts[row] = pos
+        for col in range(stops[row]):
+            if col:
+                buf[pos] = 32
+                pos += 1
+            tok = rows[row, col]
+            for byte in range(offsets[tok], offsets[tok + 1]):
+                buf[pos] = data[byte]
+                pos += 1
+        ends[row] = pos
+    return pos
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _ragged_stops(const LONG_t[:] ids, const LONG_t[:] starts, const LONG_t[:] lens, LONG_t cutoff,
+                        LONG_t[:] stops) nogil:
+    cdef Py_ssize_t row, col
+    for row in range(starts.shape[0]):
+        stops[row] = lens[row]
+        for col in range(lens[row]):
+            if ids[starts[row] + col] < cutoff:
+                stops[row] = col
+                break
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _ragged_joined_size(const LONG_t[:] offsets, const LONG_t[:] ids, const LONG_t[:] starts,
+                                    const LONG_t[:] stops) nogil:
+    cdef Py_ssize_t row, col, total = 0
+    cdef LONG_t tok
+    for row in range(starts.shape[0]):
+        for col in range(stops[row]):
+            tok = ids[starts[row] + col]
+            total += offsets[tok + 1] - offsets[tok] + 1
+    return total
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _ragged_join_into(const unsigned char[:] data, const LONG_t[:] offsets, const LONG_t[:] ids,
+                                  const LONG_t[:] starts, const LONG_t[:] stops, unsigned char[:] buf,
+                                  LONG_t[:] row_starts, LONG_t[:] ends) nogil:
+    cdef Py_ssize_t row, col, pos = 0
+    cdef LONG_t tok, byte
+    for row in range(starts.shape[0]):
+        row_starts[row] = pos
+        for col in range(stops[row]):
+            if col:
+                buf[pos] = 32
+                pos += 1
+            tok = ids[starts[row] + col]
+            for byte in range(offsets[tok], offsets[tok + 1]):
+                buf[pos] = data[byte]
+                pos += 1
+        ends[row] = pos
+    return pos
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _probe(const LONG_t[:] slots, const HASH_t[:] hashes, const unsigned char[:] data,
+                 const LONG_t[:] offsets, const unsigned char[:] buf, const LONG_t[:] q_offsets,
+                 LONG_t[:] ids) nogil:
+    cdef HASH_t mask = slots.shape[0] - 1
+    cdef HASH_t h, at
+    cdef Py_ssize_t q, k, q_start, q_len
+    cdef LONG_t i, found
+    cdef bint same
+    for q in range(q_offsets.shape[0] - 1):
+        q_start = q_offsets[q]
+        q_len = q_offsets[q + 1] - q_start
+        h = FNV_OFFSET
+        for k in range(q_len):
+            h = (h ^ buf[q_start + k]) * FNV_PRIME
+        at = h & mask
+        found = -1
+        while slots[at] != -1:
+            i = slots[at]
+            if hashes[i] == h and offsets[i + 1] - offsets[i] == q_len:
+                same = True
+                for k in range(q_len):
+                    if data[offsets[i] + k] != buf[q_start + k]:
+                        same = False
+                        break
+                if same:
+                    found = i
+                    break
+            at = (at + 1) & mask
+        ids[q] = found
+
+
+def _lookup_hash(s2i, batch, unk_i=None):
+    """:func:`~protovoc.numericalization.batch.lookup_flat` over a ``HashIndex`` (or a prefix of one), probing ``nogil``."""
+    cdef np.ndarray[LONG_t, ndim=1] lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch))
+    query = StringStore.from_strings(chain.from_iterable(batch))
+    cdef np.ndarray[LONG_t, ndim=1] flat = np.empty(len(query), dtype=np.int64)
+    index, n = unwrap(s2i)
+    cdef const LONG_t[:] slots = index.slots
+    cdef const HASH_t[:] hashes = index.hashes
+    cdef const unsigned char[:] data = index.store.data
+    cdef const LONG_t[:] offsets = index.store.offsets
+    cdef const unsigned char[:] buf = query.data
+    cdef const LONG_t[:] q_offsets = query.offsets
+    cdef LONG_t[:] ids = flat
+    with nogil:
+        _probe(slots, hashes, data, offsets, buf, q_offsets, ids)
+    flat[flat >= n] = -1
+    oov = flat < 0
+    if oov.any():
+        if unk_i is None:
+            raise KeyError(f"Couldn't find {query[int(np.argmax(oov))]}")
+        flat[oov] = unk_i
+    return flat, lengths
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _scatter(const LONG_t[:] flat, const LONG_t[:] lengths, const LONG_t[:] keep_lens, LONG_t shift,
+             LONG_t[:, :] out):
+    cdef Py_ssize_t row, col, start = 0
+    with nogil:
+        for row in range(lengths.shape[0]):
+            for col in range(keep_lens[row]):
+                out[row, col + shift] = flat[start + col]
+            start += lengths[row]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _scatter_ragged(const LONG_t[:] flat, const LONG_t[:] lengths, const LONG_t[:] keep_lens, LONG_t shift,
+                    const LONG_t[:] offsets, LONG_t[:] out):
+    cdef Py_ssize_t row, col, to, start = 0
+    with nogil:
+        for row in range(lengths.shape[0]):
+            to = offsets[row] + shift
+            for col in range(keep_lens[row]):
+                out[to + col] = flat[start + col]
+            start += lengths[row]
+
+
+cdef class _CyStrInterface:
+    cdef readonly object i2s
+    def __init__(self, i2s):
+        self.i2s = i2s
+
+    def __getitem__(self, integer):
+        try:
+            return self.i2s[integer]
+        except:
+            return [self.i2s[i] for i in integer]
+
+    def __contains__(self, str_):
+        return str_ in self.i2s
+
+
+cdef class _CyIntInterface:
+    cdef readonly object s2i
+    cdef readonly int unk_i
+    cdef readonly bint has_unk
+    def __init__(self, s2i, unk, has_unk):
+        SENTINEL = -50
+        self.s2i = s2i
+        if has_unk:
+            self.unk_i = self.s2i[unk]
+        else:
+            self.unk_i = SENTINEL
+        self.has_unk = has_unk
+
+    def __getitem__(self, string):
+        if isinstance(string, str):
+            try:
+                return self.s2i[string]
+            except KeyError:
+                if self.has_unk:
+                    return self.unk_i
+                else:
+                    raise IndexError(f"Couldn't find {string}")
+        else:
+            return [self[s] for s in string]
+
+    def __contains__(self, int_):
+        return int_ < len(self.s2i)
+
+    def encode_batch(self, batch, pad=None, bos=None, eos=None, max_len=None, out=None, ragged=False):
+        return encode_batch(
+            self.s2i, self.unk_i if self.has_unk else None, batch, pad=pad, bos=bos, eos=eos,
+            max_len=max_len, out=out, ragged=ragged, scatter_fn=_scatter, scatter_ragged_fn=_scatter_ragged,
+            lookup_fn=_lookup_hash if isinstance(unwrap(self.s2i)[0], HashIndex) else lookup_flat)
+
+
+cdef class Numericalization:
+    cpdef readonly str unk
+    cpdef readonly bint has_unk
+    cpdef readonly set specials
+    cdef readonly set _specials_maybe_w_unk
+    cpdef readonly _CyStrInterface string
+    cpdef readonly _CyIntInterface integer
+    cdef readonly np.ndarray cts
+    cdef readonly object i2s
+    cdef readonly object s2i
+    cdef readonly object _vocab
+    cdef object _changes
+    cdef readonly object _segment
+    cdef readonly int _len_cts
+    cdef readonly int _n_spec
+    cdef readonly int _cutoff
+
+    def __init__(self, vocab, index="hash", track=False):
+        self._vocab = vocab if track else None
+        self._changes = vocab.watch() if track else None
+        unordered_cts = np.asarray(list(vocab.s2c.values()), dtype=np.float64)
+        idxs_desc = np.argsort(unordered_cts)[::-1]
+        unordered_strs = StringStore.from_strings(vocab.s2c.keys())
+        i2s = unordered_strs.take(idxs_desc)
+        unk = vocab.unk if vocab.has_unk else False
+        # move unk to last position so that it gets threshed
+        cts, i2s = storage.canonical(vocab.specials, unk, unordered_cts[idxs_desc], i2s)
+        self._build(vocab.specials, unk, cts, i2s, make_index(index, i2s))
+
+    cdef _build(self, specials, unk, np.ndarray cts, i2s, s2i):
+        self.specials = specials
+        self.has_unk = unk is not False and unk is not None
+        self.unk = unk if self.has_unk else ""
+        self._specials_maybe_w_unk = set(specials)
+        if self.has_unk:
+            self._specials_maybe_w_unk.add(self.unk)
+        self._n_spec = len(self._specials_maybe_w_unk)
+        self.cts = cts
+        self.i2s = i2s
+        self.s2i = s2i
+
+        self.integer = _CyIntInterface(self.s2i, self.unk, self.has_unk)
+        self.permit_unk(False)
+        self.string = _CyStrInterface(self.i2s)
+        self._len_cts = len(self.cts)
+
+    def permit_unk(self, val):
+        if val:
+            self._cutoff = self._n_spec - 1
+        else:
+            self._cutoff = self._n_spec
+
+    def refresh(self):
+        """Apply the count changes of the tracked vocab (``track=True``).
+
+        Moves only the changed entries. See
+        :mod:`protovoc.numericalization.incremental`.
+
+        """
+        if self._changes is None:
+            raise ValueError("Not tracking a vocab, construct with track=True")
+        permitted = self._cutoff == self._n_spec - 1
+        cts, i2s, s2i = incremental.refresh(
+            self._vocab, self._changes, self._n_spec, self.cts, self.i2s, self.s2i)
+        self._build(self.specials, self.unk if self.has_unk else False, cts, i2s, s2i)
+        self.permit_unk(permitted)
+
+    def save(self, path):
+        storage.save(path, self.specials, self.unk if self.has_unk else False, self.cts, self.i2s)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls._from_parts(storage.canonical_parts(storage.load(path, mmap=mmap)))
+
+    @classmethod
+    def _from_parts(cls, parts, permitted=False, segment=None):
+        cdef Numericalization self = cls.__new__(cls)
+        specials, unk, cts, i2s, s2i = parts
+        self._build(specials, unk, cts, i2s, s2i)
+        self.permit_unk(permitted)
+        self._segment = segment
+        return self
+
+    def share_memory(self):
+        """Move counts, strings and index to shared memory, for data loader workers.
+
+        See :mod:`protovoc.numericalization.shared`.
+
+        """
+        permitted = self._cutoff == self._n_spec - 1
+        self._segment = shared.share(self.specials, self.unk if self.has_unk else False, self.cts, self.i2s)
+        specials, unk, cts, i2s, s2i = self._segment.parts
+        self._build(specials, unk, cts, i2s, s2i)
+        self.permit_unk(permitted)
+        return self
+
+    def __reduce__(self):
+        return shared.reduce(type(self), self._segment, self.specials, self.unk if self.has_unk else False,
+                             self.cts, self.i2s, self.s2i, self._cutoff == self._n_spec - 1)
+
+    cdef np.ndarray _row_stops(self, rows):
+        cdef const LONG_t[:, :] rows_v = rows
+        cdef np.ndarray[LONG_t, ndim=1] stops = np.empty(rows.shape[0], dtype=np.int64)
+        cdef LONG_t[:] stops_v = stops
+        cdef LONG_t cutoff = self._cutoff
+        with nogil:
+            _stops(rows_v, cutoff, stops_v)
+        return stops
+
+    def _sentence_ragged(self, integers, offsets, lengths, output):
+        ids, starts, lens = ragged_rows(integers, offsets, lengths)
+        # the kernels don't bounds check, and an id out of range would crash a worker thread
+        ids = checked_ids(ids, len(self.i2s), self.s2i, self.unk)
+        stops = np.empty(len(starts), dtype=np.int64)
+        cdef const LONG_t[:] ids_v = ids
+        cdef const LONG_t[:] starts_v = starts
+        cdef const LONG_t[:] lens_v = lens
+        cdef LONG_t[:] stops_v = stops
+        cdef const unsigned char[:] data = self.i2s.data
+        cdef const LONG_t[:] str_offsets = self.i2s.offsets
+        cdef LONG_t cutoff = self._cutoff
+        cdef Py_ssize_t total, used
+        with nogil:
+            _ragged_stops(ids_v, starts_v, lens_v, cutoff, stops_v)
+            total = _ragged_joined_size(str_offsets, ids_v, starts_v, stops_v)
+        buf = np.empty(total, dtype=np.uint8)
+        row_starts = np.empty(len(stops), dtype=np.int64)
+        ends = np.empty(len(stops), dtype=np.int64)
+        cdef unsigned char[:] buf_v = buf
+        cdef LONG_t[:] row_starts_v = row_starts
+        cdef LONG_t[:] ends_v = ends
+        with nogil:
+            used = _ragged_join_into(data, str_offsets, ids_v, starts_v, stops_v, buf_v, row_starts_v, ends_v)
+        return format_rows(buf[:used], row_starts, ends, (len(stops),), output), stops
+
+    def sentence(self, integers, axis=0, output=None, offsets=None, lengths=None):
+        if offsets is not None or lengths is not None:
+            return self._sentence_ragged(integers, offsets, lengths, output)
+        # checked before the GIL is released: the kernels don't bounds check
+        integers = checked_ids(np.asarray(integers, dtype=np.int64), len(self.i2s), self.s2i, self.unk)
+        rows, shape = as_rows(integers, axis)
+        cdef np.ndarray stops = self._row_stops(rows)
+        cdef const LONG_t[:, :] rows_v = rows
+        cdef const LONG_t[:] stops_v = stops
+        cdef const unsigned char[:] data = self.i2s.data
+        cdef const LONG_t[:] str_offsets = self.i2s.offsets
+        cdef Py_ssize_t total, used
+        with nogil:
+            total = _joined_size(str_offsets, rows_v, stops_v)
+        buf = np.empty(total, dtype=np.uint8)
+        starts = np.empty(len(stops), dtype=np.int64)
+        ends = np.empty(len(stops), dtype=np.int64)
+        cdef unsigned char[:] buf_v = buf
+        cdef LONG_t[:] starts_v = starts
+        cdef LONG_t[:] ends_v = ends
+        with nogil:
+            used = _join_into(data, str_offsets, rows_v, stops_v, buf_v, starts_v, ends_v)
+        return format_rows(buf[:used], starts, ends, shape, output)
+
+    def sentence_view(self, integers, axis=0):
+        """Like :meth:`sentence`, but rows are joined on first access.
+
+        See :class:`~protovoc.numericalization.decode.SentenceView`.
+
+        """
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        integers = np.asarray(integers, dtype=np.int64)
+        rows, shape = as_rows(integers, axis)
+        return SentenceView(self.i2s, integers, self._row_stops(rows), axis)
+
+    def sentence_many(self, batches, axis=0, output=None, executor=None):
+        """:meth:`sentence` of every array of ``batches``, spread over ``executor``.
+
+        Parameters
+        ----------
+        batches : list of np.ndarray[int]
+        axis : int
+        output : {None, "str", "bytes", "U", "S"}
+        executor : concurrent.futures.Executor, optional
+            Defaults to a thread pool of ``os.cpu_count()`` threads for the
+            call. The kernels release the GIL, so threads scale.
+
+        Returns
+        -------
+        list
+            One ``sentence()`` result per batch, in order.
+
+        """
+        return _map(partial(self.sentence, axis=axis, output=output), batches, executor)
+
+    def encode_many(self, batches, executor=None, **kwargs):
+        """``integer.encode_batch`` of every list of token lists, spread over ``executor``.
+
+        ``kwargs`` (``pad``, ``bos``, ``eos``, ``max_len``, ``ragged``) go to
+        every call. See :meth:`sentence_many` for ``executor``.
+
+        """
+        return _map(partial(self.integer.encode_batch, **kwargs), batches, executor)
+
+    def __len__(self):
+        return self._len_cts
+
+    def strip(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
+        if min_freq > 0:
+            n_freq_enough = self._len_cts - np.searchsorted(self.cts[::-1], min_freq)
+        else:
+            n_freq_enough = self._len_cts
+
+        n_to_keep += self._n_spec
+
+        if minimal:
+            n_to_keep = min(n_freq_enough, n_to_keep)
+        else:
+            n_to_keep = max(n_freq_enough, n_to_keep)
+        if n_to_keep >= len(self.cts):
+            return
+        self.cts = self.cts[:n_to_keep]
+        self._len_cts = len(self.cts)
+        self.i2s = self.i2s[:n_to_keep]
+        self.s2i = rebuild(self.s2i, self.i2s)
+        self.integer = _CyIntInterface(self.s2i, self.unk, self.has_unk)
+        self.string = _CyStrInterface(self.i2s)
+
+    def stripped(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
+        """Like :meth:`strip`, but as a new numericalization, leaving this one as is.
+
+        It's a view: ``cts`` and ``i2s`` are prefixes of these and ``s2i``
+        a :class:`~protovoc.numericalization.index.PrefixIndex` of this
+        one, so it takes O(1) to make. Words past the cut are OOV (unk), and
+        their ids decode as unk (or raise ``IndexError`` without one).
+        ``strip()`` on this one leaves it be, but ``refresh()`` may update a
+        ``dict`` or hash index in place.
+
+        """
+        n = min(prefix_len(self.cts, self._n_spec, n_to_keep, min_freq, minimal), len(self.cts))
+        parts = storage.Parts(self.specials, self.unk if self.has_unk else False, self.cts[:n], self.i2s[:n], PrefixIndex(self.s2i, n))
+        return type(self)._from_parts(parts, self._cutoff == self._n_spec - 1)
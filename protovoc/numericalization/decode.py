@@ -0,0 +1,343 @@
+"""Decoding shared by the numericalization backends.
+
+``sentence()`` is split in two:
+
+* Stop positions: for every row (1D slice along ``axis``), the index of
+  the first special, or the row length. How to find them is backend
+  specific; :func:`first_true()` and :func:`stops_below()` are the NumPy
+  versions.
+* :func:`join()`: gathers only the tokens before each stop straight from
+  the :class:`~protovoc.numericalization.strings.StringStore` bytes and
+  lays them out, space separated, in one buffer. Rows are then cut out
+  of that buffer once each by :func:`format_rows()`, so the cost is
+  linear in the output. Compiled backends swap in their own kernel for
+  :func:`join_flat()`.
+
+:class:`SentenceView` keeps the two apart: stops are found for every row
+up front (cheap), rows are joined only when read.
+
+Ragged input, flat ids plus row ``offsets`` (as ``encode_batch(...,
+ragged=True)`` returns) or ``lengths``, skips padding altogether:
+:func:`ragged_rows()` turns either into row starts and lengths, the
+``ragged_stops_*`` functions find stops within rows, and
+:func:`join_ragged()` joins the kept tokens. Only the real tokens are
+touched, and there is no sequence axis to move.
+
+"""
+import numpy as np
+
+from protovoc.numericalization.index import PrefixIndex
+
+
+SPACE = ord(" ")
+OUTPUTS = (None, "str", "bytes", "U", "S")
+
+
+def first_true(mask, axis=0):
+    """Index of the first ``True`` along ``axis``, or the axis length."""
+    if not mask.shape[axis]:
+        return np.zeros(np.delete(mask.shape, axis), dtype=np.int64)
+    return np.where(mask.any(axis=axis), mask.argmax(axis=axis), mask.shape[axis])
+
+
+def stops_below(integers, cutoff, axis=0):
+    """Index of the first id ``< cutoff`` along ``axis``, or the axis length."""
+    return first_true(integers < cutoff, axis=axis)
+
+
+def stops_isin(integers, specs_as_int, axis=0):
+    """Index of the first id in ``specs_as_int`` along ``axis``, or the axis length."""
+    return first_true(np.isin(integers, specs_as_int), axis=axis)
+
+
+def ragged_rows(integers, offsets=None, lengths=None):
+    """Flat ids and the start and length of every row.
+
+    Parameters
+    ----------
+    integers : np.ndarray[int]
+        Flat ids.
+    offsets : np.ndarray[int], optional
+        ``n_rows + 1`` non-decreasing positions ending at
+        ``len(integers)``: row ``r`` is
+        ``integers[offsets[r]:offsets[r + 1]]``.
+    lengths : np.ndarray[int], optional
+        Length of every row, rows back to back from 0 to
+        ``len(integers)``. Give exactly one of ``offsets`` and
+        ``lengths``.
+
+    Returns
+    -------
+    ids, starts, lens : np.ndarray[int64]
+
+    """
+    if (offsets is None) == (lengths is None):
+        raise ValueError("Give exactly one of offsets and lengths")
+    ids = np.asarray(integers, dtype=np.int64)
+    if ids.ndim != 1:
+        raise ValueError(f"Ragged ids must be flat, got shape {ids.shape}")
+    if offsets is not None:
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.ndim != 1 or not len(offsets):
+            raise ValueError("offsets must be 1D with n_rows + 1 entries")
+        starts, lens = offsets[:-1], np.diff(offsets)
+    else:
+        lens = np.asarray(lengths, dtype=np.int64).reshape(-1)
+        starts = np.cumsum(lens) - lens
+    if (lens < 0).any():
+        raise ValueError("Row offsets must be non-decreasing and lengths non-negative")
+    end = int(starts[-1] + lens[-1]) if len(lens) else (int(offsets[0]) if offsets is not None else 0)
+    if (len(starts) and starts[0] < 0) or end != len(ids):
+        raise ValueError(f"Rows must end at the last of the {len(ids)} ids, got {end}")
+    return ids, starts, lens
+
+
+def ragged_first_true(mask, starts, lens):
+    """Index of the first ``True`` of every row of a flat ``mask``, or the row length."""
+    hits = np.append(np.flatnonzero(mask), len(mask))
+    return np.minimum(hits[np.searchsorted(hits, starts)] - starts, lens)
+
+
+def ragged_stops_below(ids, starts, lens, cutoff):
+    """:func:`stops_below()` of every row of flat ``ids``."""
+    return ragged_first_true(ids < cutoff, starts, lens)
+
+
+def ragged_stops_isin(ids, starts, lens, specs_as_int):
+    """:func:`stops_isin()` of every row of flat ``ids``."""
+    return ragged_first_true(np.isin(ids, specs_as_int), starts, lens)
+
+
+def checked_ids(integers, n, s2i=None, unk=False):
+    """``integers`` as an array, after checking every id is in ``[0, n)``.
+
+    Compiled kernels index the string offsets without bounds checks, so
+    ids are checked once, up front, and an out of range one raises
+    ``IndexError`` like indexing ``i2s`` would.
+
+    If ``s2i`` is a :class:`~protovoc.numericalization.index.PrefixIndex`
+    (a ``stripped()`` view of ``n`` strings), ids from ``n`` up to the
+    length of the index it limits are words the view stripped: they come
+    back as ``unk``'s id, or raise ``IndexError`` without an unk.
+
+    """
+    ids = np.asarray(integers)
+    if not ids.size:
+        return ids
+    lo, hi = int(ids.min()), int(ids.max())
+    limit = len(s2i.index) if isinstance(s2i, PrefixIndex) else n
+    if lo < 0 or hi >= limit:
+        raise IndexError(f"ids must be in [0, {limit}), got ids in [{lo}, {hi}]")
+    if hi >= n:
+        unk_id = s2i.get(unk) if unk else None
+        if unk_id is None:
+            raise IndexError(f"ids from {n} on were stripped, and there is no unk to map them to")
+        ids = ids.copy()
+        ids[ids >= n] = unk_id
+    return ids
+
+
+def as_rows(integers, axis=0):
+    """View (or copy) ``integers`` as a 2D array with one sequence per row.
+
+    Returns the rows and the shape of ``integers`` without ``axis``.
+
+    """
+    ids = np.moveaxis(np.asarray(integers), axis, -1)
+    shape = ids.shape[:-1]
+    # not -1: that can't be inferred when the sequences are empty
+    return ids.reshape(int(np.prod(shape, dtype=np.int64)), ids.shape[-1]), shape
+
+
+def ragged_arange(starts, lens):
+    """Concatenation of ``arange(s, s + n)`` for every ``(s, n)``.
+
+    Built with one cumsum, which beats ``np.repeat`` over many short runs.
+
+    """
+    nz = lens > 0
+    starts, lens = starts[nz], lens[nz]
+    if not len(lens):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(lens)
+    steps = np.ones(int(ends[-1]), dtype=np.int64)
+    steps[0] = starts[0]
+    steps[ends[:-1]] = starts[1:] - starts[:-1] - lens[:-1] + 1
+    return np.cumsum(steps, out=steps)
+
+
+def join_flat(store, tokens, counts):
+    """Lay out space separated rows of tokens in one byte buffer.
+
+    Parameters
+    ----------
+    store : StringStore
+    tokens : np.ndarray[int64]
+        Ids of the kept tokens, row after row.
+    counts : np.ndarray[int64]
+        Number of tokens in each row.
+
+    Returns
+    -------
+    buf : np.ndarray[uint8]
+    starts, ends : np.ndarray[int64]
+        Row ``r`` is ``buf[starts[r]:ends[r]]``.
+
+    """
+    src_starts = store.offsets[tokens]
+    lens = store.offsets[tokens + 1] - src_starts
+    # every token is written followed by a space; a row drops its last one
+    bounds = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(lens + 1, out=bounds[1:])
+    buf = np.full(int(bounds[-1]), SPACE, dtype=np.uint8)
+    buf[ragged_arange(bounds[:-1], lens)] = store.data[ragged_arange(src_starts, lens)]
+
+    row_tok = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=row_tok[1:])
+    starts = bounds[row_tok[:-1]]
+    ends = np.maximum(bounds[row_tok[1:]] - 1, starts)
+    return buf, starts, ends
+
+
+def format_rows(buf, starts, ends, shape, output=None):
+    """Turn rows of a byte buffer into the requested ``output``.
+
+    ``None`` gives an object array of ``str`` (a ``str`` if ``shape`` is
+    ``()``), ``"str"``/``"bytes"`` give (nested) lists, ``"U"``/``"S"``
+    give fixed-width NumPy arrays.
+
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of {OUTPUTS}, got {output!r}")
+    ascii = not len(buf) or int(buf.max()) < 128
+    if output in ("S", "U") and (output == "S" or ascii):
+        widths = ends - starts
+        width = max(int(widths.max(initial=0)), 1)
+        kind, dtype = (f"S{width}", np.uint8) if output == "S" else (f"U{width}", np.uint32)
+        mat = np.zeros((len(starts), width), dtype=dtype)
+        rows = np.repeat(np.arange(len(starts)), widths)
+        within = np.arange(int(widths.sum())) - np.repeat(np.cumsum(widths) - widths, widths)
+        mat[rows, within] = buf[within + np.repeat(starts, widths)]
+        fixed = mat.view(kind).reshape(shape)
+        return fixed if shape else fixed[()]
+
+    raw = buf.tobytes()
+    if output == "bytes":
+        rows = [raw[a:b] for a, b in zip(starts.tolist(), ends.tolist())]
+    elif ascii:
+        text = raw.decode("ascii")
+        rows = [text[a:b] for a, b in zip(starts.tolist(), ends.tolist())]
+    else:
+        rows = [raw[a:b].decode("utf-8") for a, b in zip(starts.tolist(), ends.tolist())]
+    if output == "U":
+        fixed = np.asarray(rows, dtype=str).reshape(shape)
+        return fixed if shape else fixed[()]
+    strs = np.empty(len(rows), dtype=object)
+    strs[:] = rows
+    strs = strs.reshape(shape)
+    if output is None:
+        return strs if shape else strs[()]
+    return strs.tolist()
+
+
+def join(store, integers, stops, axis=0, output=None):
+    """Decode ``integers`` along ``axis``, keeping each row up to its stop.
+
+    Parameters
+    ----------
+    store : StringStore
+    integers : np.ndarray[int]
+        Ids, any rank.
+    stops : np.ndarray[int]
+        Shape of ``integers`` without ``axis``. Tokens at or after the stop
+        are dropped.
+    axis : int
+        The sequence axis.
+    output : {None, "str", "bytes", "U", "S"}
+        See :func:`format_rows()`.
+
+    """
+    rows, shape = as_rows(integers, axis)
+    stops = np.asarray(stops, dtype=np.int64).reshape(-1)
+    tokens = rows[np.arange(rows.shape[1]) < stops[:, None]]
+    buf, starts, ends = join_flat(store, tokens, stops)
+    return format_rows(buf, starts, ends, shape, output)
+
+
+def join_ragged(store, ids, starts, stops, output=None):
+    """Decode the rows of flat ``ids``, keeping ``stops[r]`` tokens from ``starts[r]``.
+
+    The result is 1D, one entry per row; see :func:`format_rows()`.
+
+    """
+    tokens = ids[ragged_arange(starts, stops)]
+    buf, row_starts, ends = join_flat(store, tokens, stops)
+    return format_rows(buf, row_starts, ends, (len(stops),), output)
+
+
+class SentenceView:
+    """Sentences of an id array, decoded on first access.
+
+    Indexes like the array of strings ``sentence()`` would return: an
+    index selecting one row gives a ``str``, anything else an object
+    array. Only the selected rows are gathered and joined, and each is
+    decoded once; e.g. ``view[0]`` of a ``(seq_len, beam, batch)`` array
+    decodes the ``batch`` best hypotheses and nothing else.
+
+    Parameters
+    ----------
+    store : StringStore
+    integers : np.ndarray[int]
+        Ids, any rank. Not copied; don't modify it while the view is used.
+    stops : np.ndarray[int]
+        Stop of every row, shape of ``integers`` without ``axis``.
+    axis : int
+        The sequence axis.
+
+    Attributes
+    ----------
+    ids : np.ndarray[int]
+        ``integers`` with the sequence axis last. The backends pass the ids
+        they checked, so on a ``stripped()`` view cut off ids are unk's.
+
+    """
+    def __init__(self, store, integers, stops, axis=0):
+        self.store = store
+        self.ids = np.moveaxis(np.asarray(integers), axis, -1)
+        self.shape = self.ids.shape[:-1]
+        self.stops = np.asarray(stops, dtype=np.int64).reshape(self.shape)
+        self._rows = np.arange(int(np.prod(self.shape, dtype=np.int64))).reshape(self.shape)
+        self._cache = {}
+
+    @property
+    def n_decoded(self):
+        """Number of rows decoded so far."""
+        return len(self._cache)
+
+    def __len__(self):
+        if not self.shape:
+            raise TypeError("len() of a single sentence view")
+        return self.shape[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _decode(self, rows):
+        seqs = self.ids[np.unravel_index(rows, self.shape)] if self.shape else self.ids[None]
+        stops = self.stops.reshape(-1)[rows]
+        tokens = seqs[np.arange(seqs.shape[-1]) < stops[:, None]].astype(np.int64, copy=False)
+        buf, starts, ends = join_flat(self.store, tokens, stops)
+        self._cache.update(zip(rows.tolist(), format_rows(buf, starts, ends, (len(rows),)).tolist()))
+
+    def __getitem__(self, key):
+        selected = self._rows[key]
+        flat = np.ravel(selected).tolist()
+        missing = [row for row in flat if row not in self._cache]
+        if missing:
+            self._decode(np.asarray(missing, dtype=np.int64))
+        if np.ndim(selected) == 0:
+            return self._cache[int(selected)]
+        strs = np.empty(len(flat), dtype=object)
+        strs[:] = [self._cache[row] for row in flat]
+        return strs.reshape(np.shape(selected))
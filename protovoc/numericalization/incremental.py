@@ -0,0 +1,135 @@
+"""Incremental refresh of a numericalization from its vocab's count changes.
+
+A tracking numericalization holds a change set registered with
+:meth:`Vocab.watch`; the vocab adds every word whose count it changes.
+:func:`refresh` moves each changed entry to its new frequency rank with
+swaps across blocks of tied counts: an entry whose count rises swaps with
+the first entry of each block it passes, one that falls with the last.
+Each swap keeps ``cts`` sorted, finds its block with a binary search and
+moves two ids, so the Python level work is O(changed entries * blocks
+crossed * log V) instead of a full O(V log V) sort.
+
+``s2i`` is patched, not rebuilt: a ``dict`` gets the new positions of the
+entries that moved, a :class:`~protovoc.numericalization.index.HashIndex`
+has their slots repointed, dropped words deleted and new words inserted
+(it's only rebuilt when it would get too full, so amortized O(1) per new
+word). A ``SortedIndex`` orders ids by string, so it is rebuilt.
+
+``cts`` and the string store are flat arrays, so they can't grow or
+reorder in place: a refresh still copies ``cts`` and,
+unless nothing moved, gathers the string store with one vectorized
+``take``. That's O(V) memory bandwidth per refresh (O(bytes) for the
+store) though no O(V) Python level work or hashing.
+
+Specials never move: their ``inf`` counts keep them (with unk last
+among them) in the first ``n_spec`` slots, the layout the cutoff based
+backends rely on.
+
+Words the vocab drops sink to count 0 at the end and are cut off; new
+words enter at the end at count 0 and rise.
+
+"""
+import numpy as np
+
+from protovoc.numericalization.index import HashIndex, rebuild
+
+
+def _block_start(neg_cts, value, lo):
+    """First position at or after ``lo`` whose count equals ``value``."""
+    return lo + int(np.searchsorted(neg_cts[lo:], -value, side="left"))
+
+
+def _block_end(neg_cts, value, lo):
+    """Last position at or after ``lo`` whose count equals ``value``."""
+    return lo + int(np.searchsorted(neg_cts[lo:], -value, side="right")) - 1
+
+
+def refresh(vocab, changes, n_spec, cts, i2s, s2i):
+    """Bring ``(cts, i2s, s2i)`` up to date with ``vocab.s2c`` for ``changes``.
+
+    Parameters
+    ----------
+    vocab : Vocab
+    changes : set
+        Words changed since the last refresh; emptied.
+    n_spec : int
+        Number of specials (with unk) at the front, left in place.
+    cts : np.ndarray[float64]
+    i2s : StringStore
+    s2i : dict or index
+        A ``dict`` or :class:`~protovoc.numericalization.index.HashIndex` is
+        updated in place for the entries that moved, were added or were
+        dropped; a ``SortedIndex`` is rebuilt.
+
+    Returns
+    -------
+    (cts, i2s, s2i)
+
+    """
+    words = [w for w in changes if not (w in s2i and s2i[w] < n_spec)]
+    changes.clear()
+    if not words:
+        return cts, i2s, s2i
+    index = s2i
+    if not isinstance(index, dict):
+        # positions of the changed words only; the index is patched at the end
+        s2i = {w: index[w] for w in words if w in index}
+    new = [w for w in words if w not in s2i and vocab.s2c.get(w, 0) > 0]
+    n_old = len(cts)
+    # work on negated counts so numpy's ascending searchsorted applies
+    neg = np.concatenate([-np.asarray(cts, dtype=np.float64), np.zeros(len(new))])
+    perm = np.arange(len(neg), dtype=np.int64)
+    for i, w in enumerate(new, n_old):
+        s2i[w] = i
+    new_strs = dict(zip(range(n_old, n_old + len(new)), new))
+    pos_of = {}  # word -> current position, for words whose position changed
+    word_at = {}  # position -> word, only filled for positions we touched
+
+    def word(p):
+        if p not in word_at:
+            src = int(perm[p])
+            word_at[p] = new_strs[src] if src >= n_old else i2s[src]
+        return word_at[p]
+
+    def swap(p, q):
+        if p == q:
+            return
+        wp, wq = word(p), word(q)
+        perm[p], perm[q] = perm[q], perm[p]
+        neg[p], neg[q] = neg[q], neg[p]
+        word_at[p], word_at[q] = wq, wp
+        pos_of[wp], pos_of[wq] = q, p
+
+    for w in words:
+        if w not in s2i:
+            continue
+        p = pos_of.get(w, s2i[w])
+        target = -float(max(vocab.s2c.get(w, 0), 0))
+        if target < neg[p]:  # count rose: bubble up past lower blocks
+            while p > n_spec and neg[p - 1] > target:
+                swap(p, _block_start(neg, -neg[p - 1], n_spec))
+                p = pos_of[w]
+        elif target > neg[p]:  # count fell: sink past higher blocks
+            while p + 1 < len(neg) and neg[p + 1] < target:
+                swap(p, _block_end(neg, -neg[p + 1], p + 1))
+                p = pos_of[w]
+        neg[p] = target
+
+    n_keep = len(neg) - int(np.count_nonzero(neg[n_spec:] == 0))
+    dropped = [word(p) for p in range(n_keep, len(neg))]
+    for w in dropped:
+        del s2i[w]
+        pos_of.pop(w, None)
+    if new or n_keep < n_old or any(int(perm[p]) != p for p in pos_of.values()):
+        store = i2s.extended(new) if new else i2s
+        i2s = store.take(perm[:n_keep])
+    if isinstance(index, HashIndex):
+        moved = {int(perm[p]): p for p in pos_of.values() if int(perm[p]) != p and perm[p] < n_old}
+        added = {pos_of.get(w, i): w for i, w in enumerate(new, n_old)}
+        removed = [int(src) for src in perm[n_keep:] if src < n_old]
+        return -neg[:n_keep], i2s, index.updated(i2s, moved, removed, added)
+    if not isinstance(index, dict):
+        return -neg[:n_keep], i2s, rebuild(index, i2s)
+    for w, p in pos_of.items():
+        s2i[w] = p
+    return -neg[:n_keep], i2s, s2i
@@ -0,0 +1,409 @@
+"""String to integer indexes stored as flat arrays.
+
+These stand in for the ``s2i`` dict: they implement the part of the
+mapping interface the backends use (``[]``, ``get``, ``in``, ``len``), but
+live in NumPy arrays next to a
+:class:`~protovoc.numericalization.strings.StringStore`, so they can be
+saved, memory-mapped and shared without building a dict.
+
+"""
+import numpy as np
+
+
+class SortedIndex:
+    """Binary search over the ids sorted by their UTF-8 bytes.
+
+    Parameters
+    ----------
+    store : StringStore
+    order : np.ndarray[int64]
+        Ids in byte order of their strings (:meth:`build`).
+
+    """
+    def __init__(self, store, order):
+        self.store = store
+        self.order = order
+
+    @classmethod
+    def build(cls, store):
+        raw = store.data.tobytes()
+        base = int(store.offsets[0])
+        offsets = (store.offsets - base).tolist()
+        keys = [raw[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+        order = np.asarray(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int64)
+        return cls(store, order)
+
+    def _bytes(self, i):
+        return self.store.data[self.store.offsets[i]:self.store.offsets[i + 1]].tobytes()
+
+    def get(self, str_, default=None):
+        key = str_.encode("utf-8")
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self.order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order) and self._bytes(self.order[lo]) == key:
+            return int(self.order[lo])
+        return default
+
+    def __getitem__(self, str_):
+        i = self.get(str_)
+        if i is None:
+            raise KeyError(str_)
+        return i
+
+    def __contains__(self, str_):
+        return self.get(str_) is not None
+
+    def __len__(self):
+        return len(self.order)
+
+
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+EMPTY = -1
+
+
+def fnv1a(key):
+    """64 bit FNV-1a of one ``bytes``."""
+    h = int(FNV_OFFSET)
+    for byte in key:
+        h = ((h ^ byte) * int(FNV_PRIME)) & 0xffffffffffffffff
+    return h
+
+
+def hash_bytes(data, offsets):
+    """64 bit FNV-1a of every ``data[offsets[i]:offsets[i + 1]]``.
+
+    Vectorized over the strings: one pass per byte position, over the
+    strings long enough to have that position (a shrinking prefix once
+    sorted by length).
+
+    """
+    starts = offsets[:-1]
+    lens = np.diff(offsets)
+    by_len = np.argsort(-lens, kind="stable")
+    starts, lens = starts[by_len], lens[by_len]
+    hashes = np.full(len(lens), FNV_OFFSET, dtype=np.uint64)
+    n_active = len(lens)
+    for pos in range(int(lens[0]) if len(lens) else 0):
+        while lens[n_active - 1] <= pos:
+            n_active -= 1
+        active = hashes[:n_active]
+        active ^= data[starts[:n_active] + pos]
+        active *= FNV_PRIME
+    out = np.empty_like(hashes)
+    out[by_len] = hashes
+    return out
+
+
+def bytes_equal(data_a, starts_a, data_b, starts_b, lens):
+    """Whether ``data_a[starts_a[i]:][:lens[i]] == data_b[starts_b[i]:][:lens[i]]`` for every ``i``."""
+    from protovoc.numericalization.decode import ragged_arange
+    diff = data_a[ragged_arange(starts_a, lens)] != data_b[ragged_arange(starts_b, lens)]
+    nz = lens > 0
+    equal = np.ones(len(lens), dtype=bool)
+    if diff.size:
+        seg_starts = np.cumsum(lens[nz]) - lens[nz]
+        equal[nz] = ~np.logical_or.reduceat(diff, seg_starts)
+    return equal
+
+
+class HashIndex:
+    """Open addressing (linear probing) hash table over a string store.
+
+    Parameters
+    ----------
+    store : StringStore
+    hashes : np.ndarray[uint64]
+        FNV-1a of every string's UTF-8 bytes.
+    slots : np.ndarray[int64]
+        Power of two sized table of ids, ``-1`` where empty. The home slot
+        of a string is ``hash & (len(slots) - 1)``.
+
+    A hit is verified against ``hashes`` and then the store's bytes, so
+    collisions never return a wrong id. Everything is flat arrays, so
+    compiled kernels can probe it without the GIL.
+
+    """
+    def __init__(self, store, hashes, slots):
+        self.store = store
+        self.hashes = hashes
+        self.slots = slots
+        self.mask = len(slots) - 1
+
+    @classmethod
+    def build(cls, store, load_factor=0.5):
+        hashes = hash_bytes(store.data, store.offsets)
+        size = 1
+        while size * load_factor < max(len(store), 1):
+            size *= 2
+        slots = np.full(size, EMPTY, dtype=np.int64)
+        pending = np.arange(len(store), dtype=np.int64)
+        at = (hashes & np.uint64(size - 1)).astype(np.int64)
+        # place every pending id whose slot is free (first one wins a
+        # contested slot), move the rest one slot on, repeat
+        while len(pending):
+            free = slots[at] == EMPTY
+            won_at, first = np.unique(at[free], return_index=True)
+            slots[won_at] = pending[free][first]
+            placed = np.zeros(len(pending), dtype=bool)
+            placed[np.flatnonzero(free)[first]] = True
+            pending = pending[~placed]
+            at = (at[~placed] + 1) & (size - 1)
+        return cls(store, hashes, slots)
+
+    def get(self, str_, default=None):
+        key = str_.encode("utf-8")
+        h = fnv1a(key)
+        at = h & self.mask
+        data, offsets = self.store.data, self.store.offsets
+        while True:
+            i = self.slots[at]
+            if i == EMPTY:
+                return default
+            if self.hashes[i] == h and data[offsets[i]:offsets[i + 1]].tobytes() == key:
+                return int(i)
+            at = (at + 1) & self.mask
+
+    def __getitem__(self, str_):
+        i = self.get(str_)
+        if i is None:
+            raise KeyError(str_)
+        return i
+
+    def __contains__(self, str_):
+        return self.get(str_) is not None
+
+    def __len__(self):
+        return len(self.store)
+
+    def lookup(self, buf, offsets):
+        """Look up a batch of UTF-8 strings, ``buf[offsets[i]:offsets[i + 1]]``.
+
+        Returns
+        -------
+        ids : np.ndarray[int64]
+            ``-1`` for OOVs.
+        oov : np.ndarray[bool]
+
+        """
+        buf = np.frombuffer(buf, dtype=np.uint8) if not isinstance(buf, np.ndarray) else buf
+        offsets = np.asarray(offsets, dtype=np.int64)
+        hashes = hash_bytes(buf, offsets)
+        ids = np.full(len(hashes), EMPTY, dtype=np.int64)
+        pending = np.arange(len(hashes), dtype=np.int64)
+        at = (hashes & np.uint64(self.mask)).astype(np.int64)
+        q_lens = np.diff(offsets)
+        while len(pending):
+            cand = self.slots[at]
+            probe = cand != EMPTY
+            pending, at, cand = pending[probe], at[probe], cand[probe]
+            same = (self.hashes[cand] == hashes[pending]) & \
+                (self.store.offsets[cand + 1] - self.store.offsets[cand] == q_lens[pending])
+            hit = np.zeros(len(pending), dtype=bool)
+            hit[same] = bytes_equal(self.store.data, self.store.offsets[cand[same]],
+                                    buf, offsets[pending[same]], q_lens[pending[same]])
+            ids[pending[hit]] = cand[hit]
+            pending, at = pending[~hit], (at[~hit] + 1) & self.mask
+        return ids, ids == EMPTY
+
+    def _slot_of(self, i):
+        """The slot holding id ``i``."""
+        at = int(self.hashes[i]) & self.mask
+        while self.slots[at] != i:
+            at = (at + 1) & self.mask
+        return at
+
+    def _delete(self, at):
+        """Empty slot ``at``, shifting later entries of its probe run back."""
+        slots = self.slots
+        nxt = (at + 1) & self.mask
+        while slots[nxt] != EMPTY:
+            home = int(self.hashes[slots[nxt]]) & self.mask
+            # the entry at nxt may fill the hole unless its home lies in (at, nxt]
+            if (nxt - home) & self.mask >= (nxt - at) & self.mask:
+                slots[at] = slots[nxt]
+                at = nxt
+            nxt = (nxt + 1) & self.mask
+        slots[at] = EMPTY
+
+    def updated(self, store, moved, removed, added, load_factor=0.5):
+        """Patch the table in place for ``store``, a reordering of the old store.
+
+        Parameters
+        ----------
+        store : StringStore
+        moved : dict
+            Old id -> new id, for strings whose id changed.
+        removed : Iterable[int]
+            Old ids of strings not in ``store``.
+        added : dict
+            New id -> str, for strings not in the old store.
+
+        Returns
+        -------
+        HashIndex
+            This index, or one built over ``store`` if the table would get
+            fuller than ``load_factor``.
+
+        """
+        if len(store) > len(self.slots) * load_factor:
+            return HashIndex.build(store, load_factor)
+        if not self.slots.flags.writeable:  # mapped from a file
+            self.slots = self.slots.copy()
+        for i in removed:
+            self._delete(self._slot_of(i))
+        at = [self._slot_of(i) for i in moved]
+        hashes = self.hashes
+        if len(store) > len(hashes) or not hashes.flags.writeable:
+            hashes = np.concatenate([hashes, np.zeros(max(len(store) - len(hashes), 0), dtype=hashes.dtype)])
+        hashes[list(moved.values())] = self.hashes[list(moved)]
+        self.slots[at] = list(moved.values())
+        self.hashes = hashes[:len(store)]
+        self.store = store
+        for i, str_ in added.items():
+            h = fnv1a(str_.encode("utf-8"))
+            self.hashes[i] = h
+            slot = h & self.mask
+            while self.slots[slot] != EMPTY:
+                slot = (slot + 1) & self.mask
+            self.slots[slot] = i
+        return self
+
+
+class LazyDict(dict):
+    """The ``{string: id}`` dict over ``store``, filled on first use.
+
+    ``known`` entries (the specials, which every backend looks up when
+    it's built) are there from the start; the rest are added the first
+    time anything else is looked up. So an unpickled numericalization
+    that only decodes never builds the dict.
+
+    """
+    def __init__(self, store, known=()):
+        super().__init__(known)
+        self.store = store
+        self.filled = False
+
+    def fill(self):
+        if not self.filled:
+            self.filled = True
+            self.update(zip(self.store, range(len(self.store))))
+            # shadow the override: encode_batch maps dict.get over every token
+            self.get = super().get
+        return self
+
+    def __missing__(self, str_):
+        if self.filled:
+            raise KeyError(str_)
+        return self.fill()[str_]
+
+    def get(self, str_, default=None):
+        return self.fill().get(str_, default)
+
+    def __contains__(self, str_):
+        if not super().__contains__(str_):
+            self.fill()
+        return super().__contains__(str_)
+
+    def __len__(self):
+        return super().__len__() if self.filled else len(self.store)
+
+    def __iter__(self):
+        self.fill()
+        return super().__iter__()
+
+    def keys(self):
+        self.fill()
+        return super().keys()
+
+    def values(self):
+        self.fill()
+        return super().values()
+
+    def items(self):
+        self.fill()
+        return super().items()
+
+    def __reduce__(self):
+        if self.filled:
+            return dict, (dict(self.items()),)
+        return LazyDict, (self.store, dict(super().items()))
+
+
+class PrefixIndex:
+    """``index`` limited to the ids below ``n``, for a stripped view.
+
+    Strings with larger ids are OOV. Restricting a ``PrefixIndex`` limits
+    its ``index`` further, so views of views don't stack up.
+
+    """
+    def __init__(self, index, n):
+        if isinstance(index, PrefixIndex):
+            index, n = index.index, min(index.n, n)
+        self.index = index
+        self.n = n
+
+    def get(self, str_, default=None):
+        i = self.index.get(str_)
+        return i if i is not None and i < self.n else default
+
+    def __getitem__(self, str_):
+        i = self.get(str_)
+        if i is None:
+            raise KeyError(str_)
+        return i
+
+    def __contains__(self, str_):
+        return self.get(str_) is not None
+
+    def __len__(self):
+        return self.n
+
+
+def unwrap(s2i):
+    """``(index, n)``: ``s2i`` is ``index`` limited to ids below ``n``.
+
+    ``s2i`` itself and its length, unless it's a :class:`PrefixIndex`. For
+    kernels that probe a :class:`HashIndex`'s arrays and then drop ids
+    ``>= n``.
+
+    """
+    if isinstance(s2i, PrefixIndex):
+        return s2i.index, s2i.n
+    return s2i, len(s2i)
+
+
+def make_index(kind, store):
+    """Build an ``s2i`` of ``kind`` (``"dict"``, ``"hash"`` or ``"sorted"``) over ``store``."""
+    if kind == "dict":
+        return {s: i for i, s in enumerate(store)}
+    if kind == "hash":
+        return HashIndex.build(store)
+    if kind == "sorted":
+        return SortedIndex.build(store)
+    raise ValueError(f"index must be 'dict', 'hash' or 'sorted', got {kind!r}")
+
+
+def index_kind(s2i):
+    """The ``kind`` to :func:`make_index` an index like ``s2i`` with."""
+    s2i, _ = unwrap(s2i)
+    if isinstance(s2i, HashIndex):
+        return "hash"
+    if isinstance(s2i, SortedIndex):
+        return "sorted"
+    return "dict"
+
+
+def rebuild(s2i, store):
+    """Build an index of the same kind as ``s2i`` over ``store``."""
+    s2i, _ = unwrap(s2i)
+    if isinstance(s2i, HashIndex):
+        return HashIndex.build(store)
+    if isinstance(s2i, SortedIndex):
+        return SortedIndex.build(store)
+    return {s: i for i, s in enumerate(store)}
@@ -1,6 +1,14 @@
 import numba
 import numpy as np
 import bisect
+from copy import deepcopy
+
+from protovoc.numericalization import incremental, shared, storage
+from protovoc.numericalization.batch import encode_batch
+from protovoc.numericalization.decode import SentenceView, as_rows, checked_ids, format_rows, ragged_rows
+from protovoc.numericalization.index import HashIndex, PrefixIndex, make_index, rebuild, unwrap
+from protovoc.numericalization.strings import StringStore
+from protovoc.vocab.strip import prefix_len
 
 
 # num .str
@@ -39,71 +47,295 @@ class _NbIntInterface:
     def __contains__(self, int_):
         return int_ < len(self.s2i)
 
+    def encode_batch(self, batch, pad=None, bos=None, eos=None, max_len=None, out=None, ragged=False):
+        return encode_batch(
+            self.s2i, getattr(self, "unk", None), batch, pad=pad, bos=bos, eos=eos,
+            max_len=max_len, out=out, ragged=ragged,
+            scatter_fn=_scatter, scatter_ragged_fn=_scatter_ragged)
+
+    def lookup(self, buf, offsets):
+        """Ids of the UTF-8 strings ``buf[offsets[i]:offsets[i + 1]]``, and an OOV mask.
+
+        Needs a ``HashIndex`` (``index="hash"`` or a loaded file). OOVs are
+        ``-1``.
+
+        """
+        index, n = unwrap(self.s2i)
+        if not isinstance(index, HashIndex):
+            raise TypeError("lookup needs a HashIndex s2i")
+        buf = np.frombuffer(buf, dtype=np.uint8) if not isinstance(buf, np.ndarray) else buf
+        ids = _hash_lookup(index.slots, index.hashes, index.store.data, index.store.offsets,
+                           buf, np.asarray(offsets, dtype=np.int64))
+        ids[ids >= n] = -1
+        return ids, ids == -1
+
+
+@numba.njit(nogil=True, cache=True)
+def _hash_lookup(slots, hashes, data, offsets, buf, q_offsets):
+    mask = np.uint64(slots.shape[0] - 1)
+    n = q_offsets.shape[0] - 1
+    ids = np.empty(n, dtype=np.int64)
+    for q in range(n):
+        h = np.uint64(0xcbf29ce484222325)
+        for byte in range(q_offsets[q], q_offsets[q + 1]):
+            h = (h ^ np.uint64(buf[byte])) * np.uint64(0x100000001b3)
+        at = h & mask
+        q_len = q_offsets[q + 1] - q_offsets[q]
+        found = -1
+        while slots[at] != -1:
+            i = slots[at]
+            if hashes[i] == h and offsets[i + 1] - offsets[i] == q_len:
+                same = True
+                for k in range(q_len):
+                    if data[offsets[i] + k] != buf[q_offsets[q] + k]:
+                        same = False
+                        break
+                if same:
+                    found = i
+                    break
+            at = (at + np.uint64(1)) & mask
+        ids[q] = found
+    return ids
 
-@numba.njit('b1[:](i8[:],i8,i8)')
-def _isin_cumsum_ge0_stepped(arr, thresh, stepsize):
-    n_elems = arr.size
-    mask = np.empty(n_elems, dtype=np.bool_)
-    for group_idx in range(0, (n_elems / stepsize)):
-        for elem_idx in range(group_idx * stepsize, (group_idx + 1) * stepsize):
-            if arr[elem_idx] < thresh:
-                mask[elem_idx:stepsize*(group_idx+1)] = True
+
+@numba.njit('i8[:](i8[:,:],i8)', cache=True)
+def _first_below(rows, thresh):
+    n_rows, n_cols = rows.shape
+    stops = np.empty(n_rows, dtype=np.int64)
+    for row in range(n_rows):
+        stop = n_cols
+        for col in range(n_cols):
+            if rows[row, col] < thresh:
+                stop = col
+                break
+        stops[row] = stop
+    return stops
+
+
+@numba.njit('i8[:](i8[:],i8[:],i8[:],i8)', cache=True)
+def _ragged_first_below(ids, starts, lens, thresh):
+    n_rows = starts.shape[0]
+    stops = np.empty(n_rows, dtype=np.int64)
+    for row in range(n_rows):
+        stop = lens[row]
+        for col in range(lens[row]):
+            if ids[starts[row] + col] < thresh:
+                stop = col
                 break
-            mask[elem_idx] = False
-    return mask
+        stops[row] = stop
+    return stops
+
+
+@numba.njit(cache=True)
+def _join_ragged(data, offsets, ids, starts, stops):
+    n_rows = starts.shape[0]
+    total = 0
+    for row in range(n_rows):
+        for col in range(stops[row]):
+            tok = ids[starts[row] + col]
+            total += offsets[tok + 1] - offsets[tok] + 1
+    buf = np.empty(total, dtype=np.uint8)
+    row_starts = np.empty(n_rows, dtype=np.int64)
+    ends = np.empty(n_rows, dtype=np.int64)
+    pos = 0
+    for row in range(n_rows):
+        row_starts[row] = pos
+        for col in range(stops[row]):
+            if col:
+                buf[pos] = 32
+                pos += 1
+            tok = ids[starts[row] + col]
+            for byte in range(offsets[tok], offsets[tok + 1]):
+                buf[pos] = data[byte]
+                pos += 1
+        ends[row] = pos
+    return buf[:pos], row_starts, ends
 
 
-@numba.jit()
-def le_or_after(arr, thresh, axis):
-    stepsize = arr.shape[axis]
-    if axis != arr.ndim - 1:
-        # tp_axes = np.arange(arr.ndim)
-        # tp_axes[axis], tp_axes[-1] = tp_axes[-1], tp_axes[axis]
-        # arr = np.transpose(arr, axes=tp_axes)
-        arr = np.swapaxes(arr, -1, axis)
-        return _isin_cumsum_ge0_stepped(np.ravel(arr), thresh, stepsize).reshape(
-            arr.shape).swapaxes(-1, axis)  # .transpose(np.argsort(tp_axes))
-    else:
-        return _isin_cumsum_ge0_stepped(np.ravel(arr), thresh, stepsize).reshape(
-            arr.shape)
+@numba.njit(cache=True)
+def _join(data, offsets, rows, stops):
+    n_rows = rows.shape[0]
+    total = 0
+    for row in range(n_rows):
+        for col in range(stops[row]):
+            tok = rows[row, col]
+            total += offsets[tok + 1] - offsets[tok] + 1
+    buf = np.empty(total, dtype=np.uint8)
+    starts = np.empty(n_rows, dtype=np.int64)
+    ends = np.empty(n_rows, dtype=np.int64)
+    pos = 0
+    for row in range(n_rows):
+        starts[row] = pos
+        for col in range(stops[row]):
+            if col:
+                buf[pos] = 32
+                pos += 1
+            tok = rows[row, col]
+            for byte in range(offsets[tok], offsets[tok + 1]):
+                buf[pos] = data[byte]
+                pos += 1
+        ends[row] = pos
+    return buf[:pos], starts, ends
+
+
+@numba.njit('void(i8[:],i8[:],i8[:],i8,i8[:,:])', cache=True)
+def _scatter(flat, lengths, keep_lens, shift, out):
+    start = 0
+    for row in range(lengths.shape[0]):
+        for col in range(keep_lens[row]):
+            out[row, col + shift] = flat[start + col]
+        start += lengths[row]
+
+
+@numba.njit('void(i8[:],i8[:],i8[:],i8,i8[:],i8[:])', cache=True)
+def _scatter_ragged(flat, lengths, keep_lens, shift, offsets, out):
+    start = 0
+    for row in range(lengths.shape[0]):
+        to = offsets[row] + shift
+        for col in range(keep_lens[row]):
+            out[to + col] = flat[start + col]
+        start += lengths[row]
 
 
 class Numericalization:
-    def __init__(self, vocab):
-        self.specials = vocab.specials
-        self.unk = vocab.unk
-        self.has_unk = self.unk is not False and self.unk is not None
-        self.specials_w_unk = vocab.specials_w_unk
-        self._n_spec = len(self.specials_w_unk)
+    # the methods warmup() compiles for every dtype, rank and axis
+    _warmed = ("sentence",)
+
+    def __init__(self, vocab, index="dict", track=False):
+        self._vocab = vocab if track else None
+        self._changes = vocab.watch() if track else None
         unordered_cts = np.asarray(list(vocab.s2c.values()), dtype=np.float64)
         idxs_desc = np.argsort(unordered_cts)[::-1]
-        unordered_strs = np.asarray(list(vocab.s2c.keys()), dtype=object)
-        self.cts = unordered_cts[idxs_desc]
-        self.i2s = unordered_strs[idxs_desc]
-        self.s2i = {s: i for i, s in enumerate(self.i2s)}
+        unordered_strs = StringStore.from_strings(vocab.s2c.keys())
+        i2s = unordered_strs.take(idxs_desc)
+        # move unk to last position so that it gets threshed
+        cts, i2s = storage.canonical(vocab.specials, vocab.unk, unordered_cts[idxs_desc], i2s)
+        self._build(vocab.specials, vocab.unk, cts, i2s, make_index(index, i2s))
+
+    def _build(self, specials, unk, cts, i2s, s2i):
+        self.specials = specials
+        # the cython Vocab's unk is "" when there is none
+        self.unk = unk if unk else False
+        self.has_unk = self.unk is not False
+        self.specials_w_unk = deepcopy(specials)
+        if self.has_unk:
+            self.specials_w_unk.add(unk)
+        self._n_spec = len(self.specials_w_unk)
+        self.cts = cts
+        self.i2s = i2s
+        self.s2i = s2i
+
         unk_interface = False if not self.unk else self.s2i[self.unk]
         self.integer = _NbIntInterface(self.s2i, unk_interface)
         self.permit_unk(False)
         self.string = _NbStrInterface(self.i2s)
 
-        # move unk to last position so that it gets threshed
-        if self.has_unk:
-            unk_at = self.s2i[self.unk]
-            if unk_at != self._n_spec - 1:
-                unk_to = self._n_spec - 1
-                self.s2i[self.unk] = unk_to
-                was_at_unk_to = self.i2s[unk_to]
-                self.s2i[was_at_unk_to] = unk_at
-                self.i2s[unk_at], self.i2s[unk_to] = self.i2s[unk_to], self.i2s[unk_at]
-                self.cts[unk_at], self.cts[unk_to] = self.cts[unk_to], self.cts[unk_to]
-
-    def sentence(self, integers, axis=0):
-        strs = self.i2s[integers]
-        idx = tuple([slice(0, s) if i != axis else slice(1, s) for i, s in enumerate(strs.shape)])
-        strs[idx] = " " + strs[idx]
-        strs[le_or_after(integers, self._cutoff, axis)] = ""
-        strs = strs.sum(axis=axis)
-        return strs
+    def refresh(self):
+        """Apply the count changes of the tracked vocab (``track=True``).
+
+        Moves only the changed entries. See
+        :mod:`protovoc.numericalization.incremental`.
+
+        """
+        if getattr(self, "_changes", None) is None:
+            raise ValueError("Not tracking a vocab, construct with track=True")
+        permitted = self._cutoff == self._n_spec - 1
+        cts, i2s, s2i = incremental.refresh(
+            self._vocab, self._changes, self._n_spec, self.cts, self.i2s, self.s2i)
+        self._build(self.specials, self.unk if self.unk else False, cts, i2s, s2i)
+        self.permit_unk(permitted)
+
+    def save(self, path):
+        storage.save(path, self.specials, self.unk, self.cts, self.i2s)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls._from_parts(storage.canonical_parts(storage.load(path, mmap=mmap)))
+
+    @classmethod
+    def _from_parts(cls, parts, permitted=False, segment=None):
+        self = cls.__new__(cls)
+        self._build(*parts)
+        self.permit_unk(permitted)
+        self._segment = segment
+        return self
+
+    def share_memory(self):
+        """Move counts, strings and index to shared memory, for data loader workers.
+
+        See :mod:`protovoc.numericalization.shared`.
+
+        """
+        permitted = self._cutoff == self._n_spec - 1
+        self._segment = shared.share(self.specials, self.unk, self.cts, self.i2s)
+        self._build(*self._segment.parts)
+        self.permit_unk(permitted)
+        return self
+
+    def __reduce__(self):
+        return shared.reduce(type(self), getattr(self, "_segment", None), self.specials, self.unk,
+                             self.cts, self.i2s, self.s2i, self._cutoff == self._n_spec - 1)
+
+    @classmethod
+    def warmup(cls, dtypes=(np.int32, np.int64), ndims=(1, 2, 3)):
+        """Compile the kernels ``sentence()`` needs for these inputs (and ragged ones) now.
+
+        Call at process start (e.g. in a data loader's ``worker_init_fn``)
+        so the first real batch doesn't wait on the JIT. Kernels are cached
+        on disk (``cache=True``, in ``__pycache__`` or ``NUMBA_CACHE_DIR``),
+        so only the first process on a host compiles; later ones load.
+
+        Parameters
+        ----------
+        dtypes : Iterable[np.dtype]
+            Integer dtypes that will be passed to ``sentence()``. This
+            backend casts ids to int64 first, so only ``numba_parallel``,
+            whose kernels take ids as they are, compiles per dtype.
+        ndims : Iterable[int]
+            Ranks that will be passed to ``sentence()``; every axis of each is
+            warmed up, as the memory layouts differ.
+
+        """
+        strings = StringStore.from_strings(["<pad>", "a"])
+        packed = storage.layout({"<pad>"}, False, [np.inf, 1.0], strings)
+        buf = bytearray(packed[-1])
+        storage.pack_into(buf, *packed)
+        # the stores' arrays are typed by writability: read-only bytes with
+        # writable offsets (from a vocab), all writable (after a take or
+        # refresh), and all read-only (load() or share_memory())
+        for i2s in (strings, strings.take(np.arange(2)), storage.parse(bytes(buf)).i2s):
+            num = cls.__new__(cls)
+            num._build({"<pad>"}, False, np.asarray([np.inf, 1.0]), i2s, make_index("dict", i2s))
+            for dtype in dtypes:
+                for ndim in ndims:
+                    ids = np.ones(tuple(range(2, ndim + 2)), dtype=dtype)
+                    for axis in range(ndim):
+                        for method in cls._warmed:
+                            getattr(num, method)(ids, axis=axis)
+            num.sentence(np.ones(3, dtype=np.int64), lengths=[2, 1])
+
+    def sentence(self, integers, axis=0, output=None, offsets=None, lengths=None):
+        if offsets is not None or lengths is not None:
+            ids, starts, lens = ragged_rows(integers, offsets, lengths)
+            ids = checked_ids(ids, len(self.i2s), self.s2i, self.unk)
+            stops = _ragged_first_below(ids, starts, lens, self._cutoff)
+            buf, row_starts, ends = _join_ragged(self.i2s.data, self.i2s.offsets, ids, starts, stops)
+            return format_rows(buf, row_starts, ends, (len(stops),), output), stops
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        rows, shape = as_rows(integers.astype(np.int64, copy=False), axis)
+        stops = _first_below(rows, self._cutoff)
+        buf, starts, ends = _join(self.i2s.data, self.i2s.offsets, rows, stops)
+        return format_rows(buf, starts, ends, shape, output)
+
+    def sentence_view(self, integers, axis=0):
+        """Like :meth:`sentence`, but rows are joined on first access.
+
+        See :class:`~protovoc.numericalization.decode.SentenceView`.
+
+        """
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        rows, shape = as_rows(integers.astype(np.int64, copy=False), axis)
+        return SentenceView(self.i2s, integers, _first_below(rows, self._cutoff), axis)
 
     def permit_unk(self, val):
         if val:
@@ -130,10 +362,25 @@ class Numericalization:
             return
         self.cts = self.cts[:n_to_keep]
         self.i2s = self.i2s[:n_to_keep]
-        self.s2i = {s: i for i, s in enumerate(self.i2s)}
+        self.s2i = rebuild(self.s2i, self.i2s)
         if self.unk:
             unk_idx = self.s2i[self.unk]
         else:
             unk_idx = False
         self.integer = _NbIntInterface(self.s2i, unk_idx)
         self.string = _NbStrInterface(self.i2s)
+
+    def stripped(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
+        """Like :meth:`strip`, but as a new numericalization, leaving this one as is.
+
+        It's a view: ``cts`` and ``i2s`` are prefixes of these and ``s2i``
+        a :class:`~protovoc.numericalization.index.PrefixIndex` of this
+        one, so it takes O(1) to make. Words past the cut are OOV (unk), and
+        their ids decode as unk (or raise ``IndexError`` without one).
+        ``strip()`` on this one leaves it be, but ``refresh()`` may update a
+        ``dict`` or hash index in place.
+
+        """
+        n = min(prefix_len(self.cts, len(self.specials_w_unk), n_to_keep, min_freq, minimal), len(self.cts))
+        parts = storage.Parts(self.specials, self.unk, self.cts[:n], self.i2s[:n], PrefixIndex(self.s2i, n))
+        return type(self)._from_parts(parts, self._cutoff == self._n_spec - 1)
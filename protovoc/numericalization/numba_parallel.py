@@ -0,0 +1,166 @@
+"""Numba backend that decodes rows on all cores.
+
+Same layout as :mod:`protovoc.numericalization.numba` (unk last among
+the specials, stops are the first id below a cutoff), but:
+
+* Kernels take the input as it is, through strided views: the sequence
+  axis is moved last with ``np.moveaxis`` (a view), and rows are indexed
+  as ``ids[outer, inner, col]``. No ``swapaxes``/``ravel`` copies, any
+  dtype, any axis, any rank (ranks over 3 merge their leading axes).
+* Rows are split across threads with ``numba.prange``, both to find
+  stops and to join tokens. The thread count is numba's,
+  ``numba.set_num_threads()``, and so is the threading layer. With TBB,
+  a process that also ran a ``multiprocessing`` pool (e.g.
+  ``add_corpus``) hangs on exit; call :func:`prefer_openmp` at startup,
+  or set ``NUMBA_THREADING_LAYER``, to avoid it.
+* :meth:`Numericalization.mask_and_lengths` gives the stops together
+  with a mask of the kept tokens, shaped like the input.
+
+Ragged input (``offsets``/``lengths``) goes through the serial numba
+kernels, as there is no padding to skip over in parallel.
+
+"""
+import os
+
+import numba
+import numpy as np
+
+from protovoc.numericalization import numba as nb
+from protovoc.numericalization.decode import SentenceView, checked_ids, format_rows
+
+
+def prefer_openmp():
+    """Have numba pick OpenMP over TBB, unless the environment says otherwise.
+
+    Process wide, so it's opt-in. Call it before the first parallel kernel
+    runs, which is when numba picks its threading layer. Does nothing if
+    ``NUMBA_THREADING_LAYER`` or ``NUMBA_THREADING_LAYER_PRIORITY`` is set.
+
+    """
+    if not {"NUMBA_THREADING_LAYER", "NUMBA_THREADING_LAYER_PRIORITY"} & set(os.environ):
+        numba.config.THREADING_LAYER_PRIORITY = ["omp", "workqueue", "tbb"]
+
+
+@numba.njit(inline="always", cache=True)
+def _row_stop(ids, outer, inner, cutoff):
+    n_cols = ids.shape[2]
+    for col in range(n_cols):
+        if ids[outer, inner, col] < cutoff:
+            return col
+    return n_cols
+
+
+@numba.njit(parallel=True, cache=True)
+def _stops(ids, cutoff):
+    n_outer, n_inner, _ = ids.shape
+    stops = np.empty(n_outer * n_inner, dtype=np.int64)
+    for row in numba.prange(n_outer * n_inner):
+        outer, inner = row // n_inner, row % n_inner
+        stops[row] = _row_stop(ids, outer, inner, cutoff)
+    return stops
+
+
+@numba.njit(parallel=True, cache=True)
+def _stops_mask(ids, cutoff, mask):
+    n_outer, n_inner, n_cols = ids.shape
+    stops = np.empty(n_outer * n_inner, dtype=np.int64)
+    for row in numba.prange(n_outer * n_inner):
+        outer, inner = row // n_inner, row % n_inner
+        stop = _row_stop(ids, outer, inner, cutoff)
+        for col in range(n_cols):
+            mask[outer, inner, col] = col < stop
+        stops[row] = stop
+    return stops
+
+
+@numba.njit(parallel=True, cache=True)
+def _join(data, offsets, ids, stops):
+    n_inner = ids.shape[1]
+    n_rows = stops.shape[0]
+    bounds = np.zeros(n_rows + 1, dtype=np.int64)
+    for row in numba.prange(n_rows):
+        outer, inner = row // n_inner, row % n_inner
+        width = stops[row] - 1 if stops[row] else 0
+        for col in range(stops[row]):
+            tok = ids[outer, inner, col]
+            width += offsets[tok + 1] - offsets[tok]
+        bounds[row + 1] = width
+    bounds = np.cumsum(bounds)
+    buf = np.empty(bounds[-1], dtype=np.uint8)
+    for row in numba.prange(n_rows):
+        outer, inner = row // n_inner, row % n_inner
+        pos = bounds[row]
+        for col in range(stops[row]):
+            if col:
+                buf[pos] = 32
+                pos += 1
+            tok = ids[outer, inner, col]
+            for byte in range(offsets[tok], offsets[tok + 1]):
+                buf[pos] = data[byte]
+                pos += 1
+    return buf, bounds[:-1], bounds[1:]
+
+
+def as_3d(integers, axis=0):
+    """View ``integers`` as ``(outer, inner, seq)`` with the sequence axis last.
+
+    Returns the view and the shape of ``integers`` without ``axis``. Only
+    ranks over 3 may copy, when their leading axes can't be merged.
+
+    """
+    ids = np.moveaxis(np.asarray(integers), axis, -1)
+    shape = ids.shape[:-1]
+    if ids.ndim > 3:
+        return ids.reshape(-1, *ids.shape[-2:]), shape
+    return ids[(None,) * (3 - ids.ndim)], shape
+
+
+class Numericalization(nb.Numericalization):
+    _warmed = ("sentence", "mask_and_lengths")
+
+    def sentence(self, integers, axis=0, output=None, offsets=None, lengths=None):
+        if offsets is not None or lengths is not None:
+            return super().sentence(integers, output=output, offsets=offsets, lengths=lengths)
+        ids, shape = as_3d(checked_ids(integers, len(self.i2s), self.s2i, self.unk), axis)
+        stops = _stops(ids, self._cutoff)
+        buf, starts, ends = _join(self.i2s.data, self.i2s.offsets, ids, stops)
+        return format_rows(buf, starts, ends, shape, output)
+
+    def sentence_view(self, integers, axis=0):
+        """Like :meth:`sentence`, but rows are joined on first access.
+
+        See :class:`~protovoc.numericalization.decode.SentenceView`.
+
+        """
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        ids, shape = as_3d(integers, axis)
+        return SentenceView(self.i2s, integers, _stops(ids, self._cutoff), axis)
+
+    def mask_and_lengths(self, integers, axis=0):
+        """Which tokens ``sentence()`` keeps, and how many per sequence.
+
+        Parameters
+        ----------
+        integers : np.ndarray[int]
+            Ids, any rank, dtype and strides.
+        axis : int
+            The sequence axis.
+
+        Returns
+        -------
+        mask : np.ndarray[bool]
+            Shape of ``integers``; ``True`` before the first special of its
+            sequence.
+        lengths : np.ndarray[int64]
+            Shape of ``integers`` without ``axis``; the position of the
+            first special, or the sequence length.
+
+        """
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        ids, shape = as_3d(integers, axis)
+        mask = np.empty(np.shape(integers), dtype=bool)
+        mask_3d, _ = as_3d(mask, axis)
+        stops = _stops_mask(ids, self._cutoff, mask_3d)
+        if not np.may_share_memory(mask_3d, mask):
+            mask = np.moveaxis(mask_3d.reshape(*shape, -1), -1, axis)
+        return mask, stops.reshape(shape)
@@ -3,6 +3,14 @@ from copy import deepcopy
 from collections import Counter
 import bisect
 
+from protovoc.numericalization import incremental, shared, storage
+from protovoc.numericalization.batch import encode_batch
+from protovoc.numericalization.decode import (
+    SentenceView, checked_ids, join, join_ragged, ragged_rows, ragged_stops_isin, stops_isin)
+from protovoc.numericalization.index import PrefixIndex, make_index, rebuild
+from protovoc.numericalization.strings import StringStore
+from protovoc.vocab.strip import prefix_len
+
 
 # num .str
 class _NpStrInterface:
@@ -40,18 +48,31 @@ class _NpIntInterface:
     def __contains__(self, int_):
         return int_ < len(self.s2i)
 
+    def encode_batch(self, batch, pad=None, bos=None, eos=None, max_len=None, out=None, ragged=False):
+        return encode_batch(
+            self.s2i, getattr(self, "unk", None), batch, pad=pad, bos=bos, eos=eos,
+            max_len=max_len, out=out, ragged=ragged)
+
 
 class Numericalization:
-    def __init__(self, vocab):
-        self.specials = vocab.specials
-        self.unk = vocab.unk
-        self.specials_w_unk = vocab.specials_w_unk
+    def __init__(self, vocab, index="dict", track=False):
+        self._vocab = vocab if track else None
+        self._changes = vocab.watch() if track else None
         unordered_cts = np.asarray(list(vocab.s2c.values()), dtype=np.float64)
         idxs_desc = np.argsort(unordered_cts)[::-1]
-        unordered_strs = np.asarray(list(vocab.s2c.keys()), dtype=object)
-        self.cts = unordered_cts[idxs_desc]
-        self.i2s = unordered_strs[idxs_desc]
-        self.s2i = {s: i for i, s in enumerate(self.i2s)}
+        unordered_strs = StringStore.from_strings(vocab.s2c.keys())
+        i2s = unordered_strs.take(idxs_desc)
+        self._build(vocab.specials, vocab.unk, unordered_cts[idxs_desc], i2s, make_index(index, i2s))
+
+    def _build(self, specials, unk, cts, i2s, s2i):
+        self.specials = specials
+        self.unk = unk
+        self.specials_w_unk = deepcopy(specials)
+        if unk:
+            self.specials_w_unk.add(unk)
+        self.cts = cts
+        self.i2s = i2s
+        self.s2i = s2i
         unk_interface = False if not self.unk else self.s2i[self.unk]
         self.integer = _NpIntInterface(self.s2i, unk_interface)
         self.specs_as_int = np.asarray(self.integer[self.specials], dtype=np.int64)
@@ -59,14 +80,70 @@ class Numericalization:
         self.permit_unk(False)
         self.string = _NpStrInterface(self.i2s)
 
-    def sentence(self, integers, axis=0):
-        sucks = np.isin(integers, self.spec_ints).cumsum(axis=axis) != 0
-        strs = self.i2s[integers]
-        idx = tuple([slice(0, s) if i != axis else slice(1, s) for i, s in enumerate(strs.shape)])
-        strs[idx] = " " + strs[idx]
-        strs[sucks] = ""
-        strs = strs.sum(axis=axis)
-        return strs
+    def refresh(self):
+        """Apply the count changes of the tracked vocab (``track=True``).
+
+        Moves only the changed entries. See
+        :mod:`protovoc.numericalization.incremental`.
+
+        """
+        if getattr(self, "_changes", None) is None:
+            raise ValueError("Not tracking a vocab, construct with track=True")
+        permitted = self.spec_ints is self.specs_as_int
+        cts, i2s, s2i = incremental.refresh(
+            self._vocab, self._changes, len(self.specials_w_unk), self.cts, self.i2s, self.s2i)
+        self._build(self.specials, self.unk if self.unk else False, cts, i2s, s2i)
+        self.permit_unk(permitted)
+
+    def save(self, path):
+        storage.save(path, self.specials, self.unk, self.cts, self.i2s)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls._from_parts(storage.load(path, mmap=mmap))
+
+    @classmethod
+    def _from_parts(cls, parts, permitted=False, segment=None):
+        self = cls.__new__(cls)
+        self._build(*parts)
+        self.permit_unk(permitted)
+        self._segment = segment
+        return self
+
+    def share_memory(self):
+        """Move counts, strings and index to shared memory, for data loader workers.
+
+        See :mod:`protovoc.numericalization.shared`.
+
+        """
+        permitted = self.spec_ints is self.specs_as_int
+        self._segment = shared.share(self.specials, self.unk, self.cts, self.i2s)
+        self._build(*self._segment.parts)
+        self.permit_unk(permitted)
+        return self
+
+    def __reduce__(self):
+        return shared.reduce(type(self), getattr(self, "_segment", None), self.specials, self.unk,
+                             self.cts, self.i2s, self.s2i, self.spec_ints is self.specs_as_int)
+
+    def sentence(self, integers, axis=0, output=None, offsets=None, lengths=None):
+        if offsets is not None or lengths is not None:
+            ids, starts, lens = ragged_rows(integers, offsets, lengths)
+            ids = checked_ids(ids, len(self.i2s), self.s2i, self.unk)
+            stops = ragged_stops_isin(ids, starts, lens, self.spec_ints)
+            return join_ragged(self.i2s, ids, starts, stops, output), stops
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        stops = stops_isin(integers, self.spec_ints, axis=axis)
+        return join(self.i2s, integers, stops, axis=axis, output=output)
+
+    def sentence_view(self, integers, axis=0):
+        """Like :meth:`sentence`, but rows are joined on first access.
+
+        See :class:`~protovoc.numericalization.decode.SentenceView`.
+
+        """
+        integers = checked_ids(integers, len(self.i2s), self.s2i, self.unk)
+        return SentenceView(self.i2s, integers, stops_isin(integers, self.spec_ints, axis=axis), axis)
 
     def permit_unk(self, val):
         if val:
@@ -93,10 +170,25 @@ class Numericalization:
             return
         self.cts = self.cts[:n_to_keep]
         self.i2s = self.i2s[:n_to_keep]
-        self.s2i = {s: i for i, s in enumerate(self.i2s)}
+        self.s2i = rebuild(self.s2i, self.i2s)
         if self.unk:
             unk_idx = self.s2i[self.unk]
         else:
             unk_idx = False
         self.integer = _NpIntInterface(self.s2i, unk_idx)
         self.string = _NpStrInterface(self.i2s)
+
+    def stripped(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
+        """Like :meth:`strip`, but as a new numericalization, leaving this one as is.
+
+        It's a view: ``cts`` and ``i2s`` are prefixes of these and ``s2i``
+        a :class:`~protovoc.numericalization.index.PrefixIndex` of this
+        one, so it takes O(1) to make. Words past the cut are OOV (unk), and
+        their ids decode as unk (or raise ``IndexError`` without one).
+        ``strip()`` on this one leaves it be, but ``refresh()`` may update a
+        ``dict`` or hash index in place.
+
+        """
+        n = min(prefix_len(self.cts, len(self.specials_w_unk), n_to_keep, min_freq, minimal), len(self.cts))
+        parts = storage.Parts(self.specials, self.unk, self.cts[:n], self.i2s[:n], PrefixIndex(self.s2i, n))
+        return type(self)._from_parts(parts, self.spec_ints is self.specs_as_int)
@@ -0,0 +1,158 @@
+"""Numericalization backends by name, imported on demand.
+
+``get_backend("cython_1")`` imports only that backend, so e.g. a worker
+that never uses numba never pays for importing it. ``get_backend("auto")``
+gives the fastest backend on this host: the first call runs a short
+calibration with the benchmark suite's decoding benchmarks and caches the
+winner on disk (see :func:`cache_path`); later processes just read it.
+The cache is keyed on the host, the Python and NumPy versions and the
+backends available, and is recalibrated when any of them changes.
+
+"""
+import contextlib
+import importlib
+import importlib.util
+import io
+import json
+import os
+import platform
+
+import numpy as np
+
+
+BACKENDS = {
+    "numpy": "protovoc.numericalization.numpy",
+    "numba": "protovoc.numericalization.numba",
+    "numba_parallel": "protovoc.numericalization.numba_parallel",
+    "cython_0": "protovoc.numericalization.cython.cython_0",
+    "cython_1": "protovoc.numericalization.cython.cython_1",
+    "cython_2": "protovoc.numericalization.cython.cython_2",
+    "cython_3": "protovoc.numericalization.cython.cython_3",
+    "cython_4": "protovoc.numericalization.cython.cython_4",
+}
+# third party modules a backend needs, besides NumPy
+REQUIRES = {"numba": ("numba",), "numba_parallel": ("numba",)}
+# "auto" without the benchmark package: compiled before JIT before NumPy
+PREFERENCE = ("cython_4", "cython_1", "cython_2", "cython_3", "cython_0", "numba", "numba_parallel", "numpy")
+
+
+def available():
+    """Names of the backends importable here (numba installed, cython built), without importing them."""
+    return [
+        name for name, module in BACKENDS.items()
+        if all(importlib.util.find_spec(m) is not None for m in REQUIRES.get(name, ()) + (module,))]
+
+
+def cache_path():
+    """Where ``"auto"`` keeps its choice.
+
+    ``$PROTOVOC_CACHE_DIR/backend.json`` if set, else under
+    ``$XDG_CACHE_HOME`` (``~/.cache``).
+
+    """
+    root = os.environ.get("PROTOVOC_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "protovoc")
+    return os.path.join(root, "backend.json")
+
+
+def _host_key():
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "backends": available(),
+    }
+
+
+def _cached():
+    try:
+        with open(cache_path(), "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("key") != _host_key() or cached.get("backend") not in BACKENDS:
+        return None
+    return cached["backend"]
+
+
+def _calibration_vocab(n_words):
+    if importlib.util.find_spec("protovoc.vocab.cython") is not None:
+        from protovoc.vocab.cython import Vocab
+    else:
+        from protovoc.vocab.basic import Vocab
+    voc = Vocab(unk=False)
+    # zipfian counts, like natural text
+    voc.add_counts({f"w{rank}": n_words // (rank + 1) + 1 for rank in range(n_words)})
+    return voc
+
+
+def calibrate(names=None, n_trials=20, n_words=20000, cache=True):
+    """Time backends on this host, fastest first.
+
+    Each backend decodes the random 2D and 3D batches of
+    ``benchmark.benchmark_2d_word_array_sentence_random_access`` and
+    ``benchmark.benchmark_3d_word_array_sentence_random_access`` over a
+    synthetic vocab; its score is the sum of the two median times. If the
+    benchmark package isn't importable, ``PREFERENCE`` orders the backends
+    instead and nothing is cached.
+
+    Parameters
+    ----------
+    names : list of str, optional
+        Backends to time, all available ones by default.
+    n_trials : int
+        Batches per benchmark.
+    n_words : int
+        Size of the synthetic vocab.
+    cache : bool
+        Write the winner to :func:`cache_path`.
+
+    Returns
+    -------
+    list of (str, float)
+        Backend names and scores in seconds, fastest first.
+
+    """
+    names = available() if names is None else list(names)
+    try:
+        from benchmark import (benchmark_2d_word_array_sentence_random_access,
+                               benchmark_3d_word_array_sentence_random_access)
+    except ImportError:
+        return [(name, float("nan")) for name in sorted(names, key=PREFERENCE.index)]
+
+    voc = _calibration_vocab(n_words)
+    scores = []
+    for name in names:
+        num = get_backend(name)(voc)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, times_2d = benchmark_2d_word_array_sentence_random_access(num, n_trials)
+            _, times_3d = benchmark_3d_word_array_sentence_random_access(num, n_trials)
+        scores.append((name, float(np.median(times_2d) + np.median(times_3d))))
+    scores.sort(key=lambda score: score[1])
+    if cache and scores:
+        path = cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"key": _host_key(), "backend": scores[0][0], "scores": dict(scores)}, f)
+    return scores
+
+
+def get_backend(name="auto"):
+    """The ``Numericalization`` class of backend ``name``.
+
+    Parameters
+    ----------
+    name : str
+        A key of ``BACKENDS``, or ``"auto"`` for the fastest available one
+        (cached, see :func:`calibrate`).
+
+    """
+    if name == "auto":
+        name = _cached() or calibrate()[0][0]
+    try:
+        module = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend {name!r}, expected 'auto' or one of {sorted(BACKENDS)}")
+    return importlib.import_module(module).Numericalization
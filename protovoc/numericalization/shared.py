@@ -0,0 +1,96 @@
+"""Sharing a numericalization between processes.
+
+Data loader workers each get a copy of the numericalization: a pickle
+for spawned ones, and for forked ones pages that get copied on write as
+soon as refcounts change. Two things keep that small:
+
+* ``share_memory()`` (every backend) writes counts, strings and a
+  :class:`~protovoc.numericalization.index.HashIndex`, in the format of
+  :mod:`~protovoc.numericalization.storage`, to one
+  ``multiprocessing.shared_memory`` block, and rebuilds the
+  numericalization over views of it. Pickling it then only sends the
+  block's name, and unpickling maps the block, so N workers share one
+  copy. Forked workers don't copy the arrays either, as they hold no
+  Python objects. A ``dict`` ``s2i`` can't be shared, so ``s2i`` becomes
+  the ``HashIndex``.
+* Any other numericalization pickles compactly: specials, unk, counts,
+  the compacted :class:`~protovoc.numericalization.strings.StringStore`
+  and the kind of index to rebuild. A ``dict`` comes back as a
+  :class:`~protovoc.numericalization.index.LazyDict`, so a worker that
+  only decodes never builds it.
+
+The block is unlinked when the numericalization that called
+``share_memory()`` is garbage collected, so keep it alive as long as
+workers may start. Processes that already mapped the block keep it. The
+unk permission is pickled, tracking a vocab (``track=True``) isn't.
+
+"""
+from multiprocessing import shared_memory
+
+from protovoc.numericalization import storage
+from protovoc.numericalization.index import LazyDict, index_kind, make_index
+
+
+class Segment(shared_memory.SharedMemory):
+    """A shared memory block holding the parts of one numericalization.
+
+    Parameters
+    ----------
+    name : str, optional
+        Attach to this block, else create one of ``size`` bytes.
+    size : int
+
+    """
+    def __init__(self, name=None, size=0):
+        super().__init__(name=name, create=name is None, size=size)
+        self.owner = name is None
+        self.parts = storage.parse(self.buf, self.name) if name is not None else None
+
+    def __del__(self):
+        # the arrays are views of the mapping, which closes once they're
+        # gone; SharedMemory.__del__ would fail to close it before that
+        if getattr(self, "owner", False):
+            try:
+                self.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def share(specials, unk, cts, i2s):
+    """Copy parts, as they are, to a new :class:`Segment`.
+
+    Returns
+    -------
+    Segment
+        With the parts over its memory in ``.parts``.
+
+    """
+    laid_out = storage.layout(specials, unk, cts, i2s)
+    segment = Segment(size=laid_out[-1])
+    storage.pack_into(segment.buf, *laid_out)
+    segment.parts = storage.parse(segment.buf, segment.name)
+    return segment
+
+
+def reduce(cls, segment, specials, unk, cts, i2s, s2i, permitted):
+    """``__reduce__`` of a numericalization of class ``cls``.
+
+    Only the name of ``segment`` is pickled if the numericalization still
+    holds its parts (it hasn't been stripped or refreshed since).
+
+    """
+    unk = unk if unk else False
+    if segment is not None and i2s is segment.parts.i2s:
+        return restore, (cls, segment.name, None, permitted)
+    known = {s: s2i[s] for s in set(specials) | ({unk} if unk else set())}
+    return restore, (cls, None, (specials, unk, cts, i2s, index_kind(s2i), known), permitted)
+
+
+def restore(cls, name, compact, permitted):
+    """Unpickle what :func:`reduce` pickled."""
+    if name is not None:
+        segment = Segment(name)
+        return cls._from_parts(segment.parts, permitted, segment)
+    specials, unk, cts, i2s, kind, known = compact
+    s2i = LazyDict(i2s, known) if kind == "dict" else make_index(kind, i2s)
+    return cls._from_parts(storage.Parts(specials, unk, cts, i2s, s2i), permitted)
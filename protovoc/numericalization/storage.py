@@ -0,0 +1,179 @@
+"""Binary save/load format for a numericalization.
+
+One file::
+
+    magic (8 bytes) | version (uint32) | header length (uint32) | JSON header
+    | arrays, each aligned to 64 bytes
+
+The JSON header holds the specials, unk and, for every array, its dtype,
+shape and byte offset. Arrays are read with ``np.frombuffer`` over an
+``mmap`` of the file, so loading only parses the header, and processes
+that map the same file share its page cache pages.
+
+Arrays:
+
+* ``cts``: float64 counts, descending.
+* ``offsets``, ``data``: the :class:`StringStore`.
+* ``hashes``, ``slots``: the :class:`HashIndex` (version 2).
+* ``order``: the :class:`SortedIndex` (version 1, still read).
+
+Parts are written in the order they are in, so a backend loading its
+own file gets the ids it saved. The cutoff based backends need unk last
+among the specials; they apply :func:`canonical_parts` on load, a no-op
+for files they (or :mod:`~protovoc.vocab.external`) wrote, so only a
+file from another backend can come back with unk moved. The same format,
+written by :func:`pack_into` and read by :func:`parse`, backs
+:mod:`~protovoc.numericalization.shared` memory.
+
+"""
+import json
+import mmap as mmap_
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from protovoc.numericalization.index import HashIndex, SortedIndex, rebuild
+from protovoc.numericalization.strings import StringStore
+
+
+MAGIC = b"PROTOVOC"
+VERSION = 2
+ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+
+Parts = namedtuple("Parts", ["specials", "unk", "cts", "i2s", "s2i"])
+
+
+def canonical(specials, unk, cts, i2s):
+    """Move unk to the last of the specials' slots."""
+    n_spec = len(set(specials) | {unk})
+    if not unk or len(i2s) < n_spec:
+        return cts, i2s
+    unk_at = [i2s[i] for i in range(n_spec)].index(unk)
+    if unk_at == n_spec - 1:
+        return cts, i2s
+    cts = cts.copy()
+    cts[unk_at], cts[n_spec - 1] = cts[n_spec - 1], cts[unk_at]
+    return cts, i2s.swapped(unk_at, n_spec - 1)
+
+
+def canonical_parts(parts):
+    """:func:`canonical` on :class:`Parts`, rebuilding the index only if unk moves."""
+    specials, unk, cts, i2s, s2i = parts
+    moved_cts, moved_i2s = canonical(specials, unk, cts, i2s)
+    if moved_i2s is i2s:
+        return parts
+    return Parts(specials, unk, moved_cts, moved_i2s, rebuild(s2i, moved_i2s))
+
+
+def layout(specials, unk, cts, i2s):
+    """Lay out parts as they are (no :func:`canonical`) in the format.
+
+    Returns
+    -------
+    header : bytes
+        Everything before the arrays: magic, version, header length and
+        JSON header.
+    start : int
+        Byte offset of the first array.
+    arrays : dict
+        Name to ``(offset, array)``, the array going at ``start + offset``.
+    size : int
+        Total byte size.
+
+    """
+    specials = set(specials) - {unk}
+    i2s = i2s if i2s.is_compact else i2s.compact()
+    index = HashIndex.build(i2s)
+    arrays = {"cts": np.asarray(cts, dtype=np.float64), "offsets": i2s.offsets, "data": i2s.data,
+              "hashes": index.hashes, "slots": index.slots}
+
+    table = {}
+    pos = 0
+    for name, arr in arrays.items():
+        pos = -(-pos // ALIGN) * ALIGN
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": pos}
+        pos += arr.nbytes
+    header = {"specials": sorted(specials), "unk": unk if unk else None, "arrays": table}
+    header_bytes = json.dumps(header).encode("utf-8")
+    start = -(-(_PREFIX.size + len(header_bytes)) // ALIGN) * ALIGN
+    prefix = _PREFIX.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes
+    arrays = {name: (table[name]["offset"], arr) for name, arr in arrays.items()}
+    return prefix, start, arrays, start + pos
+
+
+def save(path, specials, unk, cts, i2s):
+    """Write a numericalization's parts to ``path``, ids as they are. See the module docstring."""
+    write(path, *layout(specials, unk, np.asarray(cts, dtype=np.float64), i2s.compact()))
+
+
+def write(path, prefix, start, arrays, size):
+    """Write a :func:`layout` to the file ``path``."""
+    with open(path, "wb") as f:
+        f.write(prefix)
+        for offset, arr in arrays.values():
+            f.seek(start + offset)
+            np.ascontiguousarray(arr).tofile(f)
+        f.truncate(size)
+
+
+def pack_into(buf, prefix, start, arrays, size):
+    """Write a :func:`layout` to a writable buffer of at least ``size`` bytes (e.g. shared memory)."""
+    view = np.frombuffer(buf, dtype=np.uint8, count=size)
+    view[:len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+    for offset, arr in arrays.values():
+        flat = np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+        view[start + offset:start + offset + len(flat)] = flat
+
+
+def load(path, mmap=True):
+    """Read the parts written by :func:`save`.
+
+    Parameters
+    ----------
+    path : str or os.PathLike
+    mmap : bool
+        Map the file read-only instead of reading it. The arrays are then
+        read-only views of the mapping.
+
+    Returns
+    -------
+    Parts
+        ``(specials, unk, cts, i2s, s2i)``, ``unk`` being ``False`` if there
+        is none and ``s2i`` an index over ``i2s``.
+
+    """
+    with open(path, "rb") as f:
+        if mmap:
+            buf = mmap_.mmap(f.fileno(), 0, access=mmap_.ACCESS_READ)
+        else:
+            buf = bytearray(f.read())
+    return parse(buf, path)
+
+
+def parse(buf, source="buffer"):
+    """The parts in ``buf``, which holds the format (a file's bytes or
+    mapping, or shared memory). Arrays are views of ``buf``."""
+    magic, version, header_len = _PREFIX.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{source} is not a protovoc file")
+    if version > VERSION:
+        raise ValueError(f"{source} has format version {version}, newest supported is {VERSION}")
+    header = json.loads(bytes(buf[_PREFIX.size:_PREFIX.size + header_len]).decode("utf-8"))
+    start = -(-(_PREFIX.size + header_len) // ALIGN) * ALIGN
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(
+            buf, dtype=dtype, count=count, offset=start + spec["offset"]).reshape(spec["shape"])
+
+    i2s = StringStore(arrays["data"], arrays["offsets"])
+    unk = header["unk"] if header["unk"] is not None else False
+    if "slots" in arrays:
+        s2i = HashIndex(i2s, arrays["hashes"], arrays["slots"])
+    else:
+        s2i = SortedIndex(i2s, arrays["order"])
+    return Parts(set(header["specials"]), unk, arrays["cts"], i2s, s2i)
@@ -0,0 +1,142 @@
+"""Contiguous string storage for ``i2s``.
+
+Every string lives in one UTF-8 ``uint8`` buffer, string ``i`` being
+``data[offsets[i]:offsets[i + 1]]``. That's two flat arrays instead of an
+object array of ``str``, so the table can be copied, pickled or mapped as
+is, and kernels can work on raw bytes.
+
+"""
+import numbers
+
+import numpy as np
+
+
+class StringStore:
+    """Immutable table of strings in a byte buffer plus offsets.
+
+    Parameters
+    ----------
+    data : np.ndarray[uint8]
+        Concatenated UTF-8 encoded strings.
+    offsets : np.ndarray[int64]
+        ``len(self) + 1`` positions into ``data``. Need not start at 0, so
+        prefixes and suffixes are views.
+
+    """
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self):
+        """Byte length of every string."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+    def _str(self, i):
+        if i < 0:
+            i += len(self)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __getitem__(self, integer):
+        if isinstance(integer, numbers.Integral):
+            return self._str(integer)
+        if isinstance(integer, slice):
+            start, stop, step = integer.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                return StringStore(self.data, self.offsets[start:stop + 1])
+            return self.take(np.arange(start, stop, step))
+        integer = np.asarray(integer)
+        if integer.dtype.kind not in "iu":
+            raise IndexError(f"Can't index strings with {integer.dtype}")
+        integer = integer.astype(np.int64, copy=False)
+        if integer.size and (integer.min() < -len(self) or integer.max() >= len(self)):
+            raise IndexError(f"string ids must be in [-{len(self)}, {len(self)})")
+        # gather, then decode the whole buffer once and cut it at character offsets
+        taken = self.take(np.where(integer < 0, integer + len(self), integer))
+        text = taken.data.tobytes().decode("utf-8")
+        # every byte but a UTF-8 continuation byte starts a character
+        chars = np.zeros(len(taken.data) + 1, dtype=np.int64)
+        np.cumsum((taken.data & 0xC0) != 0x80, out=chars[1:])
+        bounds = chars[taken.offsets].tolist()
+        strs = np.empty(integer.shape, dtype=object)
+        strs.reshape(-1)[:] = [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        return strs
+
+    def __iter__(self):
+        base = self.offsets[0]
+        data = self.data[base:self.offsets[-1]].tobytes()
+        starts = (self.offsets[:-1] - base).tolist()
+        ends = (self.offsets[1:] - base).tolist()
+        for start, end in zip(starts, ends):
+            yield data[start:end].decode("utf-8")
+
+    def __contains__(self, str_):
+        if not isinstance(str_, str):
+            return False
+        needle = np.frombuffer(str_.encode("utf-8"), dtype=np.uint8)
+        cands = np.flatnonzero(self.lengths == len(needle))
+        if not len(needle):
+            return len(cands) > 0
+        windows = self.data[self.offsets[cands, None] + np.arange(len(needle))]
+        return bool((windows == needle).all(axis=1).any())
+
+    def take(self, integers):
+        """Gather strings into a new, compact store (a vectorized memcpy)."""
+        integers = np.asarray(integers, dtype=np.int64).ravel()
+        starts = self.offsets[integers]
+        lengths = self.offsets[integers + 1] - starts
+        offsets = np.zeros(len(integers) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        src = np.arange(offsets[-1], dtype=np.int64) + np.repeat(starts - offsets[:-1], lengths)
+        return StringStore(self.data[src], offsets)
+
+    def swapped(self, i, j):
+        """A copy with strings ``i`` and ``j`` exchanged."""
+        perm = np.arange(len(self))
+        perm[i], perm[j] = j, i
+        return self.take(perm)
+
+    def extended(self, strings):
+        """A compact copy with ``strings`` appended."""
+        if not len(strings):
+            return self
+        tail = StringStore.from_strings(strings)
+        head = self.compact()
+        return StringStore(np.concatenate([head.data, tail.data]),
+                           np.concatenate([head.offsets, tail.offsets[1:] + head.offsets[-1]]))
+
+    @property
+    def is_compact(self):
+        """Whether the buffer holds exactly the strings of this view."""
+        return self.offsets[0] == 0 and len(self.data) == self.offsets[-1]
+
+    def compact(self):
+        """A copy whose buffer holds exactly the strings of this view."""
+        data = self.data[self.offsets[0]:self.offsets[-1]].copy()
+        return StringStore(data, self.offsets - self.offsets[0])
+
+    def tolist(self):
+        return list(self)
+
+    def __reduce__(self):
+        store = self if self.is_compact else self.compact()
+        return StringStore, (store.data, store.offsets)
+
+    def __repr__(self):
+        return f"StringStore({len(self)} strings, {self.data.nbytes} bytes)"
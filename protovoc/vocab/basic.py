@@ -1,6 +1,13 @@
+import weakref
 from copy import deepcopy
 from collections import Counter
 
+from protovoc.vocab import counts as bulk
+from protovoc.vocab.corpus import DEFAULT_CHUNK_SIZE, count_corpus
+from protovoc.vocab.external import DEFAULT_SPILL_BUDGET, count_external
+from protovoc.vocab.sketch import DEFAULT_DEPTH, DEFAULT_MEMORY_BUDGET, count_two_pass
+from protovoc.vocab.strip import strip_counts
+
 
 class _VocStrInterface:
     def __init__(self, s2c):
@@ -23,41 +30,176 @@ class Vocab:
         for word in self.specials_w_unk:
             self.s2c[word] = float("inf")
         self.string = _VocStrInterface(self.s2c)
+        self._watchers = []
+        self.sketch_report = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_watchers"] = []
+        return state
 
     def __len__(self):
         return len(self.s2c)
 
+    def watch(self):
+        """Start recording which words change count.
+
+        Returns a ``set`` that every word whose count changes from now on
+        is added to; the caller empties it as it consumes it. The vocab
+        only holds a weak reference, so dropping the set stops recording.
+
+        """
+        changes = set()
+        self._watchers.append(weakref.ref(changes, self._watchers.remove))
+        return changes
+
+    def _changed(self, words):
+        for ref in self._watchers:
+            ref().update(words)
+
     def add(self, word):
         if word in self.s2c:
             self.s2c[word] += 1
         else:
             self.s2c[word] = 1
+        for ref in self._watchers:
+            ref().add(word)
 
     def add_iterable(self, words):
-        for word in words:
-            self.add(word)
+        self.add_counts(Counter(words))
+
+    def add_counts(self, words, counts=None):
+        """Add counts in bulk, one update per distinct word.
+
+        Parameters
+        ----------
+        words : Mapping[str, int] or Sequence[str]
+            A ``Counter``/mapping, or the distinct words if ``counts`` is given.
+        counts : Sequence[int], optional
+            Counts parallel to ``words`` (e.g. two NumPy arrays).
+
+        """
+        self._changed(bulk.add_counts(self.s2c, bulk.as_pairs(words, counts)))
+
+    def add_corpus(self, sources, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+        """Count files and/or token iterables in a process pool.
+
+        Gives the same counts (and word order) as ``add_iterable`` over
+        all of the tokens. See :func:`protovoc.vocab.corpus.count_corpus`.
+
+        """
+        for counts in count_corpus(sources, workers=workers, chunk_size=chunk_size, tokenizer=tokenizer):
+            self.s2c.update(counts)
+            self._changed(counts)
+
+    @classmethod
+    def from_corpus(cls, sources, specials=None, unk=False, workers=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+        voc = cls(specials=specials, unk=unk)
+        voc.add_corpus(sources, workers=workers, chunk_size=chunk_size, tokenizer=tokenizer)
+        return voc
+
+    @classmethod
+    def from_sketch(cls, sources, n_to_keep=float("inf"), min_freq=0, specials=None, unk=False,
+                    memory_budget=DEFAULT_MEMORY_BUDGET, depth=DEFAULT_DEPTH,
+                    chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+        """Build an already stripped vocab in bounded memory.
+
+        A count-min sketch pass picks candidates, a second pass counts only
+        those exactly, then the vocab is stripped to ``n_to_keep`` /
+        ``min_freq``. The :class:`~protovoc.vocab.sketch.SketchReport` is
+        kept as ``sketch_report``. See
+        :func:`protovoc.vocab.sketch.count_two_pass`.
+
+        """
+        counts, report = count_two_pass(
+            sources, n_to_keep=n_to_keep, min_freq=min_freq, memory_budget=memory_budget,
+            depth=depth, chunk_size=chunk_size, tokenizer=tokenizer)
+        voc = cls(specials=specials, unk=unk)
+        voc.s2c.update(counts)
+        voc.strip(n_to_keep, min_freq=min_freq)
+        voc.sketch_report = report
+        return voc
+
+    @classmethod
+    def from_external(cls, sources, n_to_keep=float("inf"), min_freq=0, specials=None, unk=False,
+                      memory_budget=DEFAULT_SPILL_BUDGET, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None,
+                      tmpdir=None):
+        """Build an already stripped vocab, counting through sorted runs on disk.
+
+        Only the words seen at least ``min_freq`` times come out of the
+        merge of the runs, so the counts of the rest are never held
+        together. See :func:`protovoc.vocab.external.count_external`.
+
+        """
+        voc = cls(specials=specials, unk=unk)
+        bulk.add_counts(voc.s2c, count_external(
+            sources, min_freq=min_freq, memory_budget=memory_budget, chunk_size=chunk_size,
+            tokenizer=tokenizer, tmpdir=tmpdir))
+        voc.strip(n_to_keep, min_freq=min_freq)
+        return voc
+
+    def add_file(self, path, tokenizer=None, chunk_size=None):
+        """Count a UTF-8 text file through a memory map.
+
+        Tokenizing and counting happen in compiled code, in bounded windows,
+        without building a list of the tokens. See
+        :func:`protovoc.vocab.tokenize.count_file`.
+
+        Parameters
+        ----------
+        path : str or os.PathLike
+        tokenizer : protovoc.vocab.tokenize.Tokenizer, optional
+            Whitespace split by default. ``Tokenizer(punct=".,!?", lower=True)``
+            also splits off punctuation and lowercases.
+        chunk_size : int, optional
+            Bytes per window.
+
+        """
+        from protovoc.vocab.tokenize import count_file  # compiled, only needed here
+
+        kwargs = {} if chunk_size is None else {"chunk_size": chunk_size}
+        counts = count_file(path, tokenizer=tokenizer, **kwargs)
+        self.s2c.update(counts)
+        self._changed(counts)
 
     def uncount(self, word):
         self.s2c[word] -= 1
         if self.s2c[word] == 0:
             del self.s2c[word]
+        for ref in self._watchers:
+            ref().add(word)
 
     def uncount_iterable(self, words):
-        for word in words:
-            self.uncount(word)
+        self.uncount_counts(Counter(words))
+
+    def uncount_counts(self, words, counts=None):
+        """Subtract counts in bulk, like :meth:`add_counts`. Words reaching 0 are removed."""
+        self._changed(bulk.uncount_counts(self.s2c, bulk.as_pairs(words, counts)))
+
+    @classmethod
+    def merge(cls, *vocabs):
+        """One vocab with the summed counts of ``vocabs``.
+
+        Specials are the union of theirs. Vocabs with an unk must agree on
+        it; the result has that unk, if any.
+
+        """
+        unks = {voc.unk for voc in vocabs if voc.unk}
+        if len(unks) > 1:
+            raise ValueError(f"Can't merge vocabs with different unks: {sorted(unks)}")
+        merged = cls(specials=set().union(*(voc.specials for voc in vocabs)), unk=unks.pop() if unks else False)
+        for voc in vocabs:
+            merged.add_counts(voc.s2c)
+        return merged
 
     def strip(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
-        n_to_keep += len(self.specials_w_unk)
-        if n_to_keep < len(self.s2c):
-            s2c_n = self.s2c.most_common(n_to_keep)
-        else:
-            s2c_n = [(s, c) for s, c in self.s2c.items()]
+        """Keep the ``n_to_keep`` most frequent words (plus specials) and/or those seen ``min_freq`` times.
 
-        s2n_f = {s: c for s, c in self.s2c.items() if c >= min_freq}
-        if minimal:
-            self.s2c = Counter({s: c for s, c in s2c_n if s in s2n_f})
-        else:
-            s2c_n = Counter(s2c_n)
-            s2c_n.update(s_f)  # NOTE: Not sure what this is/was. Doesn't trip in any test.
-            self.s2c = s2c_n
+        See :func:`protovoc.vocab.strip.strip_counts`.
+
+        """
+        self.s2c, dropped = strip_counts(
+            self.s2c, n_to_keep + len(self.specials_w_unk), min_freq=min_freq, minimal=minimal)
         self.string = _VocStrInterface(self.s2c)
+        self._changed(dropped)
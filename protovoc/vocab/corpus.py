@@ -0,0 +1,111 @@
+"""Parallel corpus counting.
+
+A corpus is a list of sources, each either a path to a UTF-8 text file or
+an iterable of tokens. Sources are cut into shards (byte ranges of files
+aligned to line starts, runs of ``chunk_size`` tokens of iterables), each
+shard is counted into its own ``Counter`` in a process pool, and the
+partial counts are merged back in shard order. Merging in order keeps
+both the counts and the first-seen order of the words identical to
+counting serially with ``add_iterable``.
+
+"""
+import os
+from collections import Counter
+from itertools import islice
+from multiprocessing import Pool
+
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def _tokens_of_lines(lines, tokenizer):
+    for line in lines:
+        yield from tokenizer(line) if tokenizer is not None else line.split()
+
+
+def _batched(items, size):
+    items = iter(items)
+    batch = list(islice(items, size))
+    while batch:
+        yield batch
+        batch = list(islice(items, size))
+
+
+def _token_chunks(sources, chunk_size, tokenizer):
+    """The tokens of ``sources`` in serial runs of ``chunk_size``, for counting in one process."""
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, encoding="utf-8") as f:
+                yield from _batched(_tokens_of_lines(f, tokenizer), chunk_size)
+        else:
+            yield from _batched(source, chunk_size)
+
+
+def _count_file_range(path, start, end, tokenizer):
+    """Count the lines of ``path`` that start in ``[start, end)``."""
+    counts = Counter()
+    with open(path, "rb") as f:
+        f.seek(start)
+        if start:
+            # the line that straddles ``start`` belongs to the previous shard
+            f.seek(start - 1)
+            f.readline()
+        lines = []
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            lines.append(line.decode("utf-8"))
+        counts.update(_tokens_of_lines(lines, tokenizer))
+    return counts
+
+
+def _count_shard(shard):
+    kind, payload, tokenizer = shard
+    if kind == "file":
+        return _count_file_range(*payload, tokenizer)
+    return Counter(payload)
+
+
+def shards(sources, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+    """Cut ``sources`` into picklable, independently countable shards.
+
+    Files are split every ``chunk_size * 64`` bytes (roughly ``chunk_size``
+    tokens), iterables every ``chunk_size`` tokens.
+
+    """
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            size = os.path.getsize(source)
+            step = max(chunk_size * 64, 1)
+            for start in range(0, max(size, 1), step):
+                yield "file", (os.fspath(source), start, min(start + step, size)), tokenizer
+        else:
+            for chunk in _batched(source, chunk_size):
+                yield "tokens", chunk, None
+
+
+def count_corpus(sources, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+    """Yield the partial ``Counter`` of every shard of ``sources``, in order.
+
+    Parameters
+    ----------
+    sources : list of (str or os.PathLike or Iterable[str])
+        Files are tokenized line by line with ``tokenizer``.
+    workers : int, optional
+        Size of the process pool. Defaults to ``os.cpu_count()``. With
+        ``1``, shards are counted in this process.
+    chunk_size : int
+        Tokens per shard.
+    tokenizer : callable, optional
+        ``str -> Iterable[str]`` applied to each line of a file. Must be
+        picklable. Defaults to ``str.split()``.
+
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        yield from map(_count_shard, shards(sources, chunk_size, tokenizer))
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap(_count_shard, shards(sources, chunk_size, tokenizer))
@@ -0,0 +1,42 @@
+"""Bulk count updates shared by the vocabs.
+
+Each takes ``(word, count)`` pairs of distinct words and touches every
+word once, so the cost is proportional to the number of distinct words,
+not tokens.
+
+"""
+
+
+def as_pairs(words, counts=None):
+    """``(word, count)`` pairs from a mapping, or from parallel words / counts arrays."""
+    if counts is None:
+        return words.items()
+    if len(words) != len(counts):
+        raise ValueError(f"Got {len(words)} words but {len(counts)} counts")
+    words = words.tolist() if hasattr(words, "tolist") else words
+    counts = counts.tolist() if hasattr(counts, "tolist") else counts
+    return zip(words, counts)
+
+
+def add_counts(s2c, pairs):
+    """Add every count to ``s2c``. Returns the words touched."""
+    get = s2c.get
+    touched = []
+    for word, count in pairs:
+        s2c[word] = get(word, 0) + count
+        touched.append(word)
+    return touched
+
+
+def uncount_counts(s2c, pairs):
+    """Subtract every count from ``s2c``, dropping words that reach 0. Returns the words touched."""
+    get = s2c.get
+    touched = []
+    for word, count in pairs:
+        left = get(word, 0) - count
+        if left > 0:
+            s2c[word] = left
+        else:
+            s2c.pop(word, None)
+        touched.append(word)
+    return touched
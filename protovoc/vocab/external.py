@@ -0,0 +1,188 @@
+"""External memory vocab counting: sorted spill runs and a k-way merge.
+
+For corpora with more distinct words than fit in memory. Tokens are
+counted into a ``Counter`` a chunk at a time; once it holds about
+``memory_budget`` bytes of entries (:data:`ENTRY_BYTES` each), its
+``(word, count)`` pairs are sorted by word and spilled to a run on disk:
+the ``data`` and ``offsets`` of a
+:class:`~protovoc.numericalization.strings.StringStore` plus the counts,
+as ``.npy`` files read back through ``mmap``. The runs are then merged
+with ``heapq.merge``, holding one block per run. Equal words meet in the
+merge, are summed, and are dropped right there if under ``min_freq``, so
+only survivors go on:
+
+* :func:`count_external` yields them in word order, e.g. to fill a vocab
+  (``Vocab.from_external``);
+* :func:`count_to_file` sorts them by count with a second round of runs
+  and streams them, specials first, to the
+  :mod:`~protovoc.numericalization.storage` format, which any backend's
+  ``Numericalization.load()`` maps. No table of the survivors is built,
+  only the hash index arrays (a few int64 per word).
+
+Counting order is lost in the runs, so ties at an ``n_to_keep`` cutoff
+are broken by word, not by which was seen first.
+
+"""
+import heapq
+import os
+import tempfile
+from collections import Counter
+from itertools import chain, groupby, islice
+from operator import itemgetter
+
+import numpy as np
+
+from protovoc.numericalization import storage
+from protovoc.numericalization.strings import StringStore
+from protovoc.vocab.corpus import DEFAULT_CHUNK_SIZE, _batched, _token_chunks
+
+
+DEFAULT_SPILL_BUDGET = 1 << 28
+# estimated bytes of one Counter entry: the str, the int and the dict slot
+ENTRY_BYTES = 128
+BLOCK_SIZE = 1 << 14
+
+
+def _mapped(path):
+    return np.load(path, mmap_mode="r") if os.path.getsize(path) > 128 else np.load(path)
+
+
+def write_run(path, pairs):
+    """Write ``(word, count)`` pairs, in their order, as the run ``path`` (a prefix of three ``.npy`` files)."""
+    store = StringStore.from_strings([word for word, _ in pairs])
+    np.save(f"{path}.data.npy", store.data)
+    np.save(f"{path}.offsets.npy", store.offsets)
+    np.save(f"{path}.counts.npy", np.asarray([count for _, count in pairs], dtype=np.int64))
+    return path
+
+
+def read_run(path, block_size=BLOCK_SIZE):
+    """Yield the pairs of the run ``path``, decoding ``block_size`` at a time."""
+    data = _mapped(f"{path}.data.npy")
+    offsets = _mapped(f"{path}.offsets.npy")
+    counts = _mapped(f"{path}.counts.npy")
+    for start in range(0, len(counts), block_size):
+        stop = min(start + block_size, len(counts))
+        yield from zip(StringStore(data, offsets[start:stop + 1]), counts[start:stop].tolist())
+
+
+def spill(sources, directory, memory_budget=DEFAULT_SPILL_BUDGET, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+    """Count ``sources`` into runs sorted by word, in ``directory``.
+
+    Parameters
+    ----------
+    sources : list of (str or os.PathLike or Iterable[str])
+        As for :func:`protovoc.vocab.corpus.count_corpus`. Read once, so
+        iterators are fine.
+    directory : str
+    memory_budget : int
+        Bytes of ``Counter`` entries to hold before spilling a run.
+    chunk_size : int
+        Tokens counted between checks of the budget.
+    tokenizer : callable, optional
+        ``str -> Iterable[str]`` for the lines of files.
+
+    Returns
+    -------
+    runs : list of str
+    n_tokens : int
+
+    """
+    max_words = max(memory_budget // ENTRY_BYTES, 1)
+    counts = Counter()
+    runs = []
+    n_tokens = 0
+    for chunk in _token_chunks(sources, chunk_size, tokenizer):
+        counts.update(chunk)
+        n_tokens += len(chunk)
+        if len(counts) >= max_words:
+            runs.append(write_run(os.path.join(directory, f"run{len(runs)}"), sorted(counts.items())))
+            counts = Counter()
+    if counts:
+        runs.append(write_run(os.path.join(directory, f"run{len(runs)}"), sorted(counts.items())))
+    return runs, n_tokens
+
+
+def merge_runs(runs, min_freq=0):
+    """k-way merge of runs sorted by word: each word once, with its total count, if at least ``min_freq``."""
+    merged = heapq.merge(*map(read_run, runs), key=itemgetter(0))
+    for word, group in groupby(merged, key=itemgetter(0)):
+        count = sum(count for _, count in group)
+        if count >= min_freq:
+            yield word, count
+
+
+def _by_count(pair):
+    return -pair[1], pair[0]
+
+
+def by_frequency(pairs, directory, memory_budget=DEFAULT_SPILL_BUDGET):
+    """``pairs`` by descending count (then word), sorted through runs in ``directory``."""
+    runs = []
+    for block in _batched(pairs, max(memory_budget // ENTRY_BYTES, 1)):
+        block.sort(key=_by_count)
+        runs.append(write_run(os.path.join(directory, f"freq{len(runs)}"), block))
+    return heapq.merge(*map(read_run, runs), key=_by_count)
+
+
+def count_external(sources, min_freq=0, memory_budget=DEFAULT_SPILL_BUDGET, chunk_size=DEFAULT_CHUNK_SIZE,
+                   tokenizer=None, tmpdir=None):
+    """Yield ``(word, count)`` for every word of ``sources`` seen at least ``min_freq`` times, in word order.
+
+    Runs go to a temporary directory in ``tmpdir`` (the system's by
+    default), removed once the pairs are exhausted. See :func:`spill` for
+    the other parameters.
+
+    """
+    with tempfile.TemporaryDirectory(prefix="protovoc-", dir=tmpdir) as directory:
+        runs, _ = spill(sources, directory, memory_budget, chunk_size, tokenizer)
+        yield from merge_runs(runs, min_freq)
+
+
+def _write_table(directory, specials, pairs, block_size=BLOCK_SIZE):
+    """Stream specials (``inf`` counts) then ``pairs`` to raw files in ``directory``, and map them back."""
+    paths = [os.path.join(directory, f"table.{name}") for name in ("cts", "offsets", "data")]
+    with open(paths[0], "wb") as cts, open(paths[1], "wb") as offsets, open(paths[2], "wb") as data:
+        np.zeros(1, dtype=np.int64).tofile(offsets)
+        end = 0
+        for block in chain([[(word, float("inf")) for word in specials]], _batched(pairs, block_size)):
+            store = StringStore.from_strings([word for word, _ in block])
+            np.asarray([count for _, count in block], dtype=np.float64).tofile(cts)
+            (store.offsets[1:] + end).tofile(offsets)
+            store.data.tofile(data)
+            end += int(store.offsets[-1])
+    cts, offsets, data = (
+        np.memmap(path, dtype=dtype, mode="r") if os.path.getsize(path) else np.zeros(0, dtype=dtype)
+        for path, dtype in zip(paths, (np.float64, np.int64, np.uint8)))
+    return cts, StringStore(data, offsets)
+
+
+def count_to_file(path, sources, specials=None, unk=False, n_to_keep=float("inf"), min_freq=0,
+                  memory_budget=DEFAULT_SPILL_BUDGET, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None, tmpdir=None):
+    """Count ``sources`` straight to a numericalization file, most frequent first.
+
+    Keeps the words seen at least ``min_freq`` times, and of those the
+    ``n_to_keep`` most frequent (ties broken by word), after the specials
+    (unk last). Load it with any backend's ``Numericalization.load(path)``.
+    See :func:`spill` for the other parameters.
+
+    Returns
+    -------
+    int
+        The number of entries written, specials included.
+
+    """
+    specials = set(specials or ()) - {unk}
+    ordered = sorted(specials) + ([unk] if unk else [])
+    reserved = set(ordered)
+    with tempfile.TemporaryDirectory(prefix="protovoc-", dir=tmpdir) as directory:
+        runs, _ = spill(sources, directory, memory_budget, chunk_size, tokenizer)
+        survivors = (pair for pair in merge_runs(runs, max(min_freq, 1)) if pair[0] not in reserved)
+        ranked = by_frequency(survivors, directory, memory_budget)
+        if n_to_keep < float("inf"):
+            ranked = islice(ranked, int(n_to_keep))
+        cts, i2s = _write_table(directory, ordered, ranked)
+        storage.write(path, *storage.layout(specials, unk, cts, i2s))
+        n_entries = len(cts)
+        del cts, i2s
+    return n_entries
@@ -0,0 +1,176 @@
+"""Bounded memory, two pass vocab counting with a count-min sketch.
+
+Pass one streams the corpus into a :class:`CountMinSketch` (a ``depth``
+by ``width`` table of counters, sized from a memory budget) and keeps the
+``n_to_keep`` words with the highest estimates seen so far. Estimates
+never undercount, and with probability ``1 - delta`` overcount by at most
+``epsilon * N`` (``epsilon = e / width``, ``delta = exp(-depth)``, ``N``
+tokens). So if ``E`` is the ``n_to_keep``-th largest estimate, every word
+of the true top ``n_to_keep`` has an estimate of at least
+``E - epsilon * N``, and every word with ``min_freq`` occurrences one of
+at least ``min_freq``.
+
+Pass two counts exactly, but only the words whose estimate clears that
+threshold, and the result is stripped exactly. Memory is the sketch,
+the top ``n_to_keep`` tracker and the candidates; hapaxes are never
+stored.
+
+Hashing is vectorized: each chunk's distinct words go through 64 bit
+FNV-1a (:func:`protovoc.numericalization.index.hash_bytes`) and rows use
+double hashing, ``(h1 + row * h2) % width``.
+
+"""
+import math
+import os
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from protovoc.numericalization.index import hash_bytes
+from protovoc.numericalization.strings import StringStore
+from protovoc.vocab.corpus import DEFAULT_CHUNK_SIZE, _token_chunks
+
+
+DEFAULT_MEMORY_BUDGET = 1 << 26
+DEFAULT_DEPTH = 4
+
+SketchReport = namedtuple("SketchReport", [
+    "width", "depth", "nbytes", "n_tokens", "epsilon", "delta", "error_bound", "threshold", "n_candidates"])
+SketchReport.__doc__ = """Outcome of a two pass count.
+
+``error_bound`` (``epsilon * n_tokens``) is the most any pass one estimate
+exceeds the true count, with probability ``1 - delta`` per word. The
+final counts are exact; the bound is what the candidate ``threshold``
+was lowered by so that no word that should survive is missed.
+"""
+
+
+class CountMinSketch:
+    """A ``depth`` by ``width`` table of int64 counters.
+
+    Parameters
+    ----------
+    width : int
+    depth : int
+
+    """
+    def __init__(self, width, depth=DEFAULT_DEPTH):
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be positive")
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.n_tokens = 0
+
+    @classmethod
+    def from_budget(cls, memory_budget, depth=DEFAULT_DEPTH):
+        """The widest sketch of ``depth`` rows within ``memory_budget`` bytes."""
+        return cls(max(memory_budget // (depth * np.dtype(np.int64).itemsize), 1), depth)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def _columns(self, words):
+        store = StringStore.from_strings(words)
+        hashes = hash_bytes(store.data, store.offsets)
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        with np.errstate(over="ignore"):
+            return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def add(self, words, counts=None):
+        """Add ``counts`` (default 1 each) for distinct ``words``."""
+        counts = np.ones(len(words), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        for row, cols in enumerate(self._columns(words)):
+            self.table[row] += np.bincount(cols, weights=counts, minlength=self.width).astype(np.int64)
+        self.n_tokens += int(counts.sum())
+
+    def estimate(self, words):
+        """Upper estimates of the counts of ``words``."""
+        if not len(words):
+            return np.zeros(0, dtype=np.int64)
+        cols = self._columns(words)
+        return self.table[np.arange(self.depth)[:, None], cols].min(axis=0)
+
+
+def _keep_top(top, words, ests, k):
+    """Merge ``words`` into the ``k`` highest estimates of ``top`` (a dict)."""
+    top.update(zip(words, ests.tolist()))
+    if len(top) > 2 * k:
+        vals = np.fromiter(top.values(), dtype=np.int64, count=len(top))
+        keep = np.argpartition(vals, len(vals) - k)[len(vals) - k:]
+        keys = list(top)
+        top = {keys[i]: int(vals[i]) for i in keep.tolist()}
+    return top
+
+
+def count_two_pass(sources, n_to_keep=float("inf"), min_freq=0, memory_budget=DEFAULT_MEMORY_BUDGET,
+                   depth=DEFAULT_DEPTH, chunk_size=DEFAULT_CHUNK_SIZE, tokenizer=None):
+    """Exact counts of the words that can survive ``strip(n_to_keep, min_freq)``.
+
+    Parameters
+    ----------
+    sources : list of (str or os.PathLike or list of str)
+        As for :func:`protovoc.vocab.corpus.count_corpus`, but read twice,
+        so token sources must be re-iterable.
+    n_to_keep : int or float
+    min_freq : int
+    memory_budget : int
+        Bytes for the sketch.
+    depth : int
+        Sketch rows; the failure probability is ``exp(-depth)``.
+    chunk_size : int
+        Tokens hashed per vectorized step.
+    tokenizer : callable, optional
+        ``str -> Iterable[str]`` for the lines of files.
+
+    Returns
+    -------
+    counts : Counter
+        A superset of the survivors, counted exactly.
+    report : SketchReport
+
+    """
+    if any(iter(source) is source for source in sources if not isinstance(source, (str, os.PathLike))):
+        raise TypeError("sources are read twice; pass lists or paths, not iterators")
+    sketch = CountMinSketch.from_budget(memory_budget, depth)
+    track = n_to_keep < float("inf")
+    k = int(n_to_keep) if track else 0
+    top = {}
+    for chunk in _token_chunks(sources, chunk_size, tokenizer):
+        chunk_counts = Counter(chunk)
+        words = list(chunk_counts)
+        sketch.add(words, np.fromiter(chunk_counts.values(), dtype=np.int64, count=len(words)))
+        if track and k:
+            top = _keep_top(top, words, sketch.estimate(words), k)
+
+    error_bound = sketch.epsilon * sketch.n_tokens
+    threshold = max(min_freq, 1)
+    if track:
+        words = list(top)
+        ests = np.sort(sketch.estimate(words))[::-1]
+        kth = ests[k - 1] if 0 < k <= len(ests) else 0
+        threshold = max(threshold, kth - error_bound)
+
+    counts = Counter()
+    for chunk in _token_chunks(sources, chunk_size, tokenizer):
+        chunk_counts = Counter(chunk)
+        words = list(chunk_counts)
+        keep = (sketch.estimate(words) >= threshold).tolist()
+        for word, kept in zip(words, keep):
+            if kept:
+                counts[word] += chunk_counts[word]
+
+    report = SketchReport(sketch.width, sketch.depth, sketch.nbytes, sketch.n_tokens, sketch.epsilon,
+                          sketch.delta, error_bound, threshold, len(counts))
+    return counts, report
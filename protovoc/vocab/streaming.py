@@ -0,0 +1,142 @@
+"""Fixed memory top-k vocab over unbounded token streams (Space-Saving).
+
+:class:`StreamingVocab` monitors at most ``capacity`` words. A monitored
+word's count goes up by one per occurrence; an unmonitored word, once all
+counters are taken, replaces a word with the smallest count ``m`` and
+starts at ``m + 1`` with error ``m``. With ``N`` words added:
+
+* every reported count overestimates by at most its recorded error,
+  which is at most ``N / capacity``;
+* every word occurring more than ``N / capacity`` times is monitored.
+
+Counters are bucketed by count (``count -> words``), and counts only move
+by one, so an update or eviction is O(1): a word moves to the next
+bucket and the minimum moves up by at most one.
+
+"""
+import weakref
+from collections import Counter
+from copy import deepcopy
+
+from protovoc.vocab.basic import _VocStrInterface
+from protovoc.vocab.strip import strip_counts
+
+
+class StreamingVocab:
+    """Vocab holding ``capacity`` counters, for when only the top words matter.
+
+    Has the parts of :class:`~protovoc.vocab.basic.Vocab` numericalizations
+    read (``s2c``, ``specials``, ``unk``, ``string``, ``watch``), so it can
+    be numericalized directly.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of non-special words monitored. A few times the vocab size
+        wanted keeps the top of the ranking exact on skewed streams.
+    specials : set, optional
+    unk : str or False
+
+    """
+    def __init__(self, capacity, specials=None, unk=False):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if specials is None:
+            specials = set()
+        self.capacity = capacity
+        self.unk = unk
+        self.has_unk = unk is not False and unk is not None
+        self.specials = specials
+        self.specials_w_unk = deepcopy(self.specials)
+        if self.has_unk:
+            self.specials_w_unk.add(self.unk)
+        self._specials_maybe_w_unk = self.specials_w_unk
+        self.s2c = Counter()
+        for word in self.specials_w_unk:
+            self.s2c[word] = float("inf")
+        self.err = {}
+        self.n_tokens = 0
+        self._buckets = {}
+        self._min = 0
+        self.string = _VocStrInterface(self.s2c)
+        self._watchers = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_watchers"] = []
+        return state
+
+    def __len__(self):
+        return len(self.s2c)
+
+    def watch(self):
+        """Start recording which words change count. See :meth:`Vocab.watch`."""
+        changes = set()
+        self._watchers.append(weakref.ref(changes, self._watchers.remove))
+        return changes
+
+    @property
+    def error_bound(self):
+        """The most any reported count can exceed the true count, ``N / capacity``."""
+        return self.n_tokens / self.capacity
+
+    def guaranteed(self, word):
+        """Occurrences of ``word`` certainly seen: its count minus its error."""
+        return self.s2c.get(word, 0) - self.err.get(word, 0)
+
+    def _move(self, word, count):
+        bucket = self._buckets[count]
+        del bucket[word]
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min:
+                self._min = count + 1
+        self._buckets.setdefault(count + 1, {})[word] = None
+
+    def add(self, word):
+        self.n_tokens += 1
+        count = self.s2c.get(word)
+        if count is not None:
+            if word in self.err:
+                self._move(word, count)
+            self.s2c[word] = count + 1
+        elif len(self.err) < self.capacity:
+            self.s2c[word] = 1
+            self.err[word] = 0
+            self._buckets.setdefault(1, {})[word] = None
+            self._min = 1
+        else:
+            count = self._min
+            bucket = self._buckets[count]
+            evicted = next(iter(bucket))
+            del bucket[evicted]
+            del self.s2c[evicted]
+            del self.err[evicted]
+            self._buckets.setdefault(count + 1, {})[word] = None
+            self.s2c[word] = count + 1
+            self.err[word] = count
+            if not bucket:
+                del self._buckets[count]
+                self._min = count + 1
+            for ref in self._watchers:
+                ref().add(evicted)
+        for ref in self._watchers:
+            ref().add(word)
+
+    def add_iterable(self, words):
+        for word in words:
+            self.add(word)
+
+    def strip(self, n_to_keep=float("inf"), min_freq=0, minimal=True):
+        """Drop counters like :meth:`Vocab.strip`; freed counters are reused."""
+        self.s2c, dropped = strip_counts(
+            self.s2c, n_to_keep + len(self.specials_w_unk), min_freq=min_freq, minimal=minimal)
+        self.string = _VocStrInterface(self.s2c)
+        for word in dropped:
+            del self.err[word]
+        self._buckets = {}
+        for word in self.err:
+            self._buckets.setdefault(self.s2c[word], {})[word] = None
+        self._min = min(self._buckets, default=0)
+        for ref in self._watchers:
+            ref().update(dropped)
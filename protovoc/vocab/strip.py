@@ -0,0 +1,86 @@
+"""Vectorized top-k / min-frequency selection over a vocab's counts.
+
+The counts are pulled into one NumPy array; the ``n_to_keep``-th largest
+count comes from a partial selection (``np.partition``, O(V)) instead of
+sorting, ``min_freq`` is one comparison over the array, and the surviving
+table is rebuilt in a single pass in the original insertion order.
+
+A numericalization's counts are already sorted, so what it keeps is a
+prefix, of the length :func:`prefix_len` finds with a binary search.
+
+"""
+from collections import Counter
+from itertools import compress
+
+import numpy as np
+
+
+def strip_counts(s2c, n_to_keep=float("inf"), min_freq=0, minimal=True):
+    """Select the entries of ``s2c`` a strip keeps.
+
+    Parameters
+    ----------
+    s2c : Counter
+        Specials should have ``inf`` counts, so they're always in the top.
+    n_to_keep : int or float
+        Most frequent entries to keep (specials included). Among tied
+        counts at the cut, earlier inserted words win, as with
+        ``Counter.most_common``.
+    min_freq : int
+    minimal : bool
+        Keep entries that are both in the top ``n_to_keep`` and frequent
+        enough; otherwise entries that are either.
+
+    Returns
+    -------
+    kept : Counter
+    dropped : list of str
+
+    """
+    n = len(s2c)
+    cts = np.fromiter(s2c.values(), dtype=np.float64, count=n)
+    if n_to_keep < n:
+        k = max(int(n_to_keep), 0)
+        if k:
+            kth = np.partition(cts, n - k)[n - k]
+            top = cts > kth
+            top[np.flatnonzero(cts == kth)[:k - np.count_nonzero(top)]] = True
+        else:
+            top = np.zeros(n, dtype=bool)
+    else:
+        top = np.ones(n, dtype=bool)
+    frequent = cts >= min_freq
+    keep = top & frequent if minimal else top | frequent
+    if keep.all():
+        return s2c, []
+    mask = keep.tolist()
+    kept = Counter()
+    dict.update(kept, compress(s2c.items(), mask))
+    dropped = list(compress(s2c, [not m for m in mask]))
+    return kept, dropped
+
+
+def prefix_len(cts, n_spec, n_to_keep=float("inf"), min_freq=0, minimal=True):
+    """Length of the prefix of descending ``cts`` a strip keeps.
+
+    Parameters
+    ----------
+    cts : np.ndarray[float64]
+        Descending, specials (unk included) first.
+    n_spec : int
+        Number of specials; ``n_to_keep`` doesn't count them.
+    n_to_keep, min_freq, minimal
+        As for :func:`strip_counts`.
+
+    Returns
+    -------
+    int or float
+        ``inf`` or more than ``len(cts)`` if everything is kept.
+
+    """
+    if min_freq > 0:
+        n_freq_enough = len(cts) - int(np.searchsorted(cts[::-1], min_freq))
+    else:
+        n_freq_enough = len(cts)
+    n_to_keep += n_spec
+    return min(n_freq_enough, n_to_keep) if minimal else max(n_freq_enough, n_to_keep)
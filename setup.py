@@ -3,6 +3,7 @@ from Cython.Build import cythonize
 import numpy as np
 
 setup(
-    ext_modules=cythonize(["protovoc/numericalization/cython/*.pyx", "protovoc/vocab/cython.pyx"]),
+    ext_modules=cythonize(["protovoc/numericalization/cython/*.pyx", "protovoc/vocab/cython.pyx",
+                            "protovoc/vocab/tokenize.pyx"]),
     include_dirs=[np.get_include()]
 )
@@ -273,3 +273,535 @@ class NumericalizationTestSuite:
                     voc.uncount("two")
                 self.assertIn("one", voc.string)
                 self.assertNotIn("two", voc.string)
+
+    def _batch_voc(self, unk="UNK"):
+        voc = self._voc(specials={"<pad>", "<bos>", "<eos>"}, unk=unk)
+        for _ in range(3):
+            voc.add("two")
+        for _ in range(2):
+            voc.add("three")
+        voc.add("four")
+        return self._num(voc)
+
+    def test_encode_batch_padded(self):
+        num = self._batch_voc()
+        batch = [["two", "three"], ["four"], [], ["jambalaya", "two", "two"]]
+        ids, lengths = num.integer.encode_batch(batch, pad="<pad>")
+        pad, unk = num.integer["<pad>"], num.integer["UNK"]
+        two, three, four = num.integer[["two", "three", "four"]]
+        expected = np.asarray([
+            [two, three, pad],
+            [four, pad, pad],
+            [pad, pad, pad],
+            [unk, two, two]])
+        self.assertEqual(ids.dtype, np.int64)
+        self.assertTrue((expected == ids).all())
+        self.assertEqual(lengths.tolist(), [2, 1, 0, 3])
+
+    def test_encode_batch_bos_eos_max_len(self):
+        num = self._batch_voc()
+        batch = [["two", "three", "four"], ["four"]]
+        ids, lengths = num.integer.encode_batch(
+            batch, pad="<pad>", bos="<bos>", eos="<eos>", max_len=4)
+        pad, bos, eos = num.integer[["<pad>", "<bos>", "<eos>"]]
+        two, three, four = num.integer[["two", "three", "four"]]
+        expected = np.asarray([
+            [bos, two, three, eos],
+            [bos, four, eos, pad]])
+        self.assertTrue((expected == ids).all())
+        self.assertEqual(lengths.tolist(), [4, 3])
+
+    def test_encode_batch_ragged(self):
+        num = self._batch_voc()
+        batch = [["two", "three"], [], ["four", "jambalaya"]]
+        ids, offsets = num.integer.encode_batch(batch, eos="<eos>", ragged=True)
+        eos, unk = num.integer["<eos>"], num.integer["UNK"]
+        two, three, four = num.integer[["two", "three", "four"]]
+        self.assertEqual(ids.tolist(), [two, three, eos, eos, four, unk, eos])
+        self.assertEqual(offsets.tolist(), [0, 3, 4, 7])
+
+    def test_sentence_empty(self):
+        voc = self._voc(specials={"<pad>"}, unk="UNK")
+        voc.add("two")
+        num = self._num(voc)
+        self.assertEqual("", num.sentence(np.zeros(0, dtype=np.int64)))
+        for shape, axis, expected in [((0, 4), 0, [""] * 4), ((4, 0), 0, []), ((4, 0), 1, [""] * 4),
+                                      ((0, 4), 1, [])]:
+            with self.subTest(shape=shape, axis=axis):
+                ids = np.zeros(shape, dtype=np.int64)
+                self.assertEqual(expected, num.sentence(ids, axis=axis).tolist())
+                self.assertEqual(expected, num.sentence_view(ids, axis=axis)[:].tolist())
+        self.assertEqual((3, 2), num.sentence(np.zeros((3, 0, 2), dtype=np.int64), axis=1).shape)
+
+    def test_sentence_out_of_range(self):
+        num = self._batch_voc()
+        for bad in [10 ** 7, len(num), -1]:
+            for ids in [np.asarray([2, bad, 3]), np.asarray([[2, 3], [bad, 2]])]:
+                with self.subTest(bad=bad, ndim=ids.ndim):
+                    with self.assertRaises(IndexError):
+                        num.sentence(ids)
+
+    def test_sentence_ragged(self):
+        num = self._batch_voc()
+        batch = [["two", "three"], [], ["four", "jambalaya", "two"]]
+        ids, offsets = num.integer.encode_batch(batch, eos="<eos>", ragged=True)
+        padded, lengths = num.integer.encode_batch(batch, eos="<eos>", pad="<pad>")
+        dense = num.sentence(padded, axis=1)
+        for kwargs in [{"offsets": offsets}, {"lengths": np.diff(offsets)}]:
+            with self.subTest(**kwargs):
+                strs, stops = num.sentence(ids, **kwargs)
+                self.assertEqual(dense.tolist(), strs.tolist())
+                self.assertEqual(["two three", "", "four"], strs.tolist())
+                self.assertEqual([2, 0, 1], stops.tolist())
+                self.assertEqual([b"two three", b"", b"four"], num.sentence(ids, output="bytes", **kwargs)[0])
+        # rows need not start at 0
+        num.permit_unk(True)
+        strs, stops = num.sentence(ids, offsets=offsets[1:])
+        self.assertEqual(["", "four UNK two"], strs.tolist())
+        self.assertEqual([0, 3], stops.tolist())
+        strs, stops = num.sentence(ids[:0], lengths=np.zeros(0, dtype=np.int64))
+        self.assertEqual((0,), strs.shape)
+        with self.assertRaises(ValueError):
+            num.sentence(ids, offsets=offsets, lengths=np.diff(offsets))
+        with self.assertRaises(ValueError):
+            num.sentence(ids, lengths=[len(ids) + 1])
+        with self.assertRaises(ValueError):
+            num.sentence(ids, offsets=offsets[:-1])
+        with self.assertRaises(ValueError):
+            num.sentence(ids, offsets=[0, 4, 3, len(ids)])
+        for bad in [10 ** 7, -1]:
+            with self.assertRaises(IndexError):
+                num.sentence(np.append(ids, bad), offsets=np.append(offsets, len(ids) + 1))
+
+    def test_encode_batch_out(self):
+        num = self._batch_voc()
+        out = np.empty((8, 6), dtype=np.int64)
+        ids, _ = num.integer.encode_batch([["two"], ["three", "four"]], pad="<pad>", out=out)
+        self.assertTrue(np.shares_memory(ids, out))
+        self.assertEqual(ids.shape, (2, 2))
+        self.assertEqual(num.integer[["three", "four"]], ids[1].tolist())
+
+    def test_encode_batch_oov_no_unk(self):
+        num = self._batch_voc(unk=False)
+        with self.assertRaises(KeyError):
+            num.integer.encode_batch([["two", "jambalaya"]], pad="<pad>")
+
+    def test_sentence_outputs(self):
+        fake_data = np.asarray(
+            [[2, 3, 4, 1, 2],
+             [3, 2, 4, 2, 1],
+             [2, 3, 0, 0, 0]]
+        )
+        expected = ["two three four", "three two four two", "two three"]
+        voc = self._voc(specials={"one"}, unk="UNK")
+        for _ in range(5):
+            voc.add("two")
+        for _ in range(4):
+            voc.add("three")
+        for _ in range(3):
+            voc.add("four")
+        voc = self._num(voc)
+        self.assertEqual(expected, voc.sentence(fake_data, axis=1, output="str"))
+        self.assertEqual([e.encode() for e in expected], voc.sentence(fake_data, axis=1, output="bytes"))
+        fixed = voc.sentence(fake_data, axis=1, output="U")
+        self.assertEqual(fixed.dtype, np.dtype("U18"))
+        self.assertEqual(expected, fixed.tolist())
+        fixed = voc.sentence(fake_data, axis=1, output="S")
+        self.assertEqual(fixed.dtype, np.dtype("S18"))
+        self.assertEqual([e.encode() for e in expected], fixed.tolist())
+        self.assertEqual("two three four", voc.sentence(fake_data[0], output="str"))
+
+    def test_sentence_view(self):
+        rng = np.random.RandomState(0)
+        voc = self._voc(specials={"<eos>"}, unk="UNK")
+        for i, word in enumerate(["two", "three", "four", "naïve", "five"]):
+            for _ in range(10 - i):
+                voc.add(word)
+        num = self._num(voc)
+        beams = rng.randint(0, len(num), size=(12, 3, 4))  # (seq_len, beam, batch)
+        expected = num.sentence(beams, axis=0)
+        view = num.sentence_view(beams, axis=0)
+        self.assertEqual((3, 4), view.shape)
+        self.assertEqual(expected[0].tolist(), view[0].tolist())
+        self.assertEqual(4, view.n_decoded)
+        self.assertEqual(expected[2, 1], view[2, 1])
+        self.assertEqual(5, view.n_decoded)
+        self.assertEqual(expected[:, 3].tolist(), view[:, 3].tolist())
+        self.assertEqual(expected.tolist(), [row.tolist() for row in view])
+        self.assertEqual(12, view.n_decoded)
+        flat = num.sentence_view(beams[:, 0, 0])
+        self.assertEqual(num.sentence(beams[:, 0, 0]), flat[()])
+        batch_first = num.sentence_view(beams[:, :, 0].T, axis=1)
+        self.assertEqual(expected[:, 0].tolist(), batch_first[:].tolist())
+
+    def test_sentence_unicode(self):
+        voc = self._voc(specials={"<eos>"}, unk="UNK")
+        for _ in range(3):
+            voc.add("naïve")
+        for _ in range(2):
+            voc.add("café")
+        voc = self._num(voc)
+        ids = np.asarray([voc.integer[["naïve", "café", "<eos>"]]] * 2)
+        for output in [None, "U"]:
+            s = voc.sentence(ids, axis=1, output=output)
+            self.assertEqual(["naïve café"] * 2, s.tolist())
+        self.assertEqual(["naïve café".encode()] * 2, voc.sentence(ids, axis=1, output="S").tolist())
+
+    def test_add_corpus_matches_serial(self):
+        import os
+        import tempfile
+        lines = ["the cat sat on the mat", "", "the dog <eos> ate", "ünïcödé cat cat"] * 7
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "corpus.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+            tokens = ["a", "b", "the", "a", "UNK"] * 11
+            serial = self._voc(specials={"<eos>"}, unk="UNK")
+            serial.add_iterable(" ".join(lines).split())
+            serial.add_iterable(tokens)
+            for workers in [1, 2]:
+                with self.subTest(workers=workers):
+                    voc = self._voc.from_corpus(
+                        [path, tokens], specials={"<eos>"}, unk="UNK", workers=workers, chunk_size=1)
+                    self.assertEqual(list(serial.s2c.items()), list(voc.s2c.items()))
+
+    def test_from_sketch(self):
+        import os
+        import tempfile
+        rng = np.random.RandomState(0)
+        words = [f"w{i}" for i in rng.zipf(1.3, 3000) if i < 500]
+        lines = [" ".join(words[i:i + 10]) for i in range(0, len(words), 10)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "corpus.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+            for n_to_keep, min_freq in [(10, 0), (float("inf"), 3), (20, 2)]:
+                with self.subTest(n_to_keep=n_to_keep, min_freq=min_freq):
+                    exact = self._voc(specials={"<pad>"}, unk="UNK")
+                    exact.add_iterable(words)
+                    exact.strip(n_to_keep, min_freq=min_freq)
+                    voc = self._voc.from_sketch(
+                        [path], n_to_keep=n_to_keep, min_freq=min_freq, specials={"<pad>"}, unk="UNK",
+                        memory_budget=2048, chunk_size=100)
+                    self.assertEqual(dict(exact.s2c), dict(voc.s2c))
+                    self.assertEqual(len(words), voc.sketch_report.n_tokens)
+
+    def test_from_external(self):
+        from collections import Counter
+        rng = np.random.RandomState(0)
+        words = [f"w{i}" for i in rng.zipf(1.3, 3000) if i < 500] + ["<pad>"]
+        for n_to_keep, min_freq in [(10, 0), (float("inf"), 3), (20, 2)]:
+            with self.subTest(n_to_keep=n_to_keep, min_freq=min_freq):
+                exact = self._voc(specials={"<pad>"}, unk="UNK")
+                exact.add_iterable(words)
+                exact.strip(n_to_keep, min_freq=min_freq)
+                voc = self._voc.from_external(
+                    [iter(words)], n_to_keep=n_to_keep, min_freq=min_freq, specials={"<pad>"}, unk="UNK",
+                    memory_budget=4096, chunk_size=100)
+                # ties at the cutoff go by word here, by first seen in add_iterable
+                self.assertEqual(sorted(exact.s2c.values()), sorted(voc.s2c.values()))
+                full = Counter(words)
+                self.assertTrue(all(full[w] == c for w, c in voc.s2c.items() if c != float("inf")))
+
+    def test_bulk_counts(self):
+        from collections import Counter
+        words = ["a", "b", "a", "c", "a", "<pad>", "b"]
+        held_out = ["a", "c", "c", "zzz"]
+        serial = self._voc(specials={"<pad>"}, unk="UNK")
+        for word in words:
+            serial.add(word)
+        serial.uncount("a")
+        serial.uncount("c")
+        bulk = self._voc(specials={"<pad>"}, unk="UNK")
+        bulk.add_counts(np.asarray(["a", "b", "c", "<pad>"]), np.asarray([3, 2, 1, 1]))
+        bulk.uncount_counts(Counter(held_out))
+        self.assertEqual(dict(serial.s2c), dict(bulk.s2c))
+        self.assertNotIn("c", bulk.string)
+        self.assertNotIn("zzz", bulk.string)
+        iterable = self._voc(specials={"<pad>"}, unk="UNK")
+        iterable.add_iterable(words)
+        iterable.uncount_iterable(held_out)
+        self.assertEqual(dict(serial.s2c), dict(iterable.s2c))
+        with self.assertRaises(ValueError):
+            bulk.add_counts(["a", "b"], [1])
+
+    def test_merge(self):
+        left = self._voc(specials={"<pad>"}, unk="UNK")
+        left.add_iterable(["a", "b", "a"])
+        right = self._voc(specials={"<eos>"})
+        right.add_iterable(["b", "c", "<pad>"])
+        merged = self._voc.merge(left, right)
+        self.assertEqual({"<pad>", "<eos>"}, merged.specials)
+        self.assertEqual("UNK", merged.unk)
+        inf = float("inf")
+        self.assertEqual({"<pad>": inf, "<eos>": inf, "UNK": inf, "a": 2, "b": 2, "c": 1}, dict(merged.s2c))
+        with self.assertRaises(ValueError):
+            self._voc.merge(left, self._voc(unk="<unk>"))
+
+    def test_add_file(self):
+        import os
+        import tempfile
+        from protovoc.vocab.tokenize import Tokenizer
+        text = "John draw real poor.\nOn call MY from, my  John.\n\tÜber über\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "corpus.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            for chunk_size in [1, 7, None]:
+                with self.subTest(chunk_size=chunk_size):
+                    voc = self._voc(unk="UNK")
+                    voc.add_file(path, chunk_size=chunk_size)
+                    serial = self._voc(unk="UNK")
+                    serial.add_iterable(text.split())
+                    self.assertEqual(list(serial.s2c.items()), list(voc.s2c.items()))
+
+                    tokenizer = Tokenizer(punct=".,", lower=True)
+                    voc = self._voc(unk="UNK")
+                    voc.add_file(path, tokenizer=tokenizer, chunk_size=chunk_size)
+                    self.assertEqual(2, voc.s2c["john"])
+                    self.assertEqual(2, voc.s2c["my"])
+                    self.assertEqual(2, voc.s2c["über"])
+                    self.assertEqual(2, voc.s2c["."])
+                    self.assertEqual(1, voc.s2c[","])
+                    self.assertEqual(
+                        ["john", "draw", "real", "poor", "."], tokenizer("John draw real poor."))
+
+    def test_hash_index(self):
+        for unk in ["UNK", False]:
+            with self.subTest(unk=unk):
+                voc = self._voc(specials={"<pad>", "<eos>"}, unk=unk)
+                for word, n in [("two", 5), ("three", 4), ("four", 3), ("ünïcödé", 2), ("one", 1)]:
+                    for _ in range(n):
+                        voc.add(word)
+                num = self._num(voc)
+                hashed = self._num(voc, index="hash")
+                words = ["<pad>", "<eos>", "two", "three", "four", "ünïcödé", "one"]
+                self.assertEqual(num.integer[words], hashed.integer[words])
+                if unk:
+                    self.assertEqual(num.integer["jambalaya"], hashed.integer["jambalaya"])
+                hashed.strip(2)
+                self.assertEqual(num.integer[["two", "three"]], hashed.integer[["two", "three"]])
+                self.assertNotIn("four", hashed.string)
+
+    def test_refresh(self):
+        rng = np.random.RandomState(0)
+        words = [f"w{i}" for i in range(40)]
+        for unk in ["UNK", False]:
+            for index in ["dict", "hash"]:
+                with self.subTest(unk=unk, index=index):
+                    voc = self._voc(specials={"<pad>", "<eos>"}, unk=unk)
+                    for word in rng.choice(words[:20], 200):
+                        voc.add(str(word))
+                    num = self._num(voc, index=index, track=True)
+                    for step in range(3):
+                        for word in rng.choice(words, 60):
+                            voc.add(str(word))
+                        for word in rng.choice(words[:20], 30):
+                            if str(word) in voc.string:
+                                voc.uncount(str(word))
+                        for word in ["w0", "w1"]:
+                            while word in voc.string:
+                                voc.uncount(word)
+                        num.refresh()
+                        fresh = self._num(voc)
+                        self.assertEqual(len(fresh), len(num))
+                        np.testing.assert_array_equal(fresh.cts, num.cts)
+                        for word, ct in voc.s2c.items():
+                            i = num.integer[word]
+                            self.assertEqual(word, num.string[i])
+                            self.assertEqual(ct, num.cts[i])
+                        self.assertNotIn("w0", num.string)
+                        ids = num.integer[["w5", "w6", "<eos>", "w7"]]
+                        self.assertEqual("w5 w6", num.sentence(np.asarray(ids)))
+                        if unk:
+                            self.assertEqual("UNK", num.string[num.integer["jambalaya"]])
+                    with self.assertRaises(ValueError):
+                        self._num(voc).refresh()
+
+    def test_save_load(self):
+        import os
+        import tempfile
+        fake_data = np.asarray(
+            [[2, 3, 4, 1, 2],
+             [3, 2, 4, 2, 1],
+             [2, 3, 0, 0, 0]]
+        )
+        for unk in ["UNK", False]:
+            voc = self._voc(specials={"<pad>", "<eos>", "<bos>"}, unk=unk)
+            for word, n in [("two", 5), ("three", 4), ("four", 3), ("ünïcödé", 2), ("one", 1)]:
+                for _ in range(n):
+                    voc.add(word)
+            num = self._num(voc)
+            words = list(num.string[np.arange(len(num))])
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "num.bin")
+                num.save(path)
+                for mmap in [True, False]:
+                    with self.subTest(unk=unk, mmap=mmap):
+                        loaded = self._num.load(path, mmap=mmap)
+                        self.assertEqual(len(num), len(loaded))
+                        # ids saved with the file must decode to the same words
+                        self.assertEqual(words, list(loaded.string[np.arange(len(loaded))]))
+                        self.assertEqual(num.integer[words], loaded.integer[words])
+                        for word in ["<pad>", "<eos>", "two", "three", "four", "ünïcödé", "one"]:
+                            self.assertEqual(word, loaded.string[loaded.integer[word]])
+                            self.assertEqual(num.cts[num.integer[word]], loaded.cts[loaded.integer[word]])
+                        if unk:
+                            self.assertEqual("UNK", loaded.string[loaded.integer["jambalaya"]])
+                        else:
+                            with self.assertRaises(Exception):
+                                loaded.integer["jambalaya"]
+                        ids = loaded.integer[["two", "three", "<eos>", "four"]]
+                        self.assertEqual("two three", loaded.sentence(np.asarray(ids)))
+                        self.assertTrue((num.sentence(fake_data, axis=1) == loaded.sentence(fake_data, axis=1)).all())
+                        loaded.strip(n_to_keep=2)
+                        self.assertIn("two", loaded.string)
+                        self.assertNotIn("four", loaded.string)
+                        del loaded
+                # a file from a backend that doesn't keep unk last among the specials
+                from protovoc.numericalization.numpy import Numericalization as NpNum
+                other = os.path.join(tmp, "numpy.bin")
+                NpNum(voc).save(other)
+                with self.subTest(unk=unk, saved_by="numpy"):
+                    loaded = self._num.load(other)
+                    for word in words:
+                        self.assertEqual(word, loaded.string[loaded.integer[word]])
+                    ids = loaded.integer[["two", "three", "<eos>", "four"]]
+                    self.assertEqual("two three", loaded.sentence(np.asarray(ids)))
+                    del loaded
+
+    def test_count_to_file(self):
+        import os
+        import tempfile
+        from collections import Counter
+        from protovoc.vocab.external import count_to_file
+        rng = np.random.RandomState(0)
+        words = [f"w{i}" for i in rng.zipf(1.3, 3000) if i < 500]
+        for unk in ["UNK", False]:
+            voc = self._voc(specials={"<pad>", "<eos>"}, unk=unk)
+            voc.add_iterable(words)
+            voc.strip(30, min_freq=2)
+            num = self._num(voc)
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "num.bin")
+                with self.subTest(unk=unk):
+                    n = count_to_file(path, [words], specials={"<pad>", "<eos>"}, unk=unk, n_to_keep=30,
+                                      min_freq=2, memory_budget=4096, chunk_size=100, tmpdir=tmp)
+                    loaded = self._num.load(path)
+                    self.assertEqual(len(num), n)
+                    self.assertEqual(len(num), len(loaded))
+                    n_spec = 3 if unk else 2
+                    self.assertEqual(sorted(num.cts[n_spec:], reverse=True), list(loaded.cts[n_spec:]))
+                    full = Counter(words)
+                    for i in range(n_spec, len(loaded)):
+                        self.assertEqual(full[loaded.string[i]], loaded.cts[i])
+                    for word in ["<pad>", "<eos>"]:
+                        self.assertEqual(word, loaded.string[loaded.integer[word]])
+                    if unk:
+                        self.assertEqual("UNK", loaded.string[loaded.integer["jambalaya"]])
+                    del loaded
+                self.assertEqual(["num.bin"], os.listdir(tmp))
+
+    def test_pickle_and_share_memory(self):
+        import pickle
+        fake_data = np.asarray(
+            [[2, 3, 4, 1, 2],
+             [3, 2, 4, 2, 1],
+             [2, 3, 0, 0, 0]]
+        )
+        words = ["<pad>", "<eos>", "two", "three", "four", "ünïcödé", "one"]
+        for unk in ["UNK", False]:
+            for index in ["dict", "hash"]:
+                with self.subTest(unk=unk, index=index):
+                    voc = self._voc(specials={"<pad>", "<eos>"}, unk=unk)
+                    for word, n in [("two", 5), ("three", 4), ("four", 3), ("ünïcödé", 2), ("one", 1)]:
+                        for _ in range(n):
+                            voc.add(word)
+                    num = self._num(voc, index=index)
+                    num.permit_unk(True)
+                    expected = num.sentence(fake_data, axis=1).tolist()
+                    copies = [pickle.loads(pickle.dumps(num))]
+                    compact = len(pickle.dumps(num))
+                    num.share_memory()
+                    self.assertLess(len(pickle.dumps(num)), compact)
+                    copies += [num, pickle.loads(pickle.dumps(num))]
+                    for copy in copies:
+                        self.assertEqual(expected, copy.sentence(fake_data, axis=1).tolist())
+                        self.assertEqual(num.integer[words], copy.integer[words])
+                        self.assertEqual(list(num.string[[2, 3]]), list(copy.string[[2, 3]]))
+                        if unk:
+                            self.assertEqual("UNK", copy.string[copy.integer["jambalaya"]])
+                    num.strip(n_to_keep=2)
+                    stripped = pickle.loads(pickle.dumps(num))
+                    self.assertEqual(len(num), len(stripped))
+                    self.assertNotIn("four", stripped.string)
+
+    def test_pickle_vocab(self):
+        import pickle
+        for unk in ["UNK", False]:
+            with self.subTest(unk=unk):
+                voc = self._voc(specials={"<pad>", "<eos>"}, unk=unk)
+                changes = voc.watch()
+                for word in ["two", "two", "three"]:
+                    voc.add(word)
+                copy = pickle.loads(pickle.dumps(voc))
+                self.assertEqual(voc.s2c, copy.s2c)
+                self.assertEqual([], copy._watchers)
+                self.assertIn("three", copy.string)
+                copy.add("four")
+                self.assertIn("four", copy.string)
+                self.assertNotIn("four", voc.string)
+                self.assertEqual({"two", "three"}, changes)
+                num = self._num(copy)
+                self.assertEqual(len(voc) + 1, len(num))
+                if unk:
+                    self.assertEqual("UNK", num.string[num.integer["jambalaya"]])
+
+    def test_stripped(self):
+        for unk in ["UNK", False]:
+            for index in ["dict", "hash"]:
+                with self.subTest(unk=unk, index=index):
+                    voc = self._voc(specials={"<pad>", "<eos>"}, unk=unk)
+                    for word, n in [("two", 5), ("three", 4), ("four", 3), ("ünïcödé", 2), ("one", 1)]:
+                        for _ in range(n):
+                            voc.add(word)
+                    num = self._num(voc, index=index)
+                    top2 = num.stripped(n_to_keep=2)
+                    frequent = top2.stripped(min_freq=3, minimal=False)
+                    self.assertEqual(len(num) - 3, len(top2))
+                    self.assertEqual(len(top2), len(frequent))
+                    self.assertEqual(len(num), len(num.stripped(min_freq=3, minimal=False)))
+                    self.assertEqual(len(num) - 2, len(num.stripped(min_freq=3)))
+                    expected = self._num(voc, index=index)
+                    expected.strip(n_to_keep=2)
+                    ids = np.asarray(top2.integer[["two", "three", "<eos>", "<pad>"]])
+                    self.assertEqual(expected.integer[["two", "three"]], top2.integer[["two", "three"]])
+                    self.assertEqual(expected.sentence(ids), top2.sentence(ids))
+                    self.assertEqual("two three", top2.sentence(ids))
+                    self.assertIn("four", num.string)
+                    self.assertNotIn("four", top2.string)
+                    if unk:
+                        encoded = top2.integer.encode_batch([["two", "four"]], pad=top2.integer["<pad>"])[0]
+                        self.assertEqual(top2.integer["UNK"], top2.integer["four"])
+                        self.assertEqual([[top2.integer["two"], top2.integer["UNK"]]], encoded.tolist())
+                    else:
+                        with self.assertRaises(Exception):
+                            top2.integer["four"]
+                        with self.assertRaises(KeyError):
+                            top2.integer.encode_batch([["two", "four"]])
+                    self.assertEqual(num.integer["four"], self._num(voc, index=index).integer["four"])
+                    # ids past the cut, e.g. from the parent, decode as unk
+                    cut = np.asarray(num.integer[["two", "four", "three", "one"]])
+                    if unk:
+                        as_unk = np.asarray(top2.integer[["two", "UNK", "three", "UNK"]])
+                        self.assertEqual(top2.sentence(as_unk), top2.sentence(cut))
+                        self.assertEqual(top2.sentence(as_unk[::-1]), top2.sentence(cut[::-1]))
+                        self.assertEqual(top2.sentence(as_unk), top2.sentence_view(cut)[()])
+                        self.assertEqual(top2.sentence(as_unk, lengths=[4])[0].tolist(), top2.sentence(cut, lengths=[4])[0].tolist())
+                    else:
+                        with self.assertRaises(IndexError):
+                            top2.sentence(cut)
+                        with self.assertRaises(IndexError):
+                            top2.sentence_view(cut)
+                        with self.assertRaises(IndexError):
+                            top2.sentence(cut, lengths=[4])
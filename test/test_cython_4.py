@@ -0,0 +1,46 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from test.general_tests import NumericalizationTestSuite
+from protovoc.numericalization.cython.cython_4 import Numericalization
+from protovoc.vocab.cython import Vocab
+
+
+class TestCython4Numericalization(unittest.TestCase, NumericalizationTestSuite):
+    _voc = Vocab
+    _num = Numericalization
+
+    def _fitted(self):
+        voc = Vocab(specials={"<pad>", "<eos>"}, unk="UNK")
+        for i, word in enumerate(["two", "three", "four", "naïve"]):
+            for _ in range(10 - i):
+                voc.add(word)
+        return Numericalization(voc)
+
+    def test_sentence_many(self):
+        num = self._fitted()
+        rng = np.random.RandomState(0)
+        batches = [rng.randint(0, len(num), size=(7, 5)) for _ in range(6)]
+        expected = [num.sentence(b, axis=1).tolist() for b in batches]
+        with ThreadPoolExecutor(3) as pool:
+            got = num.sentence_many(batches, axis=1, executor=pool)
+        self.assertEqual(expected, [g.tolist() for g in got])
+        self.assertEqual(expected, [g.tolist() for g in num.sentence_many(batches, axis=1)])
+
+    def test_encode_many(self):
+        num = self._fitted()
+        batches = [[["two", "three"], ["naïve", "jambalaya", "four"]], [["four"], []]]
+        got = num.encode_many(batches, pad="<pad>", eos="<eos>")
+        for batch, (ids, lens) in zip(batches, got):
+            expected, expected_lens = num.integer.encode_batch(batch, pad="<pad>", eos="<eos>")
+            np.testing.assert_array_equal(expected, ids)
+            np.testing.assert_array_equal(expected_lens, lens)
+        self.assertEqual(num.integer["UNK"], got[0][0][1, 1])
+        num.permit_unk(True)
+        self.assertEqual(["two three", "naïve UNK four"], num.sentence(got[0][0], axis=1).tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
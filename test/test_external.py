@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from protovoc.vocab.external import by_frequency, count_external, merge_runs, read_run, spill, write_run
+
+
+class TestExternal(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.words = [f"w{i}" for i in rng.zipf(1.3, 5000)] + ["ünïcödé"] * 3
+        self.counts = Counter(self.words)
+
+    def test_run_round_trip(self):
+        pairs = sorted(self.counts.items())
+        with tempfile.TemporaryDirectory() as tmp:
+            run = write_run(os.path.join(tmp, "run"), pairs)
+            self.assertEqual(pairs, list(read_run(run, block_size=7)))
+            empty = write_run(os.path.join(tmp, "empty"), [])
+            self.assertEqual([], list(read_run(empty)))
+
+    def test_spill_and_merge(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            runs, n_tokens = spill([self.words[:2000], iter(self.words[2000:])], tmp, memory_budget=4096,
+                                   chunk_size=100)
+            self.assertGreater(len(runs), 1)
+            self.assertEqual(len(self.words), n_tokens)
+            self.assertEqual(sorted(self.counts.items()), list(merge_runs(runs)))
+            kept = {w: c for w, c in self.counts.items() if c >= 3}
+            self.assertEqual(sorted(kept.items()), list(merge_runs(runs, min_freq=3)))
+            ranked = list(by_frequency(merge_runs(runs), tmp, memory_budget=4096))
+            self.assertEqual(sorted(self.counts.items(), key=lambda p: (-p[1], p[0])), ranked)
+
+    def test_count_external_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "corpus.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(" ".join(self.words[i:i + 10]) for i in range(0, len(self.words), 10)))
+            counts = dict(count_external([path], min_freq=2, memory_budget=4096, chunk_size=100, tmpdir=tmp))
+            self.assertEqual({w: c for w, c in self.counts.items() if c >= 2}, counts)
+            self.assertEqual(["corpus.txt"], os.listdir(tmp))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from protovoc.numericalization.index import HashIndex, LazyDict, fnv1a, hash_bytes
+from protovoc.numericalization.strings import StringStore
+
+
+class TestHashIndex(unittest.TestCase):
+    words = ["<pad>", "two", "", "ünïcödé", "three", "a", "ab", "ba"]
+
+    def test_hash_bytes(self):
+        store = StringStore.from_strings(self.words)
+        expected = [fnv1a(w.encode("utf-8")) for w in self.words]
+        self.assertEqual(expected, hash_bytes(store.data, store.offsets).tolist())
+
+    def test_get(self):
+        index = HashIndex.build(StringStore.from_strings(self.words))
+        self.assertEqual(len(self.words), len(index))
+        for i, word in enumerate(self.words):
+            self.assertEqual(i, index[word])
+            self.assertIn(word, index)
+        self.assertNotIn("jambalaya", index)
+        self.assertIsNone(index.get("jambalaya"))
+        with self.assertRaises(KeyError):
+            index["jambalaya"]
+
+    def test_collisions(self):
+        # a full-ish table of one byte keys forces long probe runs
+        words = [chr(c) for c in range(32, 127)]
+        index = HashIndex.build(StringStore.from_strings(words), load_factor=0.9)
+        for i, word in enumerate(words):
+            self.assertEqual(i, index[word])
+
+    def test_lookup(self):
+        index = HashIndex.build(StringStore.from_strings(self.words))
+        queries = ["three", "jambalaya", "", "ünïcödé", "b", "ba"]
+        query = StringStore.from_strings(queries)
+        ids, oov = index.lookup(query.data, query.offsets)
+        self.assertEqual([4, -1, 2, 3, -1, 7], ids.tolist())
+        self.assertEqual([False, True, False, False, True, False], oov.tolist())
+
+    def test_updated(self):
+        # one byte keys in a full-ish table, so deletes shift long probe runs
+        words = [chr(c) for c in range(32, 112)]
+        index = HashIndex.build(StringStore.from_strings(words), load_factor=0.9)
+        slots = index.slots
+        # drop the last 10, swap pairs of the first 20, add 5 new keys at the end
+        order = list(range(70))
+        order[:20] = [i ^ 1 for i in range(20)]
+        new = [chr(c) for c in range(200, 205)]
+        updated_words = [words[i] for i in order] + new
+        store = StringStore.from_strings(updated_words)
+        moved = {i: i ^ 1 for i in range(20)}
+        added = dict(enumerate(new, 70))
+        patched = index.updated(store, moved, range(70, 80), added, load_factor=0.9)
+        self.assertIs(slots, patched.slots)
+        self.assertEqual(len(updated_words), len(patched))
+        for i, word in enumerate(updated_words):
+            self.assertEqual(i, patched[word])
+        for word in words[70:]:
+            self.assertNotIn(word, patched)
+        np.testing.assert_array_equal(hash_bytes(store.data, store.offsets), patched.hashes)
+        rebuilt = patched.updated(store.take(range(60)), {}, range(60, 75), {}, load_factor=0.01)
+        self.assertIsNot(patched, rebuilt)
+        self.assertEqual(59, rebuilt[updated_words[59]])
+
+
+class TestLazyDict(unittest.TestCase):
+    def test_fills_on_first_other_lookup(self):
+        store = StringStore.from_strings(["<pad>", "two", "three"])
+        index = LazyDict(store, {"<pad>": 0})
+        self.assertEqual(0, index["<pad>"])
+        self.assertEqual(3, len(index))
+        self.assertFalse(index.filled)
+        copy = pickle.loads(pickle.dumps(index))
+        self.assertFalse(index.filled)
+        self.assertEqual(1, copy["two"])
+        self.assertEqual(2, index["three"])
+        self.assertTrue(index.filled)
+        self.assertIsNone(index.get("jambalaya"))
+        self.assertNotIn("jambalaya", index)
+        with self.assertRaises(KeyError):
+            index["jambalaya"]
+        self.assertEqual({"<pad>": 0, "two": 1, "three": 2}, dict(index.items()))
+        self.assertIs(dict, type(pickle.loads(pickle.dumps(index))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from protovoc.instrument import Instrumented, Metrics
+from protovoc.numericalization.cython.cython_1 import Numericalization as Cy1Num
+from protovoc.numericalization.numba import Numericalization as NbNum
+from protovoc.numericalization.numpy import Numericalization as NpNum
+from protovoc.vocab.cython import Vocab
+
+
+class TestInstrumented(unittest.TestCase):
+    def _voc(self):
+        voc = Vocab(specials={"<pad>"}, unk="UNK")
+        for i, word in enumerate(["two", "three", "four"]):
+            for _ in range(10 - i):
+                voc.add(word)
+        return voc
+
+    def test_same_results(self):
+        ids = np.random.RandomState(0).randint(0, 5, size=(7, 3, 4))
+        for klass in (NpNum, NbNum, Cy1Num):
+            for phases in (False, True):
+                with self.subTest(backend=klass.__module__, phases=phases):
+                    num = klass(self._voc())
+                    inst = Instrumented(klass(self._voc()), phases=phases)
+                    for axis in range(3):
+                        self.assertEqual(num.sentence(ids, axis=axis).tolist(),
+                                         inst.sentence(ids, axis=axis).tolist())
+                    self.assertEqual(num.integer[["two", "jambalaya"]], inst.integer[["two", "jambalaya"]])
+                    self.assertEqual(num.string[2], inst.string[2])
+                    ops = inst.metrics.snapshot()["ops"]
+                    self.assertEqual(3, ops["sentence"]["calls"])
+                    self.assertEqual(3 * ids.size, ops["sentence"]["tokens"])
+                    self.assertEqual(phases, "sentence.numpy_join" in ops)
+                    flat, lengths = ids.reshape(-1)[:7], np.asarray([3, 0, 4])
+                    self.assertEqual(num.sentence(flat, lengths=lengths)[0].tolist(),
+                                     inst.sentence(flat, lengths=lengths)[0].tolist())
+                    self.assertEqual(4, inst.metrics.snapshot()["ops"]["sentence"]["calls"])
+                    # ids a stripped view cut off decode as unk on both paths
+                    top = num.stripped(n_to_keep=1)
+                    top.permit_unk(True)
+                    cut = np.asarray(num.integer[["two", "four", "three"]])
+                    self.assertEqual("two UNK UNK", top.sentence(cut))
+                    self.assertEqual(top.sentence(cut), Instrumented(top, phases=phases).sentence(cut))
+                    self.assertEqual(top.sentence(cut[:, None], axis=0).tolist(),
+                                     Instrumented(top, phases=phases).sentence(cut[:, None], axis=0).tolist())
+
+    def test_unk_and_oov(self):
+        inst = Instrumented(NpNum(self._voc()))
+        inst.integer["two"]
+        inst.integer[["jambalaya", "three", "gumbo"]]
+        inst.integer.encode_batch([["two", "okra"]], pad=inst.target.integer["<pad>"])
+        snap = inst.metrics.snapshot()
+        self.assertEqual(3, snap["unk_hits"])
+        self.assertEqual(0.5, snap["unk_rate"])
+
+        voc = Vocab(unk=False)
+        voc.add("two")
+        inst = Instrumented(NbNum(voc))
+        with self.assertRaises(KeyError):
+            inst.integer["jambalaya"]
+        self.assertEqual(1, inst.metrics.snapshot()["oov_misses"])
+
+    def test_strip_and_vocab(self):
+        events = []
+        metrics = Metrics(hook=lambda name, seconds, n_tokens: events.append((name, n_tokens)))
+        voc = Instrumented(self._voc(), metrics=metrics)
+        voc.add_iterable(["two", "five", "five"])
+        voc.add("six")
+        num = Instrumented(Cy1Num(voc.target), metrics=metrics)
+        num.strip(n_to_keep=2)
+        self.assertEqual(4, len(num))
+        self.assertEqual(num.integer["UNK"], num.integer["four"])
+        self.assertEqual([("add_iterable", 3), ("add", 1), ("strip", 7)], events[:3])
+        self.assertEqual(2, metrics.snapshot()["unk_hits"])
+        for name in ("add_iterable", "add", "strip"):
+            self.assertEqual({"calls", "tokens", "seconds", "p50", "p95", "p99"},
+                             set(metrics.snapshot()["ops"][name]))
+
+    def test_counts_methods_count_tokens(self):
+        events = []
+        voc = Instrumented(self._voc(), hook=lambda name, seconds, n_tokens: events.append((name, n_tokens)))
+        voc.add_counts(Counter({"two": 3, "five": 4}))
+        voc.add_counts(np.asarray(["six", "seven"]), np.asarray([2, 5]))
+        voc.uncount_counts(["five"], counts=[3])
+        self.assertEqual([("add_counts", 7), ("add_counts", 7), ("uncount_counts", 3)], events)
+        self.assertEqual(1, voc.s2c["five"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
 import unittest
 
+import numpy as np
+
 from test.general_tests import NumericalizationTestSuite
+from protovoc.numericalization import numba as nb
 from protovoc.numericalization.numba import Numericalization
+from protovoc.numericalization.strings import StringStore
 from protovoc.vocab.basic import Vocab
 
 
@@ -9,6 +13,49 @@ class TestNumbaNumericalization(unittest.TestCase, NumericalizationTestSuite):
     _voc = Vocab
     _num = Numericalization
 
+    def test_lookup(self):
+        voc = Vocab(specials={"<pad>"}, unk="UNK")
+        for word in ["two", "two", "three"]:
+            voc.add(word)
+        num = Numericalization(voc, index="hash")
+        query = StringStore.from_strings(["three", "jambalaya", "two"])
+        ids, oov = num.integer.lookup(query.data, query.offsets)
+        self.assertEqual([num.integer["three"], -1, num.integer["two"]], ids.tolist())
+        self.assertEqual([False, True, False], oov.tolist())
+
+    def test_warmup(self):
+        Numericalization.warmup(dtypes=(np.int32,), ndims=(2,))
+        compiled = len(nb._join.signatures)
+        voc = Vocab(specials={"<pad>"})
+        for word in ["two", "two", "three"]:
+            voc.add(word)
+        num = Numericalization(voc)
+        ids = np.ones((5, 7), dtype=np.int32)
+        for axis in range(2):
+            num.sentence(ids, axis=axis)
+        self.assertEqual(compiled, len(nb._join.signatures))
+
+    def test_warmup_covers_mapped_stores(self):
+        import os
+        import tempfile
+        Numericalization.warmup(ndims=(2,))
+        kernels = (nb._first_below, nb._join, nb._ragged_first_below, nb._join_ragged)
+        compiled = [len(kernel.signatures) for kernel in kernels]
+        voc = Vocab(specials={"<pad>"})
+        for word in ["two", "two", "three"]:
+            voc.add(word)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "num.bin")
+            Numericalization(voc).save(path)
+            num = Numericalization.load(path, mmap=True)
+            self.assertFalse(num.i2s.offsets.flags.writeable)
+            ids = np.ones((5, 7), dtype=np.int64)
+            for axis in range(2):
+                num.sentence(ids, axis=axis)
+            num.sentence(np.ones(4, dtype=np.int64), lengths=[3, 1])
+            del num
+        self.assertEqual(compiled, [len(kernel.signatures) for kernel in kernels])
+
 
 if __name__ == "__main__":
     unittest.main()
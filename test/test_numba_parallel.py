@@ -0,0 +1,76 @@
+import os
+import unittest
+from unittest import mock
+
+import numba
+import numpy as np
+
+from test.general_tests import NumericalizationTestSuite
+from protovoc.numericalization.numba import Numericalization as SerialNumericalization
+from protovoc.numericalization.numba_parallel import Numericalization, prefer_openmp
+from protovoc.vocab.basic import Vocab
+
+
+class TestNumbaParallelNumericalization(unittest.TestCase, NumericalizationTestSuite):
+    _voc = Vocab
+    _num = Numericalization
+
+    @classmethod
+    def setUpClass(cls):
+        # the suite also runs multiprocessing pools, with which TBB hangs on exit
+        cls._priority = numba.config.THREADING_LAYER_PRIORITY
+        prefer_openmp()
+
+    @classmethod
+    def tearDownClass(cls):
+        numba.config.THREADING_LAYER_PRIORITY = cls._priority
+
+    def _fitted(self):
+        voc = Vocab(specials={"<pad>", "<eos>"}, unk="UNK")
+        for i, word in enumerate(["two", "three", "four", "naïve"]):
+            for _ in range(10 - i):
+                voc.add(word)
+        return voc
+
+    def test_strided_any_rank(self):
+        voc = self._fitted()
+        num, serial = Numericalization(voc), SerialNumericalization(voc)
+        rng = np.random.RandomState(0)
+        beams = rng.randint(0, len(num), size=(12, 4, 6, 2)).astype(np.int32)
+        for ids in [beams, beams[::2, :, ::-1, 1], beams.transpose(2, 0, 3, 1), beams[3]]:
+            for axis in range(ids.ndim):
+                with self.subTest(shape=ids.shape, axis=axis):
+                    expected = serial.sentence(np.ascontiguousarray(ids), axis=axis)
+                    self.assertEqual(expected.tolist(), num.sentence(ids, axis=axis).tolist())
+
+    def test_mask_and_lengths(self):
+        num = Numericalization(self._fitted())
+        rng = np.random.RandomState(1)
+        ids = rng.randint(0, len(num), size=(9, 3, 5))[:, ::-1]
+        for axis in range(ids.ndim):
+            with self.subTest(axis=axis):
+                mask, lengths = num.mask_and_lengths(ids, axis=axis)
+                self.assertEqual(ids.shape, mask.shape)
+                specials = np.moveaxis(ids < num._cutoff, axis, -1)
+                first = np.where(specials.any(-1), specials.argmax(-1), ids.shape[axis])
+                np.testing.assert_array_equal(first, lengths)
+                np.testing.assert_array_equal(
+                    np.arange(ids.shape[axis]) < first[..., None], np.moveaxis(mask, axis, -1))
+
+
+class TestPreferOpenmp(unittest.TestCase):
+    def test_opt_in(self):
+        default = numba.config.THREADING_LAYER_PRIORITY
+        try:
+            with mock.patch.dict(os.environ, {"NUMBA_THREADING_LAYER": "workqueue"}):
+                prefer_openmp()
+                self.assertEqual(default, numba.config.THREADING_LAYER_PRIORITY)
+            env = {k: v for k, v in os.environ.items() if not k.startswith("NUMBA_THREADING_LAYER")}
+            with mock.patch.dict(os.environ, env, clear=True):
+                prefer_openmp()
+                self.assertEqual("omp", numba.config.THREADING_LAYER_PRIORITY[0])
+        finally:
+            numba.config.THREADING_LAYER_PRIORITY = default
+
+if __name__ == "__main__":
+    unittest.main()
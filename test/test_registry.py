@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from protovoc.numericalization import BACKENDS, available, calibrate, get_backend
+from protovoc.numericalization.numpy import Numericalization as NpNum
+from protovoc.numericalization.registry import _calibration_vocab, _host_key, cache_path
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {"PROTOVOC_CACHE_DIR": self._dir.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self._dir.cleanup)
+
+    def test_get_backend(self):
+        self.assertIs(NpNum, get_backend("numpy"))
+        self.assertIn("numpy", available())
+        self.assertTrue(set(available()) <= set(BACKENDS))
+        with self.assertRaises(ValueError):
+            get_backend("fortran")
+
+    def test_calibration_outputs_match(self):
+        voc = _calibration_vocab(500)
+        ids = np.random.RandomState(0).randint(0, 500, size=(20, 3, 4))
+        expected = NpNum(voc).sentence(ids).tolist()
+        for name in available():
+            with self.subTest(backend=name):
+                num = get_backend(name)(voc)
+                self.assertEqual("w0 w1 w2", num.sentence(np.arange(3)))
+                self.assertEqual(expected, num.sentence(ids).tolist())
+
+    def test_calibrate_caches_winner(self):
+        names = [name for name in ("numpy", "cython_1") if name in available()]
+        scores = calibrate(names, n_trials=3, n_words=500)
+        self.assertEqual(sorted(names), sorted(name for name, _ in scores))
+        self.assertEqual(sorted(s for _, s in scores), [s for _, s in scores])
+        with open(cache_path(), "r") as f:
+            self.assertEqual(scores[0][0], json.load(f)["backend"])
+        self.assertIs(get_backend(scores[0][0]), get_backend("auto"))
+
+    def test_auto_reads_cache(self):
+        os.makedirs(os.path.dirname(cache_path()), exist_ok=True)
+        with open(cache_path(), "w") as f:
+            json.dump({"key": _host_key(), "backend": "numpy"}, f)
+        with mock.patch("protovoc.numericalization.registry.calibrate") as calibrate_:
+            self.assertIs(NpNum, get_backend("auto"))
+        calibrate_.assert_not_called()
+
+    def test_stale_cache_recalibrates(self):
+        os.makedirs(os.path.dirname(cache_path()), exist_ok=True)
+        with open(cache_path(), "w") as f:
+            json.dump({"key": {"node": "elsewhere"}, "backend": "numpy"}, f)
+        with mock.patch("protovoc.numericalization.registry.calibrate",
+                        return_value=[("numpy", 0.0)]) as calibrate_:
+            get_backend("auto")
+        calibrate_.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
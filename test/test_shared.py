@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import pickle
+import unittest
+
+import numpy as np
+
+from protovoc.numericalization.cython.cython_1 import Numericalization as Cy1Num
+from protovoc.numericalization.numpy import Numericalization as NpNum
+from protovoc.vocab.cython import Vocab
+
+
+def _decode(num, ids):
+    return num.sentence(ids, axis=1).tolist(), num.integer[["two", "jambalaya"]]
+
+
+class TestShared(unittest.TestCase):
+    def _voc(self):
+        voc = Vocab(specials={"<pad>"}, unk="UNK")
+        for i, word in enumerate(["two", "three", "four"]):
+            for _ in range(10 - i):
+                voc.add(word)
+        return voc
+
+    def test_spawned_workers(self):
+        ids = np.random.RandomState(0).randint(0, 5, size=(4, 6))
+        nums = [klass(self._voc()).share_memory() for klass in (NpNum, Cy1Num)]
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            got = pool.starmap(_decode, [(num, ids) for num in nums])
+        self.assertEqual([_decode(num, ids) for num in nums], got)
+
+    def test_unlinked_with_owner(self):
+        num = NpNum(self._voc()).share_memory()
+        name = num._segment.name
+        attached = pickle.loads(pickle.dumps(num))
+        del num
+        if os.path.isdir("/dev/shm"):
+            self.assertFalse(os.path.exists(os.path.join("/dev/shm", name.lstrip("/"))))
+        # mapped blocks outlive the name
+        self.assertEqual("two", attached.string[attached.integer["two"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from protovoc.vocab.sketch import CountMinSketch, count_two_pass
+
+
+class TestCountMinSketch(unittest.TestCase):
+    def test_never_undercounts(self):
+        rng = np.random.RandomState(0)
+        counts = Counter(f"w{i}" for i in rng.zipf(1.3, 5000))
+        sketch = CountMinSketch(64, depth=3)
+        words = list(counts)
+        sketch.add(words, list(counts.values()))
+        ests = sketch.estimate(words)
+        self.assertTrue((ests >= np.asarray(list(counts.values()))).all())
+        self.assertEqual(5000, sketch.n_tokens)
+
+    def test_from_budget(self):
+        sketch = CountMinSketch.from_budget(1 << 12, depth=4)
+        self.assertEqual(128, sketch.width)
+        self.assertLessEqual(sketch.nbytes, 1 << 12)
+
+    def test_two_pass_drops_rare(self):
+        tokens = ["a"] * 50 + ["b"] * 20 + [f"rare{i}" for i in range(1000)]
+        counts, report = count_two_pass([tokens], n_to_keep=2, memory_budget=1 << 16, chunk_size=64)
+        self.assertEqual(50, counts["a"])
+        self.assertEqual(20, counts["b"])
+        self.assertLess(report.n_candidates, 100)
+        with self.assertRaises(TypeError):
+            count_two_pass([iter(tokens)])
+
+
+if __name__ == "__main__":
+    unittest.main()
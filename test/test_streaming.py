@@ -0,0 +1,52 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from protovoc.numericalization.numpy import Numericalization
+from protovoc.vocab.streaming import StreamingVocab
+
+
+class TestStreamingVocab(unittest.TestCase):
+    def _stream(self, n=20000):
+        rng = np.random.RandomState(0)
+        return [f"w{i}" for i in rng.zipf(1.2, n)]
+
+    def test_exact_when_it_fits(self):
+        words = ["a", "b", "a", "c", "a", "b"]
+        voc = StreamingVocab(3, specials={"<pad>"}, unk="UNK")
+        voc.add_iterable(words)
+        self.assertEqual({"<pad>": float("inf"), "UNK": float("inf"), "a": 3, "b": 2, "c": 1}, dict(voc.s2c))
+        self.assertEqual(0, voc.err["a"])
+
+    def test_bounds(self):
+        words = self._stream()
+        true = Counter(words)
+        voc = StreamingVocab(200)
+        voc.add_iterable(words)
+        self.assertEqual(200, len(voc))
+        self.assertLessEqual(max(voc.err.values()), voc.error_bound)
+        for word, count in voc.s2c.items():
+            self.assertLessEqual(true[word], count)
+            self.assertLessEqual(count - voc.err[word], true[word])
+            self.assertLessEqual(voc.guaranteed(word), true[word])
+        for word, count in true.items():
+            if count > voc.error_bound:
+                self.assertIn(word, voc.string)
+        for (word, _), (s_word, _) in zip(true.most_common(10), voc.s2c.most_common(10)):
+            self.assertEqual(word, s_word)
+
+    def test_numericalize_and_strip(self):
+        voc = StreamingVocab(50, specials={"<pad>"}, unk="UNK")
+        voc.add_iterable(self._stream(5000))
+        voc.strip(n_to_keep=10)
+        self.assertEqual(12, len(voc))
+        voc.add_iterable(self._stream(100))
+        num = Numericalization(voc)
+        self.assertEqual(len(voc), len(num))
+        self.assertEqual("UNK", num.string[num.integer["jambalaya"]])
+        self.assertEqual("w1", num.string[2])
+
+
+if __name__ == "__main__":
+    unittest.main()
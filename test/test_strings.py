@@ -0,0 +1,60 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from protovoc.numericalization.strings import StringStore
+
+
+class TestStringStore(unittest.TestCase):
+    words = ["<pad>", "two", "", "ünïcödé", "three"]
+
+    def test_roundtrip(self):
+        store = StringStore.from_strings(self.words)
+        self.assertEqual(len(self.words), len(store))
+        self.assertEqual(self.words, store.tolist())
+        for i, word in enumerate(self.words):
+            self.assertEqual(word, store[i])
+        self.assertEqual("three", store[-1])
+
+    def test_array_index(self):
+        store = StringStore.from_strings(self.words)
+        strs = store[np.asarray([[1, 3], [4, 4]])]
+        self.assertEqual(strs.dtype, object)
+        self.assertEqual([["two", "ünïcödé"], ["three", "three"]], strs.tolist())
+        self.assertEqual(["three", "", "ünïcödé", "日本語"],
+                         StringStore.from_strings(self.words + ["日本語"])[[-2, 2, 3, -1]].tolist())
+        self.assertEqual((0, 2), store[np.zeros((0, 2), dtype=np.int64)].shape)
+        self.assertEqual("ünïcödé", store[np.asarray(3)][()])
+        self.assertEqual(["ünïcödé"], store[1:][[2]].tolist())
+        for bad in ([5], [-6]):
+            with self.assertRaises(IndexError):
+                store[bad]
+
+    def test_take_and_slice(self):
+        store = StringStore.from_strings(self.words)
+        self.assertEqual(["three", "ünïcödé", "<pad>"], store.take([4, 3, 0]).tolist())
+        prefix = store[:2]
+        self.assertTrue(np.shares_memory(prefix.data, store.data))
+        self.assertEqual(["<pad>", "two"], prefix.tolist())
+        self.assertEqual(["two", "ünïcödé"], store[1:4:2].tolist())
+        self.assertEqual(["three", "two"], store.swapped(1, 4)[[1, 4]].tolist())
+
+    def test_contains(self):
+        store = StringStore.from_strings(self.words)
+        for word in self.words:
+            self.assertIn(word, store)
+        self.assertNotIn("tw", store)
+        self.assertNotIn("othree", store)
+        self.assertNotIn("", store[:2])
+
+    def test_pickle_compacts_views(self):
+        store = StringStore.from_strings(self.words)[3:]
+        loaded = pickle.loads(pickle.dumps(store))
+        self.assertEqual(["ünïcödé", "three"], loaded.tolist())
+        self.assertEqual(0, loaded.offsets[0])
+        self.assertEqual(loaded.offsets[-1], len(loaded.data))
+
+
+if __name__ == "__main__":
+    unittest.main()
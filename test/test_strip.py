@@ -0,0 +1,46 @@
+import unittest
+from collections import Counter
+
+import numpy as np
+
+from protovoc.vocab.basic import Vocab
+from protovoc.vocab.strip import strip_counts
+
+
+class TestStripCounts(unittest.TestCase):
+    def _counts(self):
+        rng = np.random.RandomState(0)
+        s2c = Counter({"<pad>": float("inf")})
+        s2c.update(f"w{i}" for i in rng.zipf(1.5, 2000) if i < 300)
+        return s2c
+
+    def test_matches_most_common(self):
+        s2c = self._counts()
+        for n_to_keep in [0, 1, 5, 17, 50, len(s2c), float("inf")]:
+            for min_freq in [0, 2, 10]:
+                with self.subTest(n_to_keep=n_to_keep, min_freq=min_freq):
+                    top = dict(s2c.most_common(n_to_keep) if n_to_keep < len(s2c) else s2c)
+                    expected = {s: c for s, c in top.items() if c >= min_freq}
+                    kept, dropped = strip_counts(s2c, n_to_keep, min_freq=min_freq)
+                    self.assertEqual(expected, dict(kept))
+                    self.assertEqual(set(s2c) - set(expected), set(dropped))
+                    self.assertEqual([s for s in s2c if s in expected], list(kept))
+
+    def test_not_minimal(self):
+        s2c = self._counts()
+        kept, _ = strip_counts(s2c, 5, min_freq=10, minimal=False)
+        top = dict(s2c.most_common(5))
+        expected = {s: c for s, c in s2c.items() if s in top or c >= 10}
+        self.assertEqual(expected, dict(kept))
+
+    def test_vocab_not_minimal(self):
+        voc = Vocab(specials={"<pad>"})
+        for word, n in [("one", 1), ("two", 2), ("three", 3)]:
+            for _ in range(n):
+                voc.add(word)
+        voc.strip(n_to_keep=1, min_freq=2, minimal=False)
+        self.assertEqual({"<pad>": float("inf"), "three": 3, "two": 2}, dict(voc.s2c))
+
+
+if __name__ == "__main__":
+    unittest.main()
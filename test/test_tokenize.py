@@ -0,0 +1,25 @@
+import unittest
+
+from protovoc.vocab.tokenize import Tokenizer, count_bytes
+
+
+class TestTokenizer(unittest.TestCase):
+    def test_ascii_whitespace_like_str_split(self):
+        ascii_spaces = "".join(chr(c) for c in range(128) if chr(c).isspace())
+        text = f"a{ascii_spaces}b c\x1fd"
+        self.assertEqual(text.split(), Tokenizer()(text))
+
+    def test_non_ascii_whitespace_doesnt_split(self):
+        text = "a\u00a0b c\u3000d\u2028e"
+        self.assertEqual(["a", "b", "c", "d", "e"], text.split())
+        self.assertEqual(["a\u00a0b", "c\u3000d\u2028e"], Tokenizer()(text))
+        self.assertEqual({"a\u00a0b": 1, "c\u3000d\u2028e": 1}, count_bytes(text.encode("utf-8")))
+
+    def test_long_tokens(self):
+        # longer than the initial scratch buffer, so it grows
+        words = ["x" * 100, "y" * 1000, "z"]
+        self.assertEqual(words, Tokenizer()(" ".join(words)))
+
+
+if __name__ == "__main__":
+    unittest.main()